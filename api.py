@@ -3,15 +3,31 @@ FastAPI 接口 - 供前端调用
 提供简单的 HTTP API 用于音频分析
 """
 
-from fastapi import FastAPI, UploadFile, File, Form
+from fastapi import FastAPI, UploadFile, File, Form, Request, WebSocket, WebSocketDisconnect
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response
+from pydantic import BaseModel
+import asyncio
+import hashlib
+import hmac
 import os
-import tempfile
+import time
 import logging
-from typing import Optional
+from typing import BinaryIO, Dict, List, Optional, Tuple, Union
 
-from main import AntiFraudSystem
+from main import AntiFraudSystem, text_to_transcript
+from src.serving import (
+    InferenceWorkerPool, AnalysisScheduler, LiveSession,
+    UploadLimitMiddleware, UploadRejected, check_audio, VerdictStore
+)
+from src.serving.priority import normalize_priority
+from src.tools.kb_snapshots import KBSnapshots, KBSnapshotError
+from src.utils import metrics
+from src.utils.tracing import Trace, current_trace, start_trace, use_trace
+from src.utils.profiling import PROFILE_DIR
+from src.utils.resources import rss_bytes
+from src.utils.single_flight import AsyncSingleFlight, content_hash
 
 # 配置日志
 logging.basicConfig(level=logging.INFO)
@@ -33,27 +49,361 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# 上传限制：音频大小上限（MB）与时长上限（秒），0 表示不限制
+MAX_UPLOAD_BYTES = int(float(os.getenv("MAX_UPLOAD_MB", "50")) * 1024 * 1024)
+MAX_AUDIO_SECONDS = float(os.getenv("MAX_AUDIO_SECONDS", "1800"))
+
+# 超大请求在读取请求体之前拒绝（留出 multipart 表单字段的余量）
+app.add_middleware(UploadLimitMiddleware, max_bytes=MAX_UPLOAD_BYTES + 64 * 1024 if MAX_UPLOAD_BYTES else 0)
+
 # 全局系统实例（避免重复加载模型）
 system: Optional[AntiFraudSystem] = None
 
+# 推理 Worker 池（API_WORKERS > 0 时启用多进程服务模式）
+worker_pool: Optional[InferenceWorkerPool] = None
+
+# 微批调度器（BATCH_MAX_SIZE > 1 时启用）
+scheduler: Optional[AnalysisScheduler] = None
+
+# 判定存储（VERDICT_DB 非空时启用，默认关闭；后台批量写入）
+verdict_store: Optional[VerdictStore] = None
+
+# 后台知识库重建任务（POST /admin/kb/rebuild 触发）
+kb_build: Optional[asyncio.Task] = None
+
+# 管理接口令牌：/admin/* 与 /verdicts 需携带 X-Admin-Token 请求头，为空时这些接口一律拒绝
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+
+# 是否允许任意客户端用 X-Profile 头强制剖析（关闭时仅携带有效管理令牌的请求可以）
+PROFILE_HEADER_ENABLED = os.getenv("PROFILE_HEADER_ENABLED", "false").lower() == "true"
+
+# 相同音频的并发请求合并：同角色共享整个分析结果，不同角色共享转录
+request_flight = AsyncSingleFlight("analyze")
+asr_flight = AsyncSingleFlight("asr")
+# 多进程模式下与角色无关的检测在前端按音频哈希合并，再派发给 Worker
+detect_flight = AsyncSingleFlight("detect")
+
+# 单次 /analyze-text 请求允许的最大文本条数
+TEXT_BATCH_MAX = int(os.getenv("TEXT_BATCH_MAX", "32"))
+
+
+class TextAnalysisRequest(BaseModel):
+    """文本分析请求"""
+    texts: List[str]
+    role_id: str = "R01"
+    deep_advice: bool = False
+
+
+class KBSwapRequest(BaseModel):
+    """知识库版本切换请求"""
+    version: str
+
 
 @app.on_event("startup")
 async def startup_event():
     """应用启动时初始化系统"""
-    global system
+    global system, worker_pool, scheduler, verdict_store
     logger.info("🚀 启动反诈骗检测系统...")
     
     # 检查是否需要初始化知识库
-    kb_exists = os.path.exists("./db/chroma")
+    kb_exists = KBSnapshots(os.getenv("CHROMA_PERSIST_DIR", "./db/chroma")).current() is not None
     
+    # 前端进程是知识库的唯一写入方，Worker 启动前完成构建
+    # ASR_ENABLED=false 时不加载 Whisper，仅提供文本分析
     system = AntiFraudSystem(
         whisper_model_size="base",
         init_knowledge_base=not kb_exists  # 如果数据库不存在则初始化
     )
     
+    num_workers = int(os.getenv("API_WORKERS", "0"))
+    if num_workers > 0:
+        worker_pool = InferenceWorkerPool(
+            num_workers=num_workers,
+            embedder=system.rag_tool.embedder
+        )
+        worker_pool.start()
+    
+    batch_max_size = int(os.getenv("BATCH_MAX_SIZE", "1"))
+    if batch_max_size > 1:
+        scheduler = AnalysisScheduler(
+            run_analysis_batch,
+            max_batch_size=batch_max_size,
+            max_delay_ms=float(os.getenv("BATCH_MAX_DELAY_MS", "20"))
+        )
+        scheduler.start()
+        metrics.QUEUE_DEPTH.set_function(lambda: scheduler.queue_depth)
+    
+    verdict_db = os.getenv("VERDICT_DB", "")
+    if verdict_db:
+        verdict_store = VerdictStore(
+            verdict_db,
+            model_versions=system.model_versions,
+            batch_size=int(os.getenv("VERDICT_BATCH_SIZE", "64")),
+            flush_interval=float(os.getenv("VERDICT_FLUSH_SECONDS", "0.5"))
+        )
+        metrics.VERDICT_QUEUE.set_function(lambda: verdict_store.pending)
+    
+    metrics.PROCESS_RSS.set_function(rss_bytes)
+    
     logger.info("✅ 系统启动完成！")
 
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """应用关闭时释放 Worker 进程，保存指纹索引中尚未写盘的录音，写完待存储的判定，并停止资源检查"""
+    if scheduler is not None:
+        await scheduler.stop()
+    if worker_pool is not None:
+        worker_pool.shutdown()
+    if system is not None and system.fingerprints is not None:
+        system.fingerprints.save()
+    if verdict_store is not None:
+        verdict_store.close()
+    if system is not None:
+        system.resources.stop()
+
+
+def _store_verdict(result: Dict, role_id: str, source: str) -> None:
+    """把分析结果放入判定存储的写入队列（不等待写盘）"""
+    if verdict_store is not None and not verdict_store.submit(result, role_id, source):
+        metrics.VERDICTS_DROPPED.inc()
+
+
+def _transcribe(audio_path: Union[str, BinaryIO], trace: Optional[Trace]) -> Dict:
+    """在请求的追踪上下文中转录（供线程池调用）"""
+    with use_trace(trace):
+        return system.asr_tool.transcribe_audio(audio_path)
+
+
+def _lookup_recording(audio_path: Union[str, BinaryIO], role_id: str, trace: Trace) -> Tuple:
+    """在请求的追踪上下文中查找已知录音（供线程池调用）"""
+    with use_trace(trace):
+        return system.lookup_recording(audio_path, role_id)
+
+
+async def _transcribe_shared(
+    audio_path: Union[str, BinaryIO],
+    trace: Trace,
+    audio_hash: Optional[str] = None
+) -> Dict:
+    """转录；给出 audio_hash 时同一音频的并发请求（即使角色不同）只转录一次"""
+    if audio_hash is None:
+        return await run_in_threadpool(_transcribe, audio_path, trace)
+    wait_start = time.perf_counter()
+    transcript_result, shared = await asr_flight.do(
+        audio_hash, lambda: run_in_threadpool(_transcribe, audio_path, trace)
+    )
+    if shared:
+        trace.add("asr:shared", time.perf_counter() - wait_start)
+        metrics.COALESCED.inc(layer="asr")
+    return transcript_result
+
+
+async def _detect_shared(
+    transcript_result: Dict,
+    role_id: str,
+    trace: Trace,
+    options: Dict,
+    audio_hash: Optional[str] = None
+) -> Tuple[Dict, bool]:
+    """
+    多进程模式下的检测：按音频哈希（没有时按转录文本）在前端进程合并，
+    相同音频的并发请求即使角色不同、被派发到不同 Worker，也只执行一次 Watchdog 与 Profiler
+    
+    启用 SPECULATIVE_GUARDIAN 时，检测 Worker 为发起检测的请求的角色投机执行 Guardian
+    
+    Returns:
+        (检测结果, 是否共享了其他请求的检测)；执行检测的请求已合并检测阶段的追踪
+    """
+    key = audio_hash or hashlib.sha256(transcript_result["text"].encode("utf-8")).hexdigest()
+    wait_start = time.perf_counter()
+    detection, shared = await detect_flight.do(
+        key, lambda: worker_pool.detect_transcript(
+            transcript_result, trace_id=trace.trace_id,
+            profile=options.get("profile"), priority=options.get("priority"),
+            victim_role_id=role_id, deep_advice=options.get("deep_advice", False)
+        )
+    )
+    if shared:
+        trace.add("detect:shared", time.perf_counter() - wait_start)
+        metrics.COALESCED.inc(layer="detect")
+    else:
+        trace.merge(detection.get("trace"))
+    return detection, shared
+
+
+async def run_analysis_batch(jobs: List[Tuple[str, str, Trace, Dict, Optional[str]]]) -> List:
+    """
+    执行一个批次的分析（供微批调度器调用）
+    
+    同批音频并发提交转录（并行度由 Whisper 副本数决定，同一音频按 audio_hash 只转录一次），
+    转录成功的请求再整体交给智能体阶段并发执行；多进程模式下检测按音频哈希在前端合并，
+    只把各角色的建议步骤整批派发给 Worker。单个请求失败时对应位置为 Exception 实例。
+    """
+    transcripts = await asyncio.gather(
+        *(_transcribe_shared(audio_path, trace, audio_hash)
+          for audio_path, _, trace, _, audio_hash in jobs),
+        return_exceptions=True
+    )
+    results: List = list(transcripts)
+    pending = [i for i, transcript in enumerate(transcripts) if not isinstance(transcript, Exception)]
+    
+    if worker_pool is not None:
+        detections = await asyncio.gather(
+            *(_detect_shared(transcripts[i], jobs[i][1], jobs[i][2], jobs[i][3], jobs[i][4]) for i in pending),
+            return_exceptions=True
+        )
+        batch, indexes = [], []
+        for i, detection in zip(pending, detections):
+            if isinstance(detection, Exception):
+                results[i] = detection
+                continue
+            _, role_id, trace, options, _ = jobs[i]
+            batch.append((transcripts[i], role_id, detection[0], detection[1],
+                          {"trace_id": trace.trace_id, **options}))
+            indexes.append(i)
+        analyzed = await worker_pool.advise_detected_batch(batch) if batch else []
+    else:
+        batch = [
+            (transcripts[i], jobs[i][1], {"trace_id": jobs[i][2].trace_id, **jobs[i][3]})
+            for i in pending
+        ]
+        indexes = pending
+        analyzed = await run_in_threadpool(system.analyze_transcript_batch, batch) if batch else []
+    
+    for i, result in zip(indexes, analyzed):
+        results[i] = result
+    return results
+
+
+async def run_analysis(
+    audio_path: Union[str, BinaryIO],
+    role_id: str,
+    deep_advice: bool = False,
+    audio_hash: Optional[str] = None
+) -> Dict:
+    """
+    执行一次完整分析，不阻塞事件循环
+    
+    启用微批调度时请求先进入时间窗口合批；否则 ASR 在前端进程的线程池中执行
+    （多个 Whisper 副本可并行），多进程模式下与角色无关的检测在前端合并后派发给一个 Worker，
+    各角色的建议步骤再分别派发，否则在线程池中执行。智能体阶段的追踪记录合并回请求追踪后更新指标。
+    
+    给出 audio_hash 时，同一音频的并发请求（即使角色不同）只转录、检测一次。
+    """
+    trace = current_trace() or Trace()
+    # 剖析决定随选项传递（微批与多进程模式下各部分不在同一上下文中执行）
+    options = {"deep_advice": deep_advice, "profile": trace.profile, "priority": trace.priority}
+    
+    # 已知录音（指纹命中）直接返回已有判定
+    known, audio_fingerprint = None, None
+    if system.fingerprints is not None:
+        known, audio_fingerprint = await run_in_threadpool(
+            _lookup_recording, audio_path, role_id, trace
+        )
+    
+    if known is not None:
+        result = known
+    elif scheduler is not None:
+        result = await scheduler.submit((audio_path, role_id, trace, options, audio_hash))
+    else:
+        transcript_result = await _transcribe_shared(audio_path, trace, audio_hash)
+        if worker_pool is not None:
+            detection, shared = await _detect_shared(transcript_result, role_id, trace, options, audio_hash)
+            result = await worker_pool.advise_detected(
+                transcript_result, role_id, detection, shared, trace_id=trace.trace_id, **options
+            )
+        else:
+            result = await run_in_threadpool(
+                system.analyze_transcript, transcript_result, role_id,
+                trace_id=trace.trace_id, **options
+            )
+    
+    if known is not None:
+        # 指纹查找的各阶段已直接记录在请求追踪中
+        metrics.FINGERPRINT_HITS.inc()
+    else:
+        trace.merge(result.get("trace"))
+        if audio_fingerprint is not None:
+            await run_in_threadpool(system.remember_recording, audio_fingerprint, result)
+    result["trace"] = trace.to_dict()
+    metrics.observe_result(result)
+    _store_verdict(result, role_id, "audio")
+    return result
+
+
+async def run_analysis_coalesced(
+    audio_path: Union[str, BinaryIO],
+    role_id: str,
+    deep_advice: bool = False
+) -> Dict:
+    """
+    按音频内容哈希 + 角色合并并发的相同请求
+    
+    同一音频、同一角色的请求等待进行中的分析并共享结果；角色不同时共享转录与检测
+    （单进程由 AntiFraudSystem 合并，多进程模式在前端按音频哈希合并），各自只执行建议步骤。
+    """
+    audio_hash = await run_in_threadpool(content_hash, audio_path)
+    result, shared = await request_flight.do(
+        (audio_hash, role_id, deep_advice),
+        lambda: run_analysis(audio_path, role_id, deep_advice, audio_hash)
+    )
+    if shared:
+        metrics.COALESCED.inc(layer="request")
+        result = {**result, "coalesced": True}
+    return result
+
+
+def _asr_unavailable() -> Optional[JSONResponse]:
+    """纯文本节点（未加载 ASR）上的音频请求返回 503"""
+    if system.asr_tool is not None:
+        return None
+    return JSONResponse(
+        status_code=503,
+        content={
+            "success": False,
+            "error": "本节点未加载 ASR 模型（ASR_ENABLED=false），请使用 /analyze-text"
+        }
+    )
+
+
+@app.middleware("http")
+async def trace_middleware(request: Request, call_next):
+    """
+    为每个请求分配 trace_id（可由 X-Trace-Id 头传入），并统计分析请求
+    
+    X-Profile: 1 / 0 强制开启 / 关闭本次请求的剖析，未指定时按 PROFILE_SAMPLE_RATE 采样
+    （需 PROFILE_HEADER_ENABLED=true 或携带有效的 X-Admin-Token，否则忽略该头）
+    X-Trace-Id 只接受 [A-Za-z0-9_-]{1,64}，不合法时重新生成
+    X-Priority: live / interactive / bulk 指定调度优先级（批量重分析脚本应传 bulk），
+    未指定时 /analyze 为 live，其余为 interactive
+    """
+    profile_header = request.headers.get("X-Profile")
+    if profile_header is not None and not (PROFILE_HEADER_ENABLED or _admin_token_valid(request)):
+        profile_header = None
+    profile = None if profile_header is None else profile_header.strip().lower() in ("1", "true", "yes")
+    path = request.url.path
+    default_priority = "live" if path.startswith("/analyze") and not path.startswith("/analyze-text") else "interactive"
+    priority = normalize_priority(request.headers.get("X-Priority"), default_priority)
+    with start_trace(request.headers.get("X-Trace-Id"), profile, priority) as trace:
+        is_analysis = request.url.path.startswith("/analyze")
+        if is_analysis:
+            metrics.INFLIGHT.inc()
+        try:
+            response = await call_next(request)
+        finally:
+            if is_analysis:
+                metrics.INFLIGHT.dec()
+    
+    if is_analysis:
+        metrics.REQUESTS.inc(endpoint=request.url.path, status=str(response.status_code))
+    response.headers["X-Trace-Id"] = trace.trace_id
+    if trace.profile and is_analysis:
+        response.headers["X-Profile"] = "1"
+        logger.info(f"🔬 已采集剖析: {os.path.join(PROFILE_DIR, trace.trace_id)}")
+    return response
+
+
 @app.get("/")
 async def root():
     """健康检查接口"""
@@ -67,7 +417,8 @@ async def root():
 @app.post("/analyze")
 async def analyze_audio(
     audio: UploadFile = File(..., description="音频文件（MP3 格式）"),
-    role_id: str = Form("R01", description="受害者角色 ID (R01-R10)")
+    role_id: str = Form("R01", description="受害者角色 ID (R01-R10)"),
+    deep_advice: bool = Form(False, description="由 Guardian 针对本次通话生成建议")
 ):
     """
     分析音频文件，检测诈骗并生成防御建议
@@ -75,6 +426,7 @@ async def analyze_audio(
     **参数:**
     - audio: 音频文件（支持 MP3 格式）
     - role_id: 受害者角色 ID，默认 R01（李奶奶）
+    - deep_advice: 为 true 时由 Guardian 实时生成个性化建议，否则按 GUARDIAN_MODE
     
     **返回:**
     ```json
@@ -89,21 +441,25 @@ async def analyze_audio(
         }
     }
     ```
+    
+    上传在解析时分块写入 SpooledTemporaryFile（小文件留在内存，大文件落盘），
+    转录直接读取该文件对象，不再整体读入内存或另存临时文件；请求结束时无论成败都会关闭释放。
+    超过 MAX_UPLOAD_MB 返回 413，容器头显示时长超过 MAX_AUDIO_SECONDS 返回 422。
     """
+    unavailable = _asr_unavailable()
+    if unavailable is not None:
+        return unavailable
+    
     try:
         logger.info(f"收到分析请求: {audio.filename}, 角色: {role_id}")
         
-        # 保存上传的音频到临时文件
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".mp3") as tmp_file:
-            content = await audio.read()
-            tmp_file.write(content)
-            tmp_path = tmp_file.name
-        
-        # 分析音频
-        result = system.analyze_audio(tmp_path, role_id)
+        # 转录前检查大小与时长（只读取文件头）
+        duration = await run_in_threadpool(check_audio, audio.file, MAX_UPLOAD_BYTES, MAX_AUDIO_SECONDS)
+        if duration is not None:
+            logger.info(f"音频时长（容器头估算）: {duration:.1f}s")
         
-        # 删除临时文件
-        os.unlink(tmp_path)
+        # 分析音频（直接传入上传的文件对象；相同音频的并发请求合并执行）
+        result = await run_analysis_coalesced(audio.file, role_id, deep_advice)
         
         # 返回结果（移除 raw_result 避免序列化问题）
         response_data = {
@@ -113,7 +469,13 @@ async def analyze_audio(
             "risk_level": result["risk_level"],
             "scam_type": result["scam_type"],
             "defense_advice": result["defense_advice"],
-            "victim_info": result["victim_info"]
+            "victim_info": result["victim_info"],
+            "degraded": result.get("degraded", False),
+            "advice_source": result.get("advice_source"),
+            "coalesced": result.get("coalesced", False),
+            "fingerprint_match": result.get("fingerprint_match"),
+            "risk_model": result.get("risk_model"),
+            "trace": result["trace"]
         }
         
         return JSONResponse({
@@ -121,6 +483,15 @@ async def analyze_audio(
             "data": response_data
         })
     
+    except UploadRejected as e:
+        logger.warning(f"拒绝上传: {e}")
+        return JSONResponse(
+            status_code=e.status_code,
+            content={
+                "success": False,
+                "error": str(e)
+            }
+        )
     except Exception as e:
         logger.error(f"分析失败: {str(e)}", exc_info=True)
         return JSONResponse(
@@ -130,12 +501,17 @@ async def analyze_audio(
                 "error": str(e)
             }
         )
+    
+    finally:
+        # 释放上传缓冲（落盘的临时文件随之删除）
+        await audio.close()
 
 
 @app.post("/analyze-local")
 async def analyze_local_audio(
     audio_path: str = Form(..., description="本地音频文件路径"),
-    role_id: str = Form("R01", description="受害者角色 ID")
+    role_id: str = Form("R01", description="受害者角色 ID"),
+    deep_advice: bool = Form(False, description="由 Guardian 针对本次通话生成建议")
 ):
     """
     分析本地音频文件（用于测试）
@@ -144,6 +520,10 @@ async def analyze_local_audio(
     - audio_path: 本地音频文件路径
     - role_id: 受害者角色 ID
     """
+    unavailable = _asr_unavailable()
+    if unavailable is not None:
+        return unavailable
+    
     try:
         if not os.path.exists(audio_path):
             return JSONResponse(
@@ -154,14 +534,25 @@ async def analyze_local_audio(
                 }
             )
         
-        result = system.analyze_audio(audio_path, role_id)
+        def _check_local() -> None:
+            with open(audio_path, 'rb') as f:
+                check_audio(f, 0, MAX_AUDIO_SECONDS)
+        
+        await run_in_threadpool(_check_local)
+        result = await run_analysis_coalesced(audio_path, role_id, deep_advice)
         
         response_data = {
             "transcript": result["transcript"],
             "risk_level": result["risk_level"],
             "scam_type": result["scam_type"],
             "defense_advice": result["defense_advice"],
-            "victim_info": result["victim_info"]
+            "victim_info": result["victim_info"],
+            "degraded": result.get("degraded", False),
+            "advice_source": result.get("advice_source"),
+            "coalesced": result.get("coalesced", False),
+            "fingerprint_match": result.get("fingerprint_match"),
+            "risk_model": result.get("risk_model"),
+            "trace": result["trace"]
         }
         
         return JSONResponse({
@@ -169,6 +560,86 @@ async def analyze_local_audio(
             "data": response_data
         })
     
+    except UploadRejected as e:
+        logger.warning(f"拒绝上传: {e}")
+        return JSONResponse(
+            status_code=e.status_code,
+            content={
+                "success": False,
+                "error": str(e)
+            }
+        )
+    except Exception as e:
+        logger.error(f"分析失败: {str(e)}", exc_info=True)
+        return JSONResponse(
+            status_code=500,
+            content={
+                "success": False,
+                "error": str(e)
+            }
+        )
+
+
+@app.post("/analyze-text")
+async def analyze_text(body: TextAnalysisRequest):
+    """
+    分析文本（短信、聊天记录、运营商转写），不经过 ASR
+    
+    **参数（JSON）:**
+    ```json
+    {"texts": ["对话文本1", "对话文本2"], "role_id": "R01"}
+    ```
+    
+    **返回:**
+    与 /analyze 相同的字段，data 为与 texts 顺序一致的列表；
+    单条失败时对应位置为 {"error": "..."}
+    """
+    if not body.texts:
+        return JSONResponse(status_code=400, content={"success": False, "error": "texts 不能为空"})
+    if len(body.texts) > TEXT_BATCH_MAX:
+        return JSONResponse(
+            status_code=400,
+            content={"success": False, "error": f"单次最多 {TEXT_BATCH_MAX} 条文本"}
+        )
+    
+    try:
+        trace = current_trace() or Trace()
+        logger.info(f"收到文本分析请求: {len(body.texts)} 条, 角色: {body.role_id}")
+        
+        jobs = [
+            (text_to_transcript(text), body.role_id,
+             {"trace_id": f"{trace.trace_id}-{i}", "deep_advice": body.deep_advice,
+              "profile": trace.profile, "priority": trace.priority})
+            for i, text in enumerate(body.texts)
+        ]
+        if worker_pool is not None:
+            results = await worker_pool.analyze_transcript_batch(jobs)
+        else:
+            results = await run_in_threadpool(system.analyze_transcript_batch, jobs)
+        
+        data = []
+        for result in results:
+            if isinstance(result, Exception):
+                data.append({"error": str(result)})
+                continue
+            metrics.observe_result(result)
+            _store_verdict(result, body.role_id, "text")
+            data.append({
+                "transcript": result["transcript"],
+                "risk_level": result["risk_level"],
+                "scam_type": result["scam_type"],
+                "defense_advice": result["defense_advice"],
+                "victim_info": result["victim_info"],
+                "degraded": result.get("degraded", False),
+                "advice_source": result.get("advice_source"),
+                "trace": result["trace"]
+            })
+        
+        return JSONResponse({
+            "success": True,
+            "data": data
+        })
+    
     except Exception as e:
         logger.error(f"分析失败: {str(e)}", exc_info=True)
         return JSONResponse(
@@ -180,24 +651,258 @@ async def analyze_local_audio(
         )
 
 
+@app.websocket("/live")
+async def live_session(websocket: WebSocket, role_id: str = "R01"):
+    """
+    实时通话分析（WebSocket）
+    
+    **客户端消息:**
+    - `{"type": "segment", "text": "...", "start": 3.0, "end": 6.0}`：新的 ASR 分段
+    - `{"type": "end", "deep_advice": false}`：通话结束，执行完整分析
+    
+    **服务端消息:**
+    - `{"type": "score", ...}`：每个分段的增量风险状态
+    - `{"type": "watchdog", ...}`：风险分越过阈值后 Watchdog 的评估结果
+    - `{"type": "result", "data": {...}}`：通话结束后的完整分析结果
+    """
+    await websocket.accept()
+    session = LiveSession(system, role_id)
+    send_lock = asyncio.Lock()
+    pending: List[asyncio.Task] = []
+    metrics.LIVE_SESSIONS.inc()
+    
+    async def _send(message: Dict) -> None:
+        async with send_lock:
+            await websocket.send_json(message)
+    
+    async def _watchdog() -> None:
+        result = await run_in_threadpool(session.run_watchdog)
+        await _send({"type": "watchdog", **{k: v for k, v in result.items() if k != "trace"}})
+    
+    try:
+        while True:
+            message = await websocket.receive_json()
+            if message.get("type") == "end":
+                break
+            
+            state = session.feed(message)
+            await _send({"type": "score", **state})
+            if state["trigger"]:
+                # Watchdog 在后台执行，不阻塞后续分段的打分
+                metrics.LIVE_WATCHDOG_TRIGGERS.inc()
+                pending.append(asyncio.create_task(_watchdog()))
+        
+        await asyncio.gather(*pending, return_exceptions=True)
+        result = await run_in_threadpool(session.finish, bool(message.get("deep_advice")))
+        metrics.observe_result(result)
+        _store_verdict(result, role_id, "live")
+        await _send({
+            "type": "result",
+            "data": {
+                "transcript": result["transcript"],
+                "risk_level": result["risk_level"],
+                "scam_type": result["scam_type"],
+                "defense_advice": result["defense_advice"],
+                "victim_info": result["victim_info"],
+                "degraded": result.get("degraded", False),
+                "advice_source": result.get("advice_source"),
+                "live": result["live"],
+                "trace": result["trace"]
+            }
+        })
+        await websocket.close()
+    except WebSocketDisconnect:
+        logger.info(f"实时会话 {session.session_id} 已断开")
+    finally:
+        for task in pending:
+            task.cancel()
+        metrics.LIVE_SESSIONS.dec()
+
+
+@app.get("/metrics")
+async def get_metrics():
+    """Prometheus 格式的运行指标"""
+    return Response(
+        content=metrics.REGISTRY.render(),
+        media_type=metrics.CONTENT_TYPE
+    )
+
+
+@app.get("/priority")
+async def get_priority():
+    """优先级调度状态：各资源的容量、按优先级执行中与排队的阶段数、LLM 令牌余量"""
+    if system.priority_gate is None:
+        return {"enabled": False}
+    return {"enabled": True, **system.priority_gate.status()}
+
+
+@app.get("/resources")
+async def get_resources():
+    """进程 RSS 与 Whisper、嵌入模型、ChromaDB 的加载状态、占用内存与空闲时间"""
+    return system.resources.status()
+
+
+@app.get("/verdicts")
+async def list_verdicts(
+    request: Request,
+    limit: int = 50,
+    cursor: Optional[int] = None,
+    risk_level: Optional[str] = None,
+    scam_type: Optional[str] = None,
+    role_id: Optional[str] = None,
+    since: Optional[float] = None,
+    until: Optional[float] = None
+):
+    """
+    按时间倒序分页查询历史判定
+    
+    **参数:**
+    - limit: 每页条数（1-500）
+    - cursor: 上一页返回的 next_cursor
+    - risk_level / scam_type / role_id: 过滤条件
+    - since / until: 创建时间范围（Unix 时间戳，秒）
+    
+    列表不含转录、分段、建议与阶段耗时等大字段，完整记录见 GET /verdicts/{id}
+    
+    判定含通话转录，与 /admin/* 一样需携带 X-Admin-Token
+    """
+    denied = _admin_denied(request)
+    if denied is not None:
+        return denied
+    if verdict_store is None:
+        return JSONResponse(status_code=503, content={"success": False, "error": "判定存储未启用（VERDICT_DB 为空）"})
+    
+    records, next_cursor = await run_in_threadpool(
+        verdict_store.query,
+        limit=max(1, min(limit, 500)),
+        before_id=cursor,
+        risk_level=risk_level,
+        scam_type=scam_type,
+        role_id=role_id,
+        since=since,
+        until=until
+    )
+    return {"success": True, "data": records, "next_cursor": next_cursor}
+
+
+@app.get("/verdicts/{verdict_id}")
+async def get_verdict(verdict_id: int, request: Request):
+    """获取单条判定的完整记录（需携带 X-Admin-Token）"""
+    denied = _admin_denied(request)
+    if denied is not None:
+        return denied
+    if verdict_store is None:
+        return JSONResponse(status_code=503, content={"success": False, "error": "判定存储未启用（VERDICT_DB 为空）"})
+    
+    record = await run_in_threadpool(verdict_store.get, verdict_id)
+    if record is None:
+        return JSONResponse(status_code=404, content={"success": False, "error": f"判定不存在: {verdict_id}"})
+    return {"success": True, "data": record}
+
+
+def _admin_token_valid(request: Request) -> bool:
+    """请求是否携带有效的 X-Admin-Token（未设置 ADMIN_TOKEN 时一律无效）"""
+    token = request.headers.get("X-Admin-Token", "")
+    return bool(ADMIN_TOKEN) and hmac.compare_digest(token.encode(), ADMIN_TOKEN.encode())
+
+
+def _admin_denied(request: Request) -> Optional[JSONResponse]:
+    """校验 X-Admin-Token 请求头；未设置 ADMIN_TOKEN 时管理接口一律拒绝"""
+    if not ADMIN_TOKEN:
+        return JSONResponse(status_code=403, content={"success": False, "error": "管理接口未启用（ADMIN_TOKEN 为空）"})
+    if not _admin_token_valid(request):
+        return JSONResponse(status_code=403, content={"success": False, "error": "管理令牌无效"})
+    return None
+
+
+def _kb_status() -> Dict:
+    status = system.rag_tool.kb_status()
+    status["building"] = kb_build is not None and not kb_build.done()
+    if kb_build is not None and kb_build.done() and not kb_build.cancelled():
+        error = kb_build.exception()
+        status["last_build"] = {"error": str(error)} if error else {"version": kb_build.result()}
+    return status
+
+
+@app.get("/admin/kb")
+async def kb_status(request: Request):
+    """知识库当前版本、可用版本、各打开版本的读取数与后台构建状态"""
+    denied = _admin_denied(request)
+    if denied is not None:
+        return denied
+    return _kb_status()
+
+
+@app.post("/admin/kb/rebuild")
+async def kb_rebuild(request: Request):
+    """
+    在后台构建新的知识库版本，完成后原子切换（构建期间检索继续使用当前版本）
+    
+    多进程服务模式下各 Worker 在下一次检索时跟随 CURRENT 指针切换。
+    """
+    global kb_build
+    denied = _admin_denied(request)
+    if denied is not None:
+        return denied
+    if kb_build is not None and not kb_build.done():
+        return JSONResponse(status_code=409, content={"success": False, "error": "已有构建任务在进行"})
+    kb_build = asyncio.create_task(run_in_threadpool(
+        system.rag_tool.build_knowledge_base,
+        cases_csv="./data/cases.csv",
+        mapping_csv="./data/mapping_full.csv"
+    ))
+    return JSONResponse(status_code=202, content={"success": True, **_kb_status()})
+
+
+@app.post("/admin/kb/swap")
+async def kb_swap(body: KBSwapRequest, request: Request):
+    """切换到指定的已构建版本"""
+    denied = _admin_denied(request)
+    if denied is not None:
+        return denied
+    try:
+        await run_in_threadpool(system.rag_tool.swap, body.version)
+    except KBSnapshotError as e:
+        return JSONResponse(status_code=409, content={"success": False, "error": str(e)})
+    return {"success": True, **_kb_status()}
+
+
+@app.post("/admin/kb/rollback")
+async def kb_rollback(request: Request):
+    """回滚到当前版本之前的一个版本"""
+    denied = _admin_denied(request)
+    if denied is not None:
+        return denied
+    try:
+        await run_in_threadpool(system.rag_tool.rollback)
+    except KBSnapshotError as e:
+        return JSONResponse(status_code=409, content={"success": False, "error": str(e)})
+    return {"success": True, **_kb_status()}
+
+
 @app.get("/roles")
 async def get_roles():
     """获取所有可用的受害者角色列表"""
-    import pandas as pd
-    
-    roles_df = pd.read_csv("./data/roles.csv")
-    roles = roles_df.to_dict('records')
-    
-    return JSONResponse({
-        "success": True,
-        "data": roles
-    })
+    # 响应体在角色表加载时已序列化，文件变更后自动刷新
+    return Response(
+        content=system.role_registry.json_body(),
+        media_type="application/json"
+    )
 
 
 if __name__ == "__main__":
+    import argparse
     import uvicorn
     
-    # 启动服务器
+    parser = argparse.ArgumentParser(description='反诈骗智能检测 API 服务')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='推理 Worker 进程数（0 为单进程模式，默认读取 API_WORKERS）')
+    args = parser.parse_args()
+    
+    if args.workers is not None:
+        os.environ["API_WORKERS"] = str(args.workers)
+    
+    # 启动服务器（HTTP 始终由单个前端进程处理）
     uvicorn.run(
         app,
         host="0.0.0.0",
@@ -3,10 +3,15 @@
 整合 ASR、RAG、CrewAI 智能体实现端到端的诈骗识别与防御
 """
 
+import copy
+import hashlib
 import os
+import re
 import sys
-import pandas as pd
-from typing import Dict, Optional
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import BinaryIO, Dict, List, Optional, Tuple, Union
 from dotenv import load_dotenv
 from crewai import Crew, Process
 import logging
@@ -16,10 +21,27 @@ sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
 from src.tools.asr_tool import ASRTool
 from src.tools.rag_tool import RAGSearchTool
+from src.tools.role_registry import RoleRegistry
+from src.tools.transcript_condenser import TranscriptCondenser
+from src.tools.local_analyzer import LocalAnalyzer
+from src.tools.advice_store import AdviceStore
+from src.tools.audio_fingerprint import FingerprintIndex, fingerprint, load_audio
+from src.tools.risk_signals import match_case_type
+from src.tools.risk_model import RiskModel
+from src.serving.priority import PRIORITIES, PriorityGate
+from src.utils.tracing import (
+    Trace, bind, current_trace, start_trace, stage, use_trace, install_log_filter, set_stage_gate
+)
+from src.utils.profiling import profiled
+from src.utils.single_flight import SingleFlight
+from src.utils.model_bundle import load_bundle
+from src.utils.resources import ResourceManager
+from src.utils import metrics
 from src.agents.anti_fraud_agents import (
     create_watchdog_agent,
     create_profiler_agent,
-    create_guardian_agent
+    create_guardian_agent,
+    get_llm_breaker
 )
 from src.tasks.anti_fraud_tasks import (
     create_monitor_task,
@@ -34,6 +56,9 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# 所有日志附带请求 trace_id，便于定位慢请求
+install_log_filter('%(asctime)s - %(name)s - [%(trace_id)s] - %(levelname)s - %(message)s')
+
 # 加载环境变量
 load_dotenv()
 
@@ -44,7 +69,11 @@ class AntiFraudSystem:
     def __init__(
         self,
         whisper_model_size: str = "base",
-        init_knowledge_base: bool = False
+        init_knowledge_base: bool = False,
+        load_asr: Optional[bool] = None,
+        read_only_kb: bool = False,
+        embedder=None,
+        prompt_budgets: Optional[Dict[str, int]] = None
     ):
         """
         初始化系统
@@ -52,25 +81,70 @@ class AntiFraudSystem:
         Args:
             whisper_model_size: Whisper 模型大小
             init_knowledge_base: 是否初始化知识库（首次运行设为 True）
+            load_asr: 是否加载 Whisper 模型（推理 Worker 只处理文本时设为 False），
+                      为空时读取环境变量 ASR_ENABLED（默认加载）
+            read_only_kb: 以只读方式打开知识库（多进程服务模式的 Worker 使用）
+            embedder: 已加载的 SentenceTransformer 实例（多进程间共享）
+            prompt_budgets: 各任务转录文本的 token 预算 {"monitor": 2000, "profile": 1000}，
+                            0 表示不压缩；为空时读取环境变量
         """
         logger.info("🚀 初始化反诈骗智能检测系统...")
         
-        # 1. 初始化 ASR 工具
-        logger.info("📝 加载 Faster-Whisper 模型...")
-        self.asr_tool = ASRTool(
-            model_size=whisper_model_size,
-            device=os.getenv("WHISPER_DEVICE", "cpu"),
-            compute_type=os.getenv("WHISPER_COMPUTE_TYPE", "int8")
+        # 0. 离线模型包（MODEL_BUNDLE_DIR）：Whisper、嵌入模型与知识库只从包内加载，不访问 Hub
+        self.bundle = None
+        embedding_model = os.getenv(
+            "EMBEDDING_MODEL", "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2"
         )
+        chroma_dir = os.getenv("CHROMA_PERSIST_DIR", "./db/chroma")
+        bundle_dir = os.getenv("MODEL_BUNDLE_DIR")
+        if bundle_dir:
+            # Worker 进程（只读知识库）由已完成校验的前端进程启动，不重复计算校验和
+            verify = not read_only_kb and \
+                os.getenv("BUNDLE_VERIFY", "true").lower() not in ("0", "false", "no")
+            self.bundle = load_bundle(bundle_dir, verify=verify)
+            whisper_model_size = self.bundle.whisper_path or whisper_model_size
+            embedding_model = self.bundle.embedding_path or embedding_model
+            if not read_only_kb and self.bundle.install_kb(chroma_dir):
+                init_knowledge_base = False
+        
+        # 1. 初始化 ASR 工具（纯文本节点可不加载，节省内存）
+        if load_asr is None:
+            load_asr = os.getenv("ASR_ENABLED", "true").lower() not in ("0", "false", "no")
+        self.asr_tool = None
+        if load_asr:
+            logger.info("📝 加载 Faster-Whisper 模型...")
+            self.asr_tool = ASRTool(
+                model_size=whisper_model_size,
+                device=os.getenv("WHISPER_DEVICE", "cpu"),
+                compute_type=os.getenv("WHISPER_COMPUTE_TYPE", "int8"),
+                cpu_threads=int(os.getenv("WHISPER_CPU_THREADS", "0")),
+                num_workers=int(os.getenv("WHISPER_NUM_WORKERS", "1")),
+                chunk_seconds=float(os.getenv("ASR_CHUNK_SECONDS", "0"))
+            )
         
         # 2. 初始化 RAG 工具
         logger.info("📚 加载 RAG 知识库...")
         self.rag_tool = RAGSearchTool(
-            persist_dir=os.getenv("CHROMA_PERSIST_DIR", "./db/chroma"),
-            embedding_model=os.getenv("EMBEDDING_MODEL", 
-                                     "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2")
+            persist_dir=chroma_dir,
+            embedding_model=embedding_model,
+            read_only=read_only_kb,
+            embedder=embedder,
+            batch_max_delay_ms=float(os.getenv("RAG_BATCH_MAX_DELAY_MS", "0")),
+            batch_max_size=int(os.getenv("RAG_BATCH_MAX_SIZE", "16")),
+            keep_versions=int(os.getenv("KB_KEEP_VERSIONS", "3"))
         )
         
+        # 随判定持久化的模型版本
+        self.model_versions = {
+            "llm": os.getenv("OPENAI_MODEL_NAME"),
+            "whisper": whisper_model_size if load_asr else None,
+            "embedding": embedding_model
+        }
+        if self.bundle is not None:
+            self.model_versions.update(self.bundle.model_versions())
+            if not load_asr:
+                self.model_versions["whisper"] = None
+        
         # 如果需要，构建知识库
         if init_knowledge_base:
             logger.info("🔨 构建知识库（首次运行）...")
@@ -81,7 +155,92 @@ class AntiFraudSystem:
         
         # 3. 加载角色数据
         logger.info("👥 加载受害者角色数据...")
-        self.roles_df = pd.read_csv("./data/roles.csv")
+        self.role_registry = RoleRegistry(
+            os.getenv("ROLES_CSV", "./data/roles.csv")
+        )
+        
+        # 4. 转录压缩（按任务 token 预算筛选高风险片段）
+        self.condenser = TranscriptCondenser()
+        self.prompt_budgets = prompt_budgets or {
+            "monitor": int(os.getenv("PROMPT_BUDGET_MONITOR", "2000")),
+            "profile": int(os.getenv("PROMPT_BUDGET_PROFILE", "1000"))
+        }
+        
+        # 5. 降级分析：LLM 熔断或超出截止时间时使用本地打分与建议模板
+        self.local_analyzer = LocalAnalyzer(rag_tool=self.rag_tool)
+        # 各智能体的截止时间（秒，按顺序累加；0 表示不限制）
+        self.agent_deadlines = {
+            "watchdog": float(os.getenv("AGENT_DEADLINE_WATCHDOG", "20")),
+            "profiler": float(os.getenv("AGENT_DEADLINE_PROFILER", "30")),
+            "guardian": float(os.getenv("AGENT_DEADLINE_GUARDIAN", "25"))
+        }
+        # 跳过 LLM 直接走降级路径（评测 / 压测用）
+        self.force_degraded = False
+        
+        # 6. 防御建议来源：llm（Guardian 实时生成）或 template（查预生成建议库，
+        #    仅在请求 deep_advice 时调用 Guardian）
+        self.guardian_mode = os.getenv("GUARDIAN_MODE", "llm")
+        self.advice_store = AdviceStore(os.getenv("ADVICE_STORE", "./db/advice_store.json"))
+        
+        # 6.1 投机执行 Guardian：按本地预测的诈骗类型与风险等级与检测阶段并行生成建议，
+        #     Profiler 的类型与 Watchdog 的风险等级都一致时直接采用，否则丢弃并按实际结果重新生成
+        self.speculative_guardian = os.getenv("SPECULATIVE_GUARDIAN", "false").lower() in ("1", "true", "yes")
+        self.speculation_min_confidence = float(os.getenv("SPECULATION_MIN_CONFIDENCE", "0.5"))
+        
+        # 7. 相同转录的并发请求合并检测阶段（不同角色只分别执行建议步骤）
+        self.detect_flight = SingleFlight("detect")
+        
+        # 8. 已知录音指纹索引：重新编码 / 截取的同一录音直接返回已有判定，跳过 ASR 与 LLM
+        self.fingerprints: Optional[FingerprintIndex] = None
+        if os.getenv("FINGERPRINT_ENABLED", "false").lower() in ("1", "true", "yes"):
+            self.fingerprints = FingerprintIndex(
+                os.getenv("FINGERPRINT_INDEX", "./db/fingerprints"),
+                min_matches=int(os.getenv("FINGERPRINT_MIN_MATCHES", "20")),
+                min_ratio=float(os.getenv("FINGERPRINT_MIN_RATIO", "0.05"))
+            )
+        
+        # 9. 资源管理：Whisper、嵌入模型与 ChromaDB 空闲超时或进程 RSS 超限时卸载，下次使用时重新加载
+        self.resources = ResourceManager(
+            idle_seconds=float(os.getenv("RESOURCE_IDLE_SECONDS", "0")),
+            max_rss_mb=float(os.getenv("RESOURCE_MAX_RSS_MB", "0")),
+            interval=float(os.getenv("RESOURCE_CHECK_INTERVAL", "30"))
+        )
+        if self.asr_tool is not None:
+            self.resources.add(self.asr_tool.resource)
+        self.resources.add(self.rag_tool.embedding_function.resource)
+        self.resources.add(self.rag_tool.chroma)
+        self.resources.start()
+        
+        # 10. 优先级调度：live / interactive / bulk 按优先级与各自并发上限共享 Whisper 与 LLM，
+        #     bulk 只使用空闲容量；LLM 按每分钟 token 数限速
+        self.priority_gate: Optional[PriorityGate] = None
+        if os.getenv("PRIORITY_SCHEDULING", "false").lower() in ("1", "true", "yes"):
+            capacity = {"llm": int(os.getenv("PRIORITY_LLM_SLOTS", "8"))}
+            if self.asr_tool is not None:
+                capacity["asr"] = self.asr_tool.num_workers
+            self.priority_gate = PriorityGate(
+                capacity,
+                limits={p: int(os.getenv(f"PRIORITY_LIMIT_{p.upper()}", "1" if p == "bulk" else "0")) for p in PRIORITIES},
+                tokens_per_minute=float(os.getenv("LLM_TOKENS_PER_MINUTE", "0")),
+                bulk_token_reserve=float(os.getenv("BULK_TOKEN_RESERVE", "0.3"))
+            )
+            set_stage_gate(self.priority_gate)
+            logger.info(f"🚦 优先级调度已启用: {self.priority_gate.status()}")
+        
+        # 11. 轻量风险模型（train-risk-model 训练）：每次分析给出本地风险预测；
+        #     启用预过滤时，P(Safe) 达到校准阈值的通话直接判为 Safe，不调用 LLM
+        self.risk_model: Optional[RiskModel] = None
+        self.risk_prefilter = os.getenv("RISK_PREFILTER", "false").lower() in ("1", "true", "yes")
+        risk_model_path = os.getenv("RISK_MODEL_PATH", "./models/risk_model.npz")
+        if risk_model_path and os.path.exists(risk_model_path):
+            try:
+                self.risk_model = RiskModel.load(risk_model_path)
+                logger.info(
+                    f"📈 风险模型已加载: {risk_model_path}（Safe 阈值 {self.risk_model.safe_threshold}，"
+                    f"预过滤{'已启用' if self.risk_prefilter else '未启用'}）"
+                )
+            except Exception as e:
+                logger.warning(f"⚠️ 风险模型加载失败，跳过: {e}")
         
         logger.info("✅ 系统初始化完成！")
     
@@ -95,29 +254,16 @@ class AntiFraudSystem:
         Returns:
             受害者信息字典
         """
-        row = self.roles_df[self.roles_df['id'] == role_id]
-        
-        if row.empty:
-            logger.warning(f"未找到角色 {role_id}，使用默认信息")
-            return {
-                'name': '用户',
-                'age': '未知',
-                'tag': '普通用户',
-                'weakness': '无特殊信息'
-            }
-        
-        row = row.iloc[0]
-        return {
-            'name': row['name'],
-            'age': row['age'],
-            'tag': row['tag'],
-            'weakness': row['weakness']
-        }
+        return self.role_registry.get_victim_info(role_id)
     
     def analyze_audio(
         self,
         audio_path: str,
-        victim_role_id: str = "R01"
+        victim_role_id: str = "R01",
+        trace_id: Optional[str] = None,
+        deep_advice: bool = False,
+        profile: Optional[bool] = None,
+        priority: Optional[str] = None
     ) -> Dict:
         """
         分析音频文件，检测诈骗并生成防御建议
@@ -125,6 +271,10 @@ class AntiFraudSystem:
         Args:
             audio_path: 音频文件路径
             victim_role_id: 受害者角色 ID
+            trace_id: 请求追踪 ID（为空时自动生成）
+            deep_advice: 由 Guardian 针对本次通话生成建议（GUARDIAN_MODE=template 时生效）
+            profile: 是否对各阶段采集 cProfile（为空时按 PROFILE_SAMPLE_RATE 采样）
+            priority: 调度优先级 live / interactive / bulk（为空时沿用外层追踪，默认 interactive）
             
         Returns:
             {
@@ -132,17 +282,188 @@ class AntiFraudSystem:
                 "risk_level": "风险等级",
                 "scam_type": "诈骗类型",
                 "defense_advice": "防御建议",
-                "raw_results": {...}  # 完整的 Agent 输出
+                "raw_results": {...},  # 完整的 Agent 输出
+                "trace": {...},        # 各阶段耗时
+                "usage": {...},        # 各智能体 LLM 调用与 token 用量
+                "degraded": False,     # 是否为降级结果（LLM 熔断或超时）
+                "degraded_reason": None,
+                "advice_source": "llm", # 建议来源：llm / precomputed / template
+                "fingerprint_match": None,  # 命中已知录音时为匹配信息
+                "risk_model": None  # 轻量风险模型的预测（未加载模型时为 None）
             }
         """
-        logger.info(f"\n{'='*60}")
-        logger.info(f"🎯 开始分析音频: {audio_path}")
-        logger.info(f"👤 受害者角色: {victim_role_id}")
-        logger.info(f"{'='*60}\n")
+        if self.asr_tool is None:
+            raise RuntimeError("ASR 模型未加载（ASR_ENABLED=false），请使用 analyze_text 分析文本")
+        
+        with start_trace(trace_id, profile, priority) as trace:
+            logger.info(f"\n{'='*60}")
+            logger.info(f"🎯 开始分析音频: {audio_path}")
+            logger.info(f"👤 受害者角色: {victim_role_id}")
+            logger.info(f"{'='*60}\n")
+            
+            known, audio_fingerprint = self.lookup_recording(audio_path, victim_role_id)
+            if known is not None:
+                return known
+            
+            # Step 1: 语音转录
+            logger.info("📝 Step 1: 语音转录...")
+            transcript_result = self.asr_tool.transcribe_audio(audio_path)
+            
+            result = self._analyze_transcript(transcript_result, victim_role_id, trace, deep_advice)
+            self.remember_recording(audio_fingerprint, result)
+            return result
+    
+    def lookup_recording(
+        self,
+        audio_path: Union[str, BinaryIO],
+        victim_role_id: str
+    ) -> Tuple[Optional[Dict], Optional[Tuple]]:
+        """
+        用音频指纹查找已分析过的同一录音（在当前追踪上下文中执行）
+        
+        Returns:
+            (命中时的完整结果, 本段音频的指纹)；未启用指纹索引时为 (None, None)
+        """
+        if self.fingerprints is None:
+            return None, None
+        
+        try:
+            with stage("fingerprint") as span:
+                audio_fingerprint = fingerprint(load_audio(audio_path))
+                match = self.fingerprints.match(*audio_fingerprint)
+                span["matched"] = match is not None
+        except Exception as e:
+            logger.warning(f"音频指纹计算失败，按常规流程分析: {e}")
+            return None, None
+        
+        if match is None:
+            return None, audio_fingerprint
+        
+        verdict = match["verdict"]
+        logger.info(
+            f"🎯 命中已知录音 {verdict['fingerprint_id']}（对齐 {match['matches']} 个哈希），"
+            f"跳过转录与智能体: {verdict['risk_level']} / {verdict['scam_type']}"
+        )
+        victim_info = self.get_victim_info(victim_role_id)
+        with stage("advice"):
+            defense_advice, advice_source = self._stored_advice(
+                verdict["scam_type"], verdict["risk_level"], victim_info
+            )
         
-        # Step 1: 语音转录
-        logger.info("📝 Step 1: 语音转录...")
-        transcript_result = self.asr_tool.transcribe_audio(audio_path)
+        trace = current_trace()
+        return {
+            "transcript": verdict.get("transcript", ""),
+            "transcript_segments": verdict.get("transcript_segments", []),
+            "audio_duration": verdict.get("audio_duration", 0.0),
+            "risk_level": verdict["risk_level"],
+            "scam_type": verdict["scam_type"],
+            "defense_advice": defense_advice,
+            "victim_info": victim_info,
+            "raw_result": None,
+            "trace": trace.to_dict() if trace is not None else None,
+            "usage": _empty_usage(),
+            "prompt_stats": {},
+            "degraded": False,
+            "degraded_reason": None,
+            "advice_source": advice_source,
+            "shared_detection": False,
+            "fingerprint_match": {
+                "fingerprint_id": verdict["fingerprint_id"],
+                "matches": match["matches"],
+                "ratio": match["ratio"],
+                "offset_seconds": match["offset_seconds"]
+            }
+        }, audio_fingerprint
+    
+    def remember_recording(self, audio_fingerprint: Optional[Tuple], result: Dict) -> None:
+        """把完整分析（非降级）的录音判定加入指纹索引"""
+        if self.fingerprints is None or audio_fingerprint is None or result.get("degraded"):
+            return
+        self.fingerprints.add(*audio_fingerprint, {
+            "risk_level": result["risk_level"],
+            "scam_type": result["scam_type"],
+            "transcript": result["transcript"],
+            "transcript_segments": result.get("transcript_segments", []),
+            "audio_duration": result.get("audio_duration", 0.0)
+        })
+        self.fingerprints.maybe_save()
+    
+    def analyze_transcript(
+        self,
+        transcript_result: Dict,
+        victim_role_id: str = "R01",
+        trace_id: Optional[str] = None,
+        deep_advice: bool = False,
+        profile: Optional[bool] = None,
+        priority: Optional[str] = None
+    ) -> Dict:
+        """
+        分析已转录的通话，检测诈骗并生成防御建议
+        
+        Args:
+            transcript_result: ASRTool.transcribe_audio 的返回结果
+            victim_role_id: 受害者角色 ID
+            trace_id: 请求追踪 ID（为空时自动生成）
+            deep_advice: 由 Guardian 针对本次通话生成建议
+            profile: 是否对各阶段采集 cProfile（为空时按 PROFILE_SAMPLE_RATE 采样）
+            priority: 调度优先级 live / interactive / bulk（为空时沿用外层追踪，默认 interactive）
+            
+        Returns:
+            与 analyze_audio 相同的结果字典
+        """
+        with start_trace(trace_id, profile, priority) as trace:
+            return self._analyze_transcript(transcript_result, victim_role_id, trace, deep_advice)
+    
+    def analyze_text(
+        self,
+        transcript: Union[str, List[str]],
+        victim_role_id: str = "R01",
+        trace_id: Optional[str] = None,
+        deep_advice: bool = False,
+        profile: Optional[bool] = None,
+        priority: Optional[str] = None
+    ) -> Union[Dict, List]:
+        """
+        分析文本（短信、聊天记录、运营商 ASR 转写等），不经过语音转录
+        
+        Args:
+            transcript: 单条文本，或一批文本（批量时并发分析）
+            victim_role_id: 受害者角色 ID
+            trace_id: 请求追踪 ID；批量时各条为 <trace_id>-<序号>
+            deep_advice: 由 Guardian 针对本次通话生成建议
+            profile: 是否对各阶段采集 cProfile（为空时按 PROFILE_SAMPLE_RATE 采样）
+            priority: 调度优先级 live / interactive / bulk（为空时沿用外层追踪，默认 interactive）
+            
+        Returns:
+            单条文本时返回与 analyze_audio 相同的结果字典；
+            批量时返回顺序一致的结果列表，单条失败时对应位置为 Exception 实例
+        """
+        if isinstance(transcript, str):
+            return self.analyze_transcript(
+                text_to_transcript(transcript), victim_role_id, trace_id, deep_advice, profile, priority
+            )
+        
+        jobs = []
+        for i, text in enumerate(transcript):
+            options = {"deep_advice": deep_advice, "profile": profile, "priority": priority}
+            if trace_id:
+                options["trace_id"] = f"{trace_id}-{i}"
+            jobs.append((text_to_transcript(text), victim_role_id, options))
+        return self.analyze_transcript_batch(jobs)
+    
+    def _analyze_transcript(
+        self,
+        transcript_result: Dict,
+        victim_role_id: str,
+        trace: Trace,
+        deep_advice: bool = False
+    ) -> Dict:
+        """
+        分析流水线主体（在已开启的追踪上下文中执行）
+        
+        检测阶段（Watchdog + Profiler）与受害者无关：相同转录的并发请求（如不同角色
+        同时提交同一段录音）只执行一次，其余请求共享检测结果，只执行各自的建议步骤。
+        """
         transcript_text = transcript_result['text']
         logger.info(f"   转录完成，文本长度: {len(transcript_text)} 字符")
         logger.info(f"   内容预览: {transcript_text[:100]}...")
@@ -151,7 +472,298 @@ class AntiFraudSystem:
         victim_info = self.get_victim_info(victim_role_id)
         logger.info(f"\n👤 受害者信息: {victim_info['name']} ({victim_info['age']}岁)")
         
-        # Step 3: 创建智能体
+        # 轻量风险模型预测；明显正常的通话跳过检测与建议智能体
+        risk_prediction = self._predict_risk(transcript_text)
+        if risk_prediction is not None and risk_prediction["prefiltered"]:
+            return self._prefiltered_result(transcript_result, victim_info, risk_prediction, trace)
+        
+        # 检测期间按本地预测的诈骗类型投机执行 Guardian
+        use_llm_guardian = self.guardian_mode == "llm" or deep_advice
+        speculation = None
+        if use_llm_guardian and self.speculative_guardian:
+            speculation = self._speculate_guardian(transcript_text, victim_info, trace)
+        
+        # Step 3: 检测（相同转录的并发请求合并执行）
+        wait_start = time.perf_counter()
+        detection_key = hashlib.sha256(transcript_text.encode("utf-8")).hexdigest()
+        detection, shared = self.detect_flight.do(
+            detection_key, lambda: self._detect(transcript_result, trace)
+        )
+        if shared:
+            trace.add("detect:shared", time.perf_counter() - wait_start)
+            metrics.COALESCED.inc(layer="detect")
+        
+        return self._advise(
+            transcript_result, victim_info, detection, shared, trace, deep_advice, speculation, risk_prediction
+        )
+    
+    def _advise(
+        self,
+        transcript_result: Dict,
+        victim_info: Dict,
+        detection: Dict,
+        shared: bool,
+        trace: Trace,
+        deep_advice: bool = False,
+        speculation: Optional[Dict] = None,
+        risk_prediction: Optional[Dict] = None,
+        speculative: Optional[Tuple] = None
+    ) -> Dict:
+        """
+        建议步骤：按检测结果为指定受害者生成防御建议并组装结果
+        
+        Args:
+            detection: _detect() 的返回值
+            shared: 检测结果是否与其他请求共享（共享时不重复计入用量与压缩统计）
+            speculation: _speculate_guardian() 的状态（未投机执行时为 None）
+            speculative: 已在检测进程中采用的投机 Guardian 结果（_resolve_speculation() 的返回值）
+        """
+        transcript_text = transcript_result['text']
+        use_llm_guardian = self.guardian_mode == "llm" or deep_advice
+        
+        risk_level = detection["risk_level"]
+        scam_type = detection["scam_type"]
+        degraded_reason = detection["degraded_reason"]
+        # 共享的检测结果不重复计入用量与压缩统计
+        usage = _empty_usage() if shared else copy.deepcopy(detection["usage"])
+        prompt_stats = {} if shared else detection["prompt_stats"]
+        result = detection["raw_result"]
+        
+        # Step 4: 防御建议（与受害者相关，每个请求单独执行）
+        # 检测阶段始终经过 LLM；Guardian 仅在实时生成建议时调用
+        advice_source = None
+        if speculation is not None:
+            speculative = self._resolve_speculation(speculation, detection, trace)
+        if degraded_reason is None and use_llm_guardian:
+            if speculative is not None:
+                guardian_result, guardian_reason, guardian_usage = speculative
+            else:
+                guardian_result, guardian_reason, guardian_usage = self._run_guardian(
+                    detection["monitor_output"], detection["profile_output"], victim_info, trace
+                )
+            _merge_usage(usage, guardian_usage)
+            if guardian_reason is None:
+                result = guardian_result
+                defense_advice = str(guardian_result)
+                advice_source = "llm"
+            else:
+                # 检测结果保留，建议退回到预生成 / 模板
+                logger.warning(f"⚠️ Guardian 未完成（{guardian_reason}），使用预生成建议")
+                degraded_reason = guardian_reason
+        
+        if advice_source is None and detection["degraded_reason"] is None:
+            with stage("advice"):
+                defense_advice, advice_source = self._stored_advice(
+                    scam_type, risk_level, victim_info
+                )
+        elif advice_source is None:
+            # 降级：LLM 已给出的部分保留，其余由本地打分与建议模板补齐
+            logger.warning(f"⚠️ 使用降级结果（{degraded_reason}）")
+            with stage("degraded"):
+                fallback = self.local_analyzer.analyze(
+                    transcript_text, victim_info, risk_level, scam_type
+                )
+            risk_level = fallback["risk_level"]
+            scam_type = fallback["scam_type"]
+            defense_advice = fallback["defense_advice"]
+            advice_source = "template"
+        
+        logger.info(f"\n{'='*60}")
+        logger.info(f"✅ 分析完成！")
+        logger.info(f"   风险等级: {risk_level}")
+        logger.info(f"   诈骗类型: {scam_type}")
+        logger.info(f"{'='*60}\n")
+        
+        return {
+            "transcript": transcript_text,
+            "transcript_segments": transcript_result['segments'],
+            "audio_duration": transcript_result['duration'],
+            "risk_level": risk_level,
+            "scam_type": scam_type,
+            "defense_advice": defense_advice,
+            "victim_info": victim_info,
+            "raw_result": result,
+            "trace": trace.to_dict(),
+            "usage": usage,
+            "prompt_stats": prompt_stats,
+            "degraded": degraded_reason is not None,
+            "degraded_reason": degraded_reason,
+            "advice_source": advice_source,
+            "shared_detection": shared,
+            "fingerprint_match": None,
+            "risk_model": risk_prediction
+        }
+    
+    def detect_transcript(
+        self,
+        transcript_result: Dict,
+        trace_id: Optional[str] = None,
+        profile: Optional[bool] = None,
+        priority: Optional[str] = None,
+        victim_role_id: Optional[str] = None,
+        deep_advice: bool = False
+    ) -> Dict:
+        """
+        只执行与受害者无关的检测（风险模型预过滤、Watchdog 与 Profiler）
+        
+        多进程模式下前端进程按音频哈希合并相同请求的检测，只派发一次，
+        再由 advise_detected() 分别执行各角色的建议步骤。
+        
+        启用 SPECULATIVE_GUARDIAN 且给出 victim_role_id 时，检测期间同时为该角色投机执行
+        Guardian，命中的建议随检测结果返回（speculative_advice），由该角色的 advise_detected()
+        直接采用；共享这次检测的其他角色按实际结果生成建议。
+        
+        Returns:
+            可跨进程传递的检测结果（raw_result 已转为字符串），trace 为检测阶段的追踪记录；
+            风险模型预过滤放行时只含 risk_model 与 trace
+        """
+        with start_trace(trace_id, profile, priority) as trace:
+            risk_prediction = self._predict_risk(transcript_result['text'])
+            if risk_prediction is not None and risk_prediction["prefiltered"]:
+                return {"risk_model": risk_prediction, "trace": trace.to_dict()}
+            
+            speculation = None
+            use_llm_guardian = self.guardian_mode == "llm" or deep_advice
+            if victim_role_id is not None and use_llm_guardian and self.speculative_guardian:
+                speculation = self._speculate_guardian(
+                    transcript_result['text'], self.get_victim_info(victim_role_id), trace
+                )
+            
+            detection = self._detect(transcript_result, trace)
+            speculative_advice = None
+            if speculation is not None:
+                speculative = self._resolve_speculation(speculation, detection, trace)
+                if speculative is not None:
+                    guardian_result, guardian_reason, guardian_usage = speculative
+                    speculative_advice = {
+                        "role_id": victim_role_id,
+                        "result": str(guardian_result) if guardian_result is not None else None,
+                        "reason": guardian_reason,
+                        "usage": guardian_usage
+                    }
+            
+            raw_result = detection["raw_result"]
+            return {
+                **detection,
+                "raw_result": str(raw_result) if raw_result is not None else None,
+                "risk_model": risk_prediction,
+                "speculative_advice": speculative_advice,
+                "trace": trace.to_dict()
+            }
+    
+    def advise_detected(
+        self,
+        transcript_result: Dict,
+        victim_role_id: str,
+        detection: Dict,
+        shared: bool = False,
+        trace_id: Optional[str] = None,
+        deep_advice: bool = False,
+        profile: Optional[bool] = None,
+        priority: Optional[str] = None
+    ) -> Dict:
+        """
+        按 detect_transcript() 的检测结果执行指定受害者的建议步骤
+        
+        Args:
+            shared: 检测结果是否与其他请求共享（共享时不重复计入用量与压缩统计）
+            
+        Returns:
+            与 analyze_audio 相同的结果字典；trace 只含建议步骤，检测阶段的追踪由调用方合并
+        """
+        with start_trace(trace_id, profile, priority) as trace:
+            victim_info = self.get_victim_info(victim_role_id)
+            risk_prediction = detection.get("risk_model")
+            if risk_prediction is not None and risk_prediction["prefiltered"]:
+                return self._prefiltered_result(transcript_result, victim_info, risk_prediction, trace)
+            # 检测进程中为本角色投机执行且命中的 Guardian 结果
+            speculative = None
+            speculative_advice = detection.get("speculative_advice")
+            if speculative_advice is not None and speculative_advice["role_id"] == victim_role_id:
+                speculative = (speculative_advice["result"], speculative_advice["reason"],
+                               speculative_advice["usage"])
+            return self._advise(
+                transcript_result, victim_info, detection, shared, trace, deep_advice,
+                risk_prediction=risk_prediction, speculative=speculative
+            )
+    
+    def _predict_risk(self, transcript_text: str) -> Optional[Dict]:
+        """
+        轻量风险模型预测（未加载模型时为 None）
+        
+        Returns:
+            {"risk_level", "confidence", "safe_probability", "prefiltered"}
+        """
+        if self.risk_model is None:
+            return None
+        with stage("risk_model") as span:
+            prediction = self.risk_model.predict(transcript_text)
+            prediction["prefiltered"] = self.risk_prefilter and self.risk_model.is_safe(prediction)
+            span.update(prediction)
+        return prediction
+    
+    def _prefiltered_result(
+        self,
+        transcript_result: Dict,
+        victim_info: Dict,
+        risk_prediction: Dict,
+        trace: Trace
+    ) -> Dict:
+        """预过滤放行：风险模型判为正常通话，不调用 LLM，建议使用通用模板"""
+        logger.info(f"🟢 风险模型预过滤: P(Safe)={risk_prediction['safe_probability']:.3f}，跳过智能体")
+        with stage("advice"):
+            defense_advice, advice_source = self._stored_advice("无", "Safe", victim_info)
+        return {
+            "transcript": transcript_result['text'],
+            "transcript_segments": transcript_result['segments'],
+            "audio_duration": transcript_result['duration'],
+            "risk_level": "Safe",
+            "scam_type": "无",
+            "defense_advice": defense_advice,
+            "victim_info": victim_info,
+            "raw_result": None,
+            "trace": trace.to_dict(),
+            "usage": _empty_usage(),
+            "prompt_stats": {},
+            "degraded": False,
+            "degraded_reason": None,
+            "advice_source": advice_source,
+            "shared_detection": False,
+            "fingerprint_match": None,
+            "risk_model": risk_prediction
+        }
+    
+    def _detect(self, transcript_result: Dict, trace: Trace) -> Dict:
+        """
+        检测阶段：Watchdog 评估风险、Profiler 检索知识库识别诈骗类型
+        
+        Returns:
+            {"risk_level", "scam_type", "monitor_output", "profile_output",
+             "degraded_reason", "usage", "prompt_stats", "raw_result"}
+        """
+        transcript_text = transcript_result['text']
+        
+        # 按任务 token 预算压缩转录文本（同一段长转录不再在多个 Prompt 中全文重复）
+        with stage("condense"):
+            segments = transcript_result.get('segments')
+            monitor_input = self.condenser.condense(
+                transcript_text, self.prompt_budgets.get("monitor", 0), segments
+            )
+            profile_input = self.condenser.condense(
+                transcript_text, self.prompt_budgets.get("profile", 0), segments
+            )
+        prompt_stats = {
+            "monitor": monitor_input["stats"],
+            "profile": profile_input["stats"]
+        }
+        for task_name, stats in prompt_stats.items():
+            if stats["saved_tokens"]:
+                logger.info(
+                    f"📉 {task_name} 转录压缩: {stats['original_tokens']} -> "
+                    f"{stats['condensed_tokens']} tokens (-{stats['saved_ratio']:.0%})"
+                )
+        
+        # 创建智能体
         logger.info("\n🤖 Step 2: 初始化智能体...")
         watchdog = create_watchdog_agent()
         
@@ -177,103 +789,574 @@ class AntiFraudSystem:
             return output
         
         profiler = create_profiler_agent(tools=[search_knowledge_base])
-        guardian = create_guardian_agent()
         
-        # Step 4: 创建任务（顺序执行）
+        # 创建任务（顺序执行）
         logger.info("📋 Step 3: 创建任务流...")
         
         # 任务1: 监控
-        task1 = create_monitor_task(watchdog, transcript_text)
+        task1 = create_monitor_task(watchdog, monitor_input["text"])
         
         # 任务2: 侧写（依赖任务1）
         task2 = create_profile_task(
             profiler,
             monitor_result="{monitor_task_output}",  # 占位符，CrewAI 会自动替换
-            transcript_text=transcript_text
+            transcript_text=profile_input["text"]
         )
         task2.context = [task1]  # 设置依赖关系
         
-        # 任务3: 防御（依赖任务1和任务2）
-        task3 = create_defend_task(
-            guardian,
-            monitor_result="{monitor_task_output}",
-            profile_result="{profile_task_output}",
-            victim_info=victim_info
-        )
-        task3.context = [task1, task2]
+        # 记录每个任务的完成时刻，用于计算各智能体耗时与检查截止时间
+        agent_tasks = [("watchdog", watchdog, task1), ("profiler", profiler, task2)]
+        task_done_at: Dict[str, float] = {}
+        progress = threading.Condition()
+        for name, _, task in agent_tasks:
+            task.callback = _mark_done(task_done_at, name, progress)
         
-        # Step 5: 创建 Crew 并执行
+        # 创建 Crew 并执行
         logger.info("🚀 Step 4: 执行智能体协作...")
         crew = Crew(
-            agents=[watchdog, profiler, guardian],
-            tasks=[task1, task2, task3],
+            agents=[agent for _, agent, _ in agent_tasks],
+            tasks=[task for _, _, task in agent_tasks],
             process=Process.sequential,  # 顺序执行
             verbose=True
         )
         
-        result = crew.kickoff()
+        crew_start = time.perf_counter()
+        with stage("crew") as crew_span:
+            result, degraded_reason = self._kickoff_with_deadlines(
+                crew, [name for name, _, _ in agent_tasks], task_done_at, progress
+            )
+            crew_span["degraded"] = degraded_reason is not None
+            usage = _record_agent_stages(trace, agent_tasks, task_done_at, crew_start)
+            crew_span["llm_tokens"] = _llm_tokens(usage)
+        
+        # 每次调用的压缩效果：节省的转录 token 与对应智能体的实际 Prompt 规模和耗时
+        for task_name, agent_name in (("monitor", "watchdog"), ("profile", "profiler")):
+            prompt_stats[task_name]["prompt_tokens"] = usage["agents"][agent_name]["prompt_tokens"]
+            prompt_stats[task_name]["cached_ratio"] = _cached_ratio(usage["agents"][agent_name])
+            prompt_stats[task_name]["llm_seconds"] = round(trace.total(f"agent:{agent_name}"), 3)
         
-        # Step 6: 解析结果
+        # 解析结果
         logger.info("\n📊 Step 5: 解析结果...")
         
-        # 提取各个任务的输出以便精确解析
-        monitor_output = task1.output.raw if task1.output else ""
-        profile_output = task2.output.raw if task2.output else ""
-        defense_advice = str(result)
-        
-        # 1. 从监控专家输出提取风险等级
-        risk_level = "Unknown"
-        if "Critical" in monitor_output:
-            risk_level = "Critical"
-        elif "High" in monitor_output:
-            risk_level = "High"
-        elif "Medium" in monitor_output:
-            risk_level = "Medium"
-        elif "Safe" in monitor_output:
-            risk_level = "Safe"
-            
-        # 2. 从侧写师输出提取诈骗类型
-        scam_type = "Unknown"
-        # 优先通过正则匹配 "诈骗类型: [内容]"
-        import re
-        scam_type_match = re.search(r"诈骗类型:\s*([^\n\r]+)", profile_output)
-        if scam_type_match:
-            scam_type = scam_type_match.group(1).strip()
-        else:
-            # 备选方案：关键词扫描
-            for case_type in ["AI换脸", "FaceTime诈骗", "百万保障", "公检法", "杀猪盘", 
-                             "ETC", "退改签", "征信修复", "冒充领导", "虚假客服"]:
-                if case_type in profile_output:
-                    scam_type = case_type
-                    break
-        
-        logger.info(f"\n{'='*60}")
-        logger.info(f"✅ 分析完成！")
-        logger.info(f"   风险等级: {risk_level}")
-        logger.info(f"   诈骗类型: {scam_type}")
-        logger.info(f"{'='*60}\n")
+        # 提取各个任务的输出以便精确解析（超时放弃时只使用已完成的任务）
+        monitor_output = task1.output.raw if "watchdog" in task_done_at and task1.output else ""
+        profile_output = task2.output.raw if "profiler" in task_done_at and task2.output else ""
         
         return {
-            "transcript": transcript_text,
-            "transcript_segments": transcript_result['segments'],
-            "audio_duration": transcript_result['duration'],
-            "risk_level": risk_level,
-            "scam_type": scam_type,
-            "defense_advice": defense_advice,
-            "victim_info": victim_info,
+            # 1. 从监控专家输出提取风险等级
+            "risk_level": parse_risk_level(monitor_output),
+            # 2. 从侧写师输出提取诈骗类型
+            "scam_type": parse_scam_type(profile_output),
+            "monitor_output": monitor_output,
+            "profile_output": profile_output,
+            "degraded_reason": degraded_reason,
+            "usage": usage,
+            "prompt_stats": prompt_stats,
             "raw_result": result
         }
+    
+    def _run_guardian(
+        self,
+        monitor_output: str,
+        profile_output: str,
+        victim_info: Dict,
+        trace: Trace
+    ) -> Tuple[Optional[object], Optional[str], Dict]:
+        """
+        Guardian 根据检测结果为指定受害者生成建议
+        
+        Returns:
+            (CrewOutput, 降级原因, 用量)
+        """
+        guardian = create_guardian_agent()
+        task = create_defend_task(
+            guardian,
+            monitor_result=monitor_output,
+            profile_result=profile_output,
+            victim_info=victim_info
+        )
+        task_done_at: Dict[str, float] = {}
+        progress = threading.Condition()
+        task.callback = _mark_done(task_done_at, "guardian", progress)
+        crew = Crew(agents=[guardian], tasks=[task], process=Process.sequential, verbose=True)
+        
+        crew_start = time.perf_counter()
+        with stage("crew") as crew_span:
+            result, degraded_reason = self._kickoff_with_deadlines(
+                crew, ["guardian"], task_done_at, progress
+            )
+            crew_span["degraded"] = degraded_reason is not None
+            usage = _record_agent_stages(trace, [("guardian", guardian, task)], task_done_at, crew_start)
+            crew_span["llm_tokens"] = _llm_tokens(usage)
+        return result, degraded_reason, usage
+    
+    def _speculate_guardian(self, transcript_text: str, victim_info: Dict, trace: Trace) -> Dict:
+        """
+        在后台线程中按本地预测的诈骗类型提前执行 Guardian
+        
+        预测使用关键词与知识库近邻投票（LocalAnalyzer），Watchdog 的结论以本地信号打分代替。
+        投机执行使用独立的追踪记录，结果被采用时才合并进请求追踪。
+        
+        Returns:
+            投机执行状态，交给 _resolve_speculation()
+        """
+        speculation = {
+            "future": Future(),
+            "started": time.perf_counter(),
+            "trace": Trace(trace.trace_id, trace.profile, trace.priority),
+            "abandoned": threading.Event()
+        }
+        
+        def _run():
+            future = speculation["future"]
+            try:
+                with use_trace(speculation["trace"]):
+                    with stage("speculation:predict") as span:
+                        predicted, confidence = self.local_analyzer.scam_type(transcript_text)
+                        risk_level = self.local_analyzer.risk_level(transcript_text)
+                        span.update(predicted=predicted, confidence=confidence, risk_level=risk_level)
+                    # 先记录风险等级再记录类型：_resolve_speculation 看到 predicted 时两者都已就绪
+                    speculation["risk_level"] = risk_level
+                    speculation["predicted"] = predicted
+                    if predicted == "Unknown" or confidence < self.speculation_min_confidence:
+                        future.set_result(None)
+                        return
+                    if speculation["abandoned"].is_set():
+                        future.set_result(None)
+                        return
+                    outcome = self._run_guardian(
+                        f"风险等级: {risk_level}", f"诈骗类型: {predicted}", victim_info,
+                        speculation["trace"]
+                    )
+                speculation["finished"] = time.perf_counter()
+                future.set_result(outcome)
+            except Exception as e:
+                future.set_exception(e)
+        
+        threading.Thread(target=_run, name="speculative-guardian", daemon=True).start()
+        return speculation
+    
+    def _resolve_speculation(
+        self,
+        speculation: Dict,
+        detection: Dict,
+        trace: Trace
+    ) -> Optional[Tuple[Optional[object], Optional[str], Dict]]:
+        """
+        检测完成后决定是否采用投机执行的 Guardian
+        
+        预测类型与 Profiler 的类型一致、且本地风险等级与 Watchdog 的风险等级一致时
+        等待投机执行完成并采用（建议内容按投机时的风险等级写成，等级不同时不能与 Watchdog
+        的结论一起返回）；否则（含检测降级、预测置信度不足）放弃。已发出的 LLM 调用无法中断，被放弃的执行在后台自行结束，
+        结果不再使用。结论与节省的时间记为 speculation 阶段。
+        
+        Returns:
+            采用时为 _run_guardian() 的返回值，否则为 None
+        """
+        detected_at = time.perf_counter()
+        future: Future = speculation["future"]
+        predicted = speculation.get("predicted")
+        predicted_risk = speculation.get("risk_level")
+        
+        outcome = "miss"
+        if detection["degraded_reason"] is not None:
+            outcome = "discarded"
+        elif predicted is None and not future.done():
+            # 本地预测尚未完成（检测极快），不再等待
+            outcome = "discarded"
+        elif future.done() and future.exception() is not None:
+            outcome = "error"
+        elif future.done() and future.result() is None:
+            # 预测置信度不足，未执行投机
+            outcome = "skipped"
+        elif (match_case_type(detection["scam_type"], [predicted]) == predicted
+              and predicted_risk == detection["risk_level"]):
+            outcome = "hit"
+        
+        if outcome != "hit":
+            speculation["abandoned"].set()
+            trace.add("speculation", 0.0, outcome=outcome, predicted=predicted,
+                      detected=detection["scam_type"], saved_seconds=0.0)
+            if outcome == "miss":
+                logger.info(
+                    f"🔁 投机 Guardian 未命中（预测 {predicted}/{predicted_risk}，"
+                    f"实际 {detection['scam_type']}/{detection['risk_level']}），重新生成建议"
+                )
+            return None
+        
+        try:
+            guardian_outcome = future.result()
+        except Exception as e:
+            logger.warning(f"投机 Guardian 执行失败，重新生成建议: {e}")
+            trace.add("speculation", 0.0, outcome="error", predicted=predicted,
+                      detected=detection["scam_type"], saved_seconds=0.0)
+            return None
+        if guardian_outcome is None:
+            trace.add("speculation", 0.0, outcome="skipped", predicted=predicted,
+                      detected=detection["scam_type"], saved_seconds=0.0)
+            return None
+        
+        # 顺序执行时 Guardian 在检测完成后才开始：节省 = 检测完成时刻 + Guardian 耗时 - 实际完成时刻
+        finished = speculation["finished"]
+        guardian_seconds = finished - speculation["started"]
+        saved = detected_at + guardian_seconds - max(finished, detected_at)
+        trace.merge(speculation["trace"].to_dict())
+        trace.add("speculation", time.perf_counter() - detected_at, outcome="hit", predicted=predicted,
+                  detected=detection["scam_type"], saved_seconds=round(max(saved, 0.0), 4))
+        logger.info(f"⚡ 投机 Guardian 命中（{predicted}），节省 {saved:.2f}s")
+        return guardian_outcome
+    
+
+    def run_watchdog(
+        self,
+        transcript_text: str,
+        trace_id: Optional[str] = None,
+        priority: Optional[str] = None
+    ) -> Dict:
+        """
+        只运行 Watchdog 评估风险（实时通话中风险分越过阈值时调用）
+        
+        与完整流程共用转录压缩、截止时间与熔断保护；LLM 不可用时使用本地打分。
+        
+        Returns:
+            {"risk_level": ..., "monitor_output": ..., "degraded": bool,
+             "degraded_reason": ..., "trace": {...}}
+        """
+        with start_trace(trace_id, priority=priority) as trace:
+            with stage("condense"):
+                monitor_input = self.condenser.condense(
+                    transcript_text, self.prompt_budgets.get("monitor", 0)
+                )
+            
+            watchdog = create_watchdog_agent()
+            task = create_monitor_task(watchdog, monitor_input["text"])
+            task_done_at: Dict[str, float] = {}
+            progress = threading.Condition()
+            task.callback = _mark_done(task_done_at, "watchdog", progress)
+            crew = Crew(agents=[watchdog], tasks=[task], process=Process.sequential, verbose=False)
+            
+            crew_start = time.perf_counter()
+            with stage("crew") as crew_span:
+                _, degraded_reason = self._kickoff_with_deadlines(
+                    crew, ["watchdog"], task_done_at, progress
+                )
+                usage = _record_agent_stages(trace, [("watchdog", watchdog, task)], task_done_at, crew_start)
+                crew_span["llm_tokens"] = _llm_tokens(usage)
+            
+            monitor_output = task.output.raw if "watchdog" in task_done_at and task.output else ""
+            risk_level = parse_risk_level(monitor_output)
+            if degraded_reason is not None or risk_level == "Unknown":
+                risk_level = self.local_analyzer.risk_level(transcript_text)
+            
+            return {
+                "risk_level": risk_level,
+                "monitor_output": monitor_output,
+                "degraded": degraded_reason is not None,
+                "degraded_reason": degraded_reason,
+                "trace": trace.to_dict()
+            }
+    
+    def _stored_advice(self, scam_type: str, risk_level: str, victim_info: Dict) -> Tuple[str, str]:
+        """
+        查预生成建议库；未命中（或判定为 Safe）时使用通用建议模板
+        
+        Returns:
+            (建议文本, 来源 precomputed / template)
+        """
+        if risk_level != "Safe":
+            advice = self.advice_store.get(scam_type, risk_level, victim_info)
+            if advice is not None:
+                return advice, "precomputed"
+        return self.local_analyzer.advice(scam_type, risk_level, victim_info), "template"
+    
+    def _kickoff_with_deadlines(
+        self,
+        crew: Crew,
+        agent_names: List[str],
+        task_done_at: Dict[str, float],
+        progress: threading.Condition
+    ) -> Tuple[Optional[object], Optional[str]]:
+        """
+        在截止时间内执行智能体协作
+        
+        crew.kickoff() 在后台线程中运行，每个智能体的截止时间按顺序累加
+        （如 Watchdog 20s 内、Profiler 在此后 30s 内完成）。超时或出错时放弃
+        本次协作（后台线程的 LLM 调用受客户端超时约束，随后自行结束），
+        并计入 LLM 熔断器；熔断器打开期间直接跳过 LLM。
+        
+        Returns:
+            (CrewOutput, None)，或降级时 (None, 降级原因)
+        """
+        if self.force_degraded:
+            return None, "forced"
+        
+        breaker = get_llm_breaker()
+        if not breaker.allow():
+            return None, "circuit_open"
+        
+        outcome: Dict = {}
+        
+        def _run():
+            try:
+                # 智能体协作在本线程中执行，剖析需在此单独开启
+                trace = current_trace()
+                if trace is not None and trace.profile:
+                    with profiled(trace.trace_id, "crew.kickoff"):
+                        outcome["result"] = crew.kickoff()
+                else:
+                    outcome["result"] = crew.kickoff()
+            except Exception as e:
+                outcome["error"] = e
+            finally:
+                with progress:
+                    outcome["finished"] = True
+                    progress.notify_all()
+        
+        threading.Thread(target=bind(_run), name="crew", daemon=True).start()
+        
+        deadline: Optional[float] = time.monotonic()
+        for name in agent_names:
+            budget = self.agent_deadlines.get(name, 0)
+            deadline = deadline + budget if deadline is not None and budget > 0 else None
+            with progress:
+                progress.wait_for(
+                    lambda: name in task_done_at or "finished" in outcome,
+                    timeout=None if deadline is None else max(deadline - time.monotonic(), 0)
+                )
+            if "error" in outcome:
+                logger.error(f"智能体协作失败: {outcome['error']}")
+                breaker.record_failure(str(outcome["error"]))
+                return None, "error"
+            if name not in task_done_at:
+                breaker.record_failure(f"{name} 超时")
+                return None, f"deadline:{name}"
+        
+        with progress:
+            progress.wait_for(lambda: "finished" in outcome)
+        if "error" in outcome:
+            breaker.record_failure(str(outcome["error"]))
+            return None, "error"
+        
+        breaker.record_success()
+        return outcome["result"], None
+    
+    def analyze_transcript_batch(
+        self,
+        jobs: List[Tuple]
+    ) -> List:
+        """
+        并发分析一批已转录的通话
+        
+        每个请求的智能体协作在独立线程中运行，LLM 调用共享同一连接池并发发出，
+        Profiler 的 RAG 检索会被合并为批量向量计算（需设置 RAG_BATCH_MAX_DELAY_MS）。
+        
+        Args:
+            jobs: [(transcript_result, victim_role_id[, options]), ...]，
+                  options 为传给 analyze_transcript 的关键字参数（如 trace_id）
+            
+        Returns:
+            与 jobs 顺序一致的结果列表；单个请求失败时对应位置为 Exception 实例
+        """
+        def _analyze(job):
+            transcript_result, victim_role_id = job[0], job[1]
+            options = job[2] if len(job) > 2 else {}
+            return self.analyze_transcript(transcript_result, victim_role_id, **options)
+        
+        return _run_batch(_analyze, jobs)
+    
+    def advise_detected_batch(
+        self,
+        jobs: List[Tuple]
+    ) -> List:
+        """
+        并发执行一批建议步骤
+        
+        Args:
+            jobs: [(transcript_result, victim_role_id, detection, shared[, options]), ...]，
+                  options 为传给 advise_detected 的关键字参数（如 trace_id）
+            
+        Returns:
+            与 jobs 顺序一致的结果列表；单个请求失败时对应位置为 Exception 实例
+        """
+        def _advise(job):
+            options = job[4] if len(job) > 4 else {}
+            return self.advise_detected(*job[:4], **options)
+        
+        return _run_batch(_advise, jobs)
+
+
+def _run_batch(fn, jobs: List[Tuple]) -> List:
+    """每个请求在独立线程中执行，单个失败时对应位置为 Exception 实例"""
+    def _call(job):
+        try:
+            return fn(job)
+        except Exception as e:
+            logger.error(f"分析失败: {e}", exc_info=True)
+            return e
+    
+    if len(jobs) <= 1:
+        return [_call(job) for job in jobs]
+    
+    with ThreadPoolExecutor(max_workers=len(jobs)) as pool:
+        return list(pool.map(_call, jobs))
+
+
+def text_to_transcript(text: str) -> Dict:
+    """把纯文本包装成与 ASRTool.transcribe_audio 相同结构的转录结果"""
+    return {
+        "text": text.strip(),
+        "segments": [],  # 无时间戳，压缩时按标点切分
+        "language": "zh",
+        "duration": 0.0
+    }
+
+
+def parse_risk_level(monitor_output: str) -> str:
+    """从监控专家输出提取风险等级"""
+    for level in ("Critical", "High", "Medium", "Safe"):
+        if level in monitor_output:
+            return level
+    return "Unknown"
+
+
+def parse_scam_type(profile_output: str) -> str:
+    """从侧写师输出提取诈骗类型"""
+    # 优先通过正则匹配 "诈骗类型: [内容]"
+    scam_type_match = re.search(r"诈骗类型:\s*([^\n\r]+)", profile_output)
+    if scam_type_match:
+        return scam_type_match.group(1).strip()
+    # 备选方案：关键词扫描
+    for case_type in ["AI换脸", "FaceTime诈骗", "百万保障", "公检法", "杀猪盘", 
+                     "ETC", "退改签", "征信修复", "冒充领导", "虚假客服"]:
+        if case_type in profile_output:
+            return case_type
+    return "Unknown"
+
+
+def _mark_done(
+    task_done_at: Dict[str, float],
+    name: str,
+    progress: Optional[threading.Condition] = None
+):
+    """生成 Task 完成回调：记录完成时刻并唤醒等待截止时间的线程"""
+    def _callback(output):
+        if progress is None:
+            task_done_at[name] = time.perf_counter()
+            return
+        with progress:
+            task_done_at[name] = time.perf_counter()
+            progress.notify_all()
+    return _callback
+
+
+def _agent_usage(agent) -> Dict:
+    """读取 CrewAI 为单个智能体累计的 LLM 用量"""
+    token_process = getattr(agent, "_token_process", None)
+    if token_process is None:
+        return {"llm_calls": 0, "prompt_tokens": 0, "cached_prompt_tokens": 0, "completion_tokens": 0}
+    summary = token_process.get_summary()
+    return {
+        "llm_calls": summary.successful_requests,
+        "prompt_tokens": summary.prompt_tokens,
+        # 服务商 Prompt 缓存命中的输入 token（来自 usage.prompt_tokens_details.cached_tokens）
+        "cached_prompt_tokens": getattr(summary, "cached_prompt_tokens", 0) or 0,
+        "completion_tokens": summary.completion_tokens
+    }
+
+
+# 各智能体用量的计数字段
+USAGE_KEYS = ("llm_calls", "prompt_tokens", "cached_prompt_tokens", "completion_tokens")
+
+
+def _empty_usage() -> Dict:
+    return {"agents": {}, "llm_calls": 0, "prompt_tokens": 0, "cached_prompt_tokens": 0, "completion_tokens": 0}
+
+
+def _merge_usage(usage: Dict, other: Dict) -> None:
+    """把另一部分智能体的用量并入 usage"""
+    usage["agents"].update(other["agents"])
+    for key in USAGE_KEYS:
+        usage[key] += other[key]
+
+
+def _llm_tokens(usage: Dict) -> int:
+    """一次智能体协作消耗的 token 总数（按实际用量扣除 LLM 令牌桶）"""
+    return usage.get("prompt_tokens", 0) + usage.get("completion_tokens", 0)
+
+
+def _cached_ratio(usage: Dict) -> float:
+    """输入 token 中命中 Prompt 缓存的比例"""
+    prompt_tokens = usage.get("prompt_tokens", 0)
+    return round(usage.get("cached_prompt_tokens", 0) / prompt_tokens, 3) if prompt_tokens else 0.0
+
+
+def _record_agent_stages(
+    trace: Trace,
+    agent_tasks: List[Tuple],
+    task_done_at: Dict[str, float],
+    crew_start: float
+) -> Dict:
+    """
+    把各智能体的耗时与 token 用量记入追踪，返回汇总的用量
+    
+    顺序流程中每个智能体的耗时 = 本任务完成时刻 - 上一任务完成时刻。
+    """
+    usage = _empty_usage()
+    previous = crew_start
+    
+    for name, agent, _ in agent_tasks:
+        agent_usage = _agent_usage(agent)
+        usage["agents"][name] = agent_usage
+        for key in USAGE_KEYS:
+            usage[key] += agent_usage[key]
+        
+        done = task_done_at.get(name)
+        if done is not None:
+            trace.add(f"agent:{name}", done - previous, **agent_usage)
+            previous = done
+    
+    return usage
 
 
 def main():
     """主函数 - 命令行接口"""
     import argparse
+    import sys
+
+    # 子命令：batch / evaluate / precompute-advice / fingerprint-index / profile-report / bundle /
+    #         train-risk-model / calibrate-risk-model
+    if len(sys.argv) > 1 and sys.argv[1] == "batch":
+        from src.jobs.batch_runner import main as batch_main
+        return batch_main(sys.argv[2:])
+    if len(sys.argv) > 1 and sys.argv[1] == "evaluate":
+        from src.jobs.evaluate import main as evaluate_main
+        return evaluate_main(sys.argv[2:])
+    if len(sys.argv) > 1 and sys.argv[1] == "precompute-advice":
+        from src.jobs.precompute_advice import main as precompute_main
+        return precompute_main(sys.argv[2:])
+    if len(sys.argv) > 1 and sys.argv[1] == "fingerprint-index":
+        from src.jobs.build_fingerprints import main as fingerprint_main
+        return fingerprint_main(sys.argv[2:])
+    if len(sys.argv) > 1 and sys.argv[1] == "profile-report":
+        from src.utils.profiling import main as profile_report_main
+        return profile_report_main(sys.argv[2:])
+    if len(sys.argv) > 1 and sys.argv[1] == "bundle":
+        from src.jobs.build_bundle import main as bundle_main
+        return bundle_main(sys.argv[2:])
+    if len(sys.argv) > 1 and sys.argv[1] == "train-risk-model":
+        from src.jobs.train_risk_model import main as train_risk_main
+        return train_risk_main(sys.argv[2:])
+    if len(sys.argv) > 1 and sys.argv[1] == "calibrate-risk-model":
+        from src.jobs.calibrate_risk_model import main as calibrate_risk_main
+        return calibrate_risk_main(sys.argv[2:])
     
     parser = argparse.ArgumentParser(description='反诈骗智能检测系统')
     parser.add_argument('audio_path', help='音频文件路径')
     parser.add_argument('--role', default='R01', help='受害者角色 ID (默认: R01)')
     parser.add_argument('--init-kb', action='store_true', help='初始化知识库（首次运行）')
     parser.add_argument('--whisper-model', default='base', help='Whisper 模型大小')
+    parser.add_argument('--deep-advice', action='store_true',
+                        help='由 Guardian 针对本次通话生成建议（GUARDIAN_MODE=template 时生效）')
     
     args = parser.parse_args()
     
@@ -284,7 +1367,7 @@ def main():
     )
     
     # 分析音频
-    result = system.analyze_audio(args.audio_path, args.role)
+    result = system.analyze_audio(args.audio_path, args.role, deep_advice=args.deep_advice)
     
     # 输出结果
     print("\n" + "="*60)
@@ -5,21 +5,37 @@
 
 import os
 import yaml
+from functools import lru_cache
 from crewai import Agent
 from langchain_openai import ChatOpenAI
 from dotenv import load_dotenv
 
+from src.utils.resilience import CircuitBreaker
+
 # 加载环境变量
 load_dotenv()
 
 # 配置 LLM
+@lru_cache(maxsize=1)
 def get_llm():
-    """获取配置好的 LLM 实例"""
+    """获取配置好的 LLM 实例（进程内共享，所有智能体复用同一连接池）"""
     return ChatOpenAI(
         model=os.getenv("OPENAI_MODEL_NAME", "gpt-4o-mini"),
         api_key=os.getenv("OPENAI_API_KEY"),
         base_url=os.getenv("OPENAI_BASE_URL", "https://xiaoai.plus/v1"),
-        temperature=0.3  # 较低温度确保输出稳定
+        temperature=0.3,  # 较低温度确保输出稳定
+        timeout=float(os.getenv("LLM_TIMEOUT", "30")),  # 单次调用超时（秒）
+        max_retries=int(os.getenv("LLM_MAX_RETRIES", "1"))
+    )
+
+
+@lru_cache(maxsize=1)
+def get_llm_breaker() -> CircuitBreaker:
+    """共享 LLM 客户端的熔断器（进程内共享）"""
+    return CircuitBreaker(
+        "llm",
+        failure_threshold=int(os.getenv("LLM_BREAKER_FAILURES", "3")),
+        recovery_timeout=float(os.getenv("LLM_BREAKER_RECOVERY", "30"))
     )
 
 
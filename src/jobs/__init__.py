@@ -0,0 +1,25 @@
+"""
+反诈骗智能检测系统 - 离线任务模块
+"""
+
+from .batch_runner import BatchRunner, JsonlCheckpoint, collect_inputs
+from .evaluate import Evaluator, PIPELINE_MODES, register_mode
+from .precompute_advice import precompute_advice
+from .build_fingerprints import build_index
+from .build_bundle import build_bundle
+from .train_risk_model import train_risk_model
+from .calibrate_risk_model import calibrate_from_verdicts
+
+__all__ = [
+    'BatchRunner',
+    'JsonlCheckpoint',
+    'collect_inputs',
+    'Evaluator',
+    'PIPELINE_MODES',
+    'register_mode',
+    'precompute_advice',
+    'build_index',
+    'build_bundle',
+    'train_risk_model',
+    'calibrate_from_verdicts'
+]
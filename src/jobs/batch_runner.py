@@ -0,0 +1,328 @@
+"""
+离线批量分析
+系统只加载一次，ASR 在 CPU 线程池中并行，智能体阶段以有限并发执行，
+结果逐条写入 JSONL（可选最终转换为 Parquet），中断后可从断点继续
+"""
+
+import argparse
+import asyncio
+import csv
+import glob
+import json
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+import logging
+
+from src.utils.tracing import Trace, start_trace
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+_ROLE_PATTERN = re.compile(r"^(R\d+)_")
+
+# 写入结果时丢弃的字段（CrewOutput 不可序列化）
+_DROP_FIELDS = ("raw_result",)
+
+
+def _item(audio_path: str, role_id: Optional[str], default_role: str, item_id: Optional[str] = None) -> Dict:
+    stem = os.path.splitext(os.path.basename(audio_path))[0]
+    if not role_id:
+        # 文件名形如 R01_C02.mp3 时从中解析角色
+        match = _ROLE_PATTERN.match(stem)
+        role_id = match.group(1) if match else default_role
+    return {"id": item_id or stem, "audio_path": audio_path, "role_id": role_id}
+
+
+def collect_inputs(source: str, pattern: str = "*.mp3", default_role: str = "R01") -> List[Dict]:
+    """
+    收集待分析的音频
+
+    Args:
+        source: 音频目录，或清单文件（.txt 每行一个路径；.csv / .jsonl 含 audio_path，
+                可选 role_id、id 字段）
+        pattern: 目录模式下的文件匹配模式（如 R??_C??.mp3）
+        default_role: 无法确定角色时使用的角色 ID
+
+    Returns:
+        [{"id": ..., "audio_path": ..., "role_id": ...}, ...]
+    """
+    if os.path.isdir(source):
+        paths = sorted(glob.glob(os.path.join(source, pattern)))
+        return [_item(path, None, default_role) for path in paths]
+
+    base_dir = os.path.dirname(os.path.abspath(source))
+
+    def _resolve(path: str) -> str:
+        return path if os.path.isabs(path) else os.path.join(base_dir, path)
+
+    items = []
+    if source.endswith(".csv"):
+        with open(source, 'r', encoding='utf-8-sig', newline='') as f:
+            for row in csv.DictReader(f):
+                items.append(_item(_resolve(row['audio_path']), row.get('role_id'),
+                                   default_role, row.get('id')))
+    elif source.endswith(".jsonl"):
+        with open(source, 'r', encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    row = json.loads(line)
+                    items.append(_item(_resolve(row['audio_path']), row.get('role_id'),
+                                       default_role, row.get('id')))
+    else:
+        with open(source, 'r', encoding='utf-8') as f:
+            for line in f:
+                if line.strip() and not line.startswith("#"):
+                    items.append(_item(_resolve(line.strip()), None, default_role))
+    return items
+
+
+class JsonlCheckpoint:
+    """
+    以结果文件本身作为检查点：已写入的 id 即已完成
+
+    失败的条目写入单独的 .errors.jsonl，不计为完成，重新运行时会重试。
+    """
+
+    def __init__(self, path: str, fsync_every: int = 20):
+        self.path = path
+        self.errors_path = path + ".errors.jsonl"
+        self.fsync_every = fsync_every
+        self.done: Set[str] = self._load_done()
+        self._file = open(path, 'a', encoding='utf-8')
+        self._errors = open(self.errors_path, 'a', encoding='utf-8')
+        self._unsynced = 0
+
+    def _load_done(self) -> Set[str]:
+        """
+        读取已完成的 id，并截掉最后一条完整记录之后的内容
+
+        中断时可能留下半行，不截掉的话续写的记录会拼接在半行后面，整行都无法解析。
+        """
+        done = set()
+        if not os.path.exists(self.path):
+            return done
+        valid_end = 0
+        offset = 0
+        with open(self.path, 'rb') as f:
+            for line in f:
+                offset += len(line)
+                if not line.endswith(b"\n"):
+                    break
+                try:
+                    done.add(json.loads(line)["id"])
+                except (ValueError, KeyError):
+                    continue
+                valid_end = offset
+        if valid_end < os.path.getsize(self.path):
+            logger.warning(f"⚠️ 结果文件末尾有不完整的记录，已截断到 {valid_end} 字节: {self.path}")
+            with open(self.path, 'r+b') as f:
+                f.truncate(valid_end)
+        return done
+
+    def write(self, record: Dict) -> None:
+        self._file.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+        self.done.add(record["id"])
+        self._unsynced += 1
+        if self._unsynced >= self.fsync_every:
+            self.flush()
+
+    def write_error(self, item: Dict, error: Exception) -> None:
+        self._errors.write(json.dumps({**item, "error": str(error)}, ensure_ascii=False) + "\n")
+        self._errors.flush()
+
+    def flush(self) -> None:
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._unsynced = 0
+
+    def close(self) -> None:
+        self.flush()
+        self._file.close()
+        self._errors.close()
+
+
+class BatchRunner:
+    """批量分析执行器"""
+
+    def __init__(
+        self,
+        system,
+        asr_workers: int = 2,
+        llm_concurrency: int = 8,
+        priority: str = "bulk"
+    ):
+        """
+        Args:
+            system: 已初始化的 AntiFraudSystem
+            asr_workers: ASR 并行线程数（应与 Whisper 推理副本数一致）
+            llm_concurrency: 同时进行的智能体流程数
+            priority: 调度优先级（启用 PRIORITY_SCHEDULING 时生效，默认 bulk：只使用空闲容量）
+        """
+        self.system = system
+        self.asr_workers = asr_workers
+        self.llm_concurrency = llm_concurrency
+        self.priority = priority
+
+    def _transcribe(self, item: Dict) -> Tuple[Dict, Trace]:
+        """
+        在带优先级的追踪上下文中转录（供 ASR 线程池调用）
+
+        Returns:
+            (转录结果, 含 ASR 阶段的追踪记录)
+        """
+        with start_trace(item["id"], priority=self.priority) as trace:
+            return self.system.asr_tool.transcribe_audio(item["audio_path"]), trace
+
+    async def run(self, items: Iterable[Dict], checkpoint: JsonlCheckpoint) -> Dict:
+        """
+        执行批量分析
+
+        Returns:
+            {"completed": N, "failed": N, "skipped": N, "seconds": ...}
+        """
+        loop = asyncio.get_running_loop()
+        asr_pool = ThreadPoolExecutor(max_workers=self.asr_workers, thread_name_prefix="asr")
+        llm_slots = asyncio.Semaphore(self.llm_concurrency)
+        # 限制在途条目数，避免 5 万个文件一次性创建任务
+        inflight = asyncio.Semaphore(self.asr_workers * 2 + self.llm_concurrency)
+
+        stats = {"completed": 0, "failed": 0, "skipped": 0}
+        start = time.time()
+
+        async def _process(item: Dict) -> None:
+            try:
+                transcript, trace = await loop.run_in_executor(asr_pool, self._transcribe, item)
+                async with llm_slots:
+                    result = await asyncio.to_thread(
+                        self.system.analyze_transcript, transcript, item["role_id"],
+                        trace_id=item["id"], priority=self.priority
+                    )
+                # 分析阶段在新的追踪中执行，合并后记录中同时包含 ASR 耗时
+                trace.merge(result.get("trace"))
+                result["trace"] = trace.to_dict()
+                record = {**item, **{k: v for k, v in result.items() if k not in _DROP_FIELDS}}
+                checkpoint.write(record)
+                stats["completed"] += 1
+            except Exception as e:
+                logger.error(f"❌ {item['id']} 分析失败: {e}")
+                checkpoint.write_error(item, e)
+                stats["failed"] += 1
+            finally:
+                inflight.release()
+
+            finished = stats["completed"] + stats["failed"]
+            if finished % 10 == 0:
+                elapsed = time.time() - start
+                logger.info(f"📊 进度: {finished} 个完成，{finished / elapsed:.2f} 个/秒")
+
+        tasks = []
+        try:
+            for item in items:
+                if item["id"] in checkpoint.done:
+                    stats["skipped"] += 1
+                    continue
+                await inflight.acquire()
+                tasks.append(asyncio.create_task(_process(item)))
+            await asyncio.gather(*tasks)
+        finally:
+            asr_pool.shutdown(wait=True)
+
+        stats["seconds"] = round(time.time() - start, 2)
+        return stats
+
+
+def _export_parquet(jsonl_path: str, parquet_path: str) -> None:
+    """把 JSONL 结果转换为 Parquet（需要 pyarrow）"""
+    import pandas as pd
+
+    df = pd.read_json(jsonl_path, lines=True)
+    # 嵌套字段序列化为 JSON 字符串，保证列类型稳定
+    for column in df.columns:
+        if df[column].map(lambda v: isinstance(v, (dict, list))).any():
+            df[column] = df[column].map(lambda v: json.dumps(v, ensure_ascii=False, default=str))
+    df.to_parquet(parquet_path, index=False)
+    logger.info(f"✅ 已导出 Parquet: {parquet_path} ({len(df)} 条)")
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    """命令行入口：python main.py batch <目录|清单> --output results.jsonl"""
+    parser = argparse.ArgumentParser(
+        prog='main.py batch',
+        description='批量分析音频（模型只加载一次，支持断点续跑）'
+    )
+    parser.add_argument('source', help='音频目录或清单文件（.txt/.csv/.jsonl）')
+    parser.add_argument('--output', '-o', default='batch_results.jsonl',
+                        help='结果文件（.jsonl 或 .parquet，默认 batch_results.jsonl）')
+    parser.add_argument('--pattern', default='*.mp3', help='目录模式下的匹配模式（默认 *.mp3）')
+    parser.add_argument('--role', default='R01', help='无法从文件名解析时的默认角色 ID')
+    parser.add_argument('--asr-workers', type=int, default=max(1, (os.cpu_count() or 2) // 2),
+                        help='ASR 并行数（默认 CPU 核数的一半）')
+    parser.add_argument('--llm-concurrency', type=int, default=8,
+                        help='同时进行的智能体流程数（默认 8）')
+    parser.add_argument('--priority', choices=['live', 'interactive', 'bulk'], default='bulk',
+                        help='调度优先级（PRIORITY_SCHEDULING=true 时生效，默认 bulk）')
+    parser.add_argument('--whisper-model', default='base', help='Whisper 模型大小')
+    parser.add_argument('--init-kb', action='store_true', help='初始化知识库（首次运行）')
+    args = parser.parse_args(argv)
+
+    # ASR 线程数与 Whisper 推理副本数一致，副本共享权重
+    os.environ.setdefault("WHISPER_NUM_WORKERS", str(args.asr_workers))
+
+    from main import AntiFraudSystem
+
+    items = collect_inputs(args.source, args.pattern, args.role)
+    logger.info(f"📂 共 {len(items)} 个待分析文件")
+
+    parquet_output = args.output.endswith(".parquet")
+    jsonl_path = args.output + ".partial.jsonl" if parquet_output else args.output
+    checkpoint = JsonlCheckpoint(jsonl_path)
+    if checkpoint.done:
+        logger.info(f"♻️ 从检查点继续：已完成 {len(checkpoint.done)} 个")
+
+    system = AntiFraudSystem(
+        whisper_model_size=args.whisper_model,
+        init_knowledge_base=args.init_kb
+    )
+
+    runner = BatchRunner(system, args.asr_workers, args.llm_concurrency, args.priority)
+    try:
+        stats = asyncio.run(runner.run(items, checkpoint))
+    finally:
+        checkpoint.close()
+
+    logger.info(
+        f"✅ 批量分析结束：完成 {stats['completed']}，失败 {stats['failed']}，"
+        f"跳过 {stats['skipped']}，耗时 {stats['seconds']}s"
+    )
+    if stats['failed']:
+        logger.info(f"   失败明细: {checkpoint.errors_path}（重新运行即可重试）")
+
+    if parquet_output:
+        _export_parquet(jsonl_path, args.output)
+
+
+if __name__ == "__main__":
+    # 测试代码：从中断时留下半行的结果文件续跑
+    import tempfile
+
+    print("\n=== 测试断点续跑 ===\n")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "results.jsonl")
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write('{"id": "a", "x": 1}\n{"id": "b", "x"')
+
+        checkpoint = JsonlCheckpoint(path)
+        assert checkpoint.done == {"a"}, checkpoint.done
+        checkpoint.write({"id": "b", "x": 2})
+        checkpoint.close()
+
+        with open(path, 'r', encoding='utf-8') as f:
+            records = [json.loads(line) for line in f]
+        assert [r["id"] for r in records] == ["a", "b"], records
+        assert JsonlCheckpoint(path).done == {"a", "b"}
+        print(f"续跑后记录: {records}")
@@ -0,0 +1,180 @@
+"""
+导出离线模型包
+把 Whisper（CTranslate2 格式）、嵌入模型与已构建的知识库复制到一个版本目录，
+写入 manifest.json 与各文件的 SHA-256，供无网络环境通过 MODEL_BUNDLE_DIR 加载
+"""
+
+import argparse
+import json
+import os
+import shutil
+import time
+from typing import Dict, List, Optional
+import logging
+
+from src.tools.kb_snapshots import LEGACY_VERSION, KBSnapshots
+from src.utils.model_bundle import BUNDLE_FORMAT, MANIFEST_NAME, hash_tree
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def export_whisper(model: str, target: str) -> None:
+    """导出 Whisper：本地 CTranslate2 目录直接复制，否则从 Hub 下载转换好的模型"""
+    if os.path.isdir(model):
+        shutil.copytree(model, target)
+        return
+    from faster_whisper.utils import download_model
+
+    download_model(model, output_dir=target)
+
+
+def export_embedding(model: str, target: str, dtype: str = "float32") -> None:
+    """
+    导出嵌入模型（safetensors，加载时按 mmap 读取）
+
+    Args:
+        dtype: float32 或 float16（磁盘占用减半，加载时按默认精度还原为 float32）
+    """
+    from sentence_transformers import SentenceTransformer
+
+    embedder = SentenceTransformer(model, device="cpu")
+    if dtype == "float16":
+        embedder = embedder.half()
+    embedder.save(target, safe_serialization=True)
+
+
+def export_tiktoken(target: str) -> bool:
+    """把当前模型的 tiktoken 词表下载到包内缓存目录（未安装 tiktoken 时跳过）"""
+    try:
+        import tiktoken
+    except ImportError:
+        return False
+    os.makedirs(target, exist_ok=True)
+    previous = os.environ.get("TIKTOKEN_CACHE_DIR")
+    os.environ["TIKTOKEN_CACHE_DIR"] = target
+    try:
+        model = os.getenv("OPENAI_MODEL_NAME", "gpt-4o-mini")
+        try:
+            tiktoken.encoding_for_model(model)
+        except KeyError:
+            tiktoken.get_encoding("o200k_base")
+    except Exception as e:
+        logger.warning(f"tiktoken 词表导出失败，跳过: {e}")
+        shutil.rmtree(target, ignore_errors=True)
+        return False
+    finally:
+        if previous is None:
+            os.environ.pop("TIKTOKEN_CACHE_DIR", None)
+        else:
+            os.environ["TIKTOKEN_CACHE_DIR"] = previous
+    return True
+
+
+def export_kb(kb_dir: str, version: str, target: str) -> None:
+    """
+    只导出知识库的当前版本（不含旧版本与构建中的 .partial 目录）
+
+    导出结果仍是版本目录 + CURRENT 的布局，安装后即为该版本；旧布局原样复制。
+    """
+    snapshots = KBSnapshots(kb_dir)
+    if version == LEGACY_VERSION:
+        shutil.copytree(kb_dir, target, ignore=shutil.ignore_patterns("v[0-9][0-9][0-9][0-9]*", "*.partial"))
+        return
+    shutil.copytree(snapshots.path(version), os.path.join(target, version))
+    KBSnapshots(target).set_current(version)
+
+
+def build_bundle(
+    output_dir: str,
+    whisper_model: str = "base",
+    embedding_model: str = "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2",
+    kb_dir: Optional[str] = "./db/chroma",
+    embedding_dtype: str = "float32",
+    version: Optional[str] = None
+) -> str:
+    """
+    导出模型包到 <output_dir>/<version>
+
+    先写入临时目录，全部完成并写好 manifest 后再改名，不会留下不完整的版本。
+
+    Returns:
+        模型包目录
+    """
+    version = version or time.strftime("%Y%m%d-%H%M%S")
+    target = os.path.join(output_dir, version)
+    if os.path.exists(target):
+        raise FileExistsError(f"模型包版本已存在: {target}")
+    staging = target + ".partial"
+    shutil.rmtree(staging, ignore_errors=True)
+    os.makedirs(staging)
+
+    components: Dict[str, Dict] = {}
+    try:
+        logger.info(f"🎙️ 导出 Whisper 模型: {whisper_model}")
+        export_whisper(whisper_model, os.path.join(staging, "whisper"))
+        components["whisper"] = {"source": whisper_model, "format": "ctranslate2"}
+
+        logger.info(f"🧬 导出嵌入模型: {embedding_model} ({embedding_dtype})")
+        export_embedding(embedding_model, os.path.join(staging, "embedding"), embedding_dtype)
+        components["embedding"] = {"source": embedding_model, "dtype": embedding_dtype}
+
+        kb_version = KBSnapshots(kb_dir).current() if kb_dir and os.path.isdir(kb_dir) else None
+        if kb_version is not None:
+            logger.info(f"📚 复制知识库当前版本: {kb_dir} ({kb_version})")
+            export_kb(kb_dir, kb_version, os.path.join(staging, "kb"))
+            components["kb"] = {"source": os.path.abspath(kb_dir), "version": kb_version}
+        else:
+            logger.warning(f"未找到知识库 {kb_dir}，模型包中不包含知识库")
+
+        if export_tiktoken(os.path.join(staging, "tiktoken")):
+            components["tiktoken"] = {"model": os.getenv("OPENAI_MODEL_NAME", "gpt-4o-mini")}
+
+        logger.info("🔐 计算校验和...")
+        files = hash_tree(staging)
+        manifest = {
+            "format": BUNDLE_FORMAT,
+            "version": version,
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "components": components,
+            "files": files
+        }
+        with open(os.path.join(staging, MANIFEST_NAME), 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+    except BaseException:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+
+    os.replace(staging, target)
+    total_mb = sum(f["size"] for f in files.values()) / 1024 / 1024
+    logger.info(f"✅ 模型包已导出: {target}（{len(files)} 个文件，{total_mb:.1f} MB）")
+    return target
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    """命令行入口：python main.py bundle"""
+    parser = argparse.ArgumentParser(
+        prog='main.py bundle',
+        description='导出离线模型包（Whisper、嵌入模型、知识库与校验和）'
+    )
+    parser.add_argument('--output', default='./bundles', help='输出目录（在其下创建版本子目录）')
+    parser.add_argument('--version', default=None, help='模型包版本（默认按时间生成）')
+    parser.add_argument('--whisper-model', default=os.getenv("WHISPER_MODEL_SIZE", "base"),
+                        help='Whisper 模型大小、Hub ID 或本地 CTranslate2 目录')
+    parser.add_argument('--embedding-model', default=os.getenv(
+        "EMBEDDING_MODEL", "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2"
+    ), help='嵌入模型名称或本地目录')
+    parser.add_argument('--embedding-dtype', choices=['float32', 'float16'], default='float32',
+                        help='嵌入模型权重精度')
+    parser.add_argument('--kb', default=os.getenv("CHROMA_PERSIST_DIR", "./db/chroma"),
+                        help='已构建的知识库目录')
+    args = parser.parse_args(argv)
+
+    build_bundle(
+        args.output,
+        whisper_model=args.whisper_model,
+        embedding_model=args.embedding_model,
+        kb_dir=args.kb,
+        embedding_dtype=args.embedding_dtype,
+        version=args.version
+    )
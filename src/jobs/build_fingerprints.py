@@ -0,0 +1,82 @@
+"""
+从已有分析结果构建音频指纹索引
+读取批量分析输出（JSONL，每行含 audio_path 与判定），对未入库的录音计算指纹并写入索引
+"""
+
+import argparse
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+import logging
+
+from src.tools.audio_fingerprint import FingerprintIndex, fingerprint, load_audio
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+# 写入索引的判定字段
+VERDICT_FIELDS = ("risk_level", "scam_type", "transcript", "transcript_segments", "audio_duration")
+
+
+def load_verdicts(results_path: str) -> List[Dict]:
+    """读取批量分析结果，跳过降级结果与缺少音频路径的记录"""
+    records = []
+    with open(results_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if record.get("audio_path") and not record.get("degraded"):
+                records.append(record)
+    return records
+
+
+def build_index(index: FingerprintIndex, records: List[Dict], workers: int = 4) -> Tuple[int, int]:
+    """
+    计算指纹并加入索引（已入库的 audio_path 跳过）
+
+    Returns:
+        (新增数, 失败数)
+    """
+    indexed = {v.get("audio_path") for v in index.verdicts}
+    pending = [r for r in records if r["audio_path"] not in indexed]
+    logger.info(f"📋 {len(records)} 条结果，待入库 {len(pending)} 段录音")
+
+    def _fingerprint(record: Dict):
+        try:
+            return fingerprint(load_audio(record["audio_path"]))
+        except Exception as e:
+            logger.error(f"❌ {record['audio_path']} 指纹计算失败: {e}")
+            return None
+
+    added, failed = 0, 0
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for record, audio_fingerprint in zip(pending, pool.map(_fingerprint, pending)):
+            if audio_fingerprint is None:
+                failed += 1
+                continue
+            verdict = {k: record[k] for k in VERDICT_FIELDS if k in record}
+            index.add(*audio_fingerprint, {**verdict, "audio_path": record["audio_path"]})
+            added += 1
+    return added, failed
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    """命令行入口：python main.py fingerprint-index"""
+    parser = argparse.ArgumentParser(
+        prog='main.py fingerprint-index',
+        description='从批量分析结果构建音频指纹索引'
+    )
+    parser.add_argument('results', help='批量分析输出（python main.py batch 的 JSONL）')
+    parser.add_argument('--index', default=os.getenv("FINGERPRINT_INDEX", "./db/fingerprints"),
+                        help='索引路径前缀')
+    parser.add_argument('--workers', type=int, default=4, help='并发解码数（默认 4）')
+    args = parser.parse_args(argv)
+
+    index = FingerprintIndex(args.index)
+    added, failed = build_index(index, load_verdicts(args.results), args.workers)
+    index.save(compact=True)
+    logger.info(f"✅ 指纹索引构建完成：新增 {added}，失败 {failed}，共 {len(index)} 段录音 ({args.index})")
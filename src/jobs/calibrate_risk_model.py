@@ -0,0 +1,90 @@
+"""
+按 Watchdog 判定校准轻量风险模型
+从判定库（VERDICT_DB）读取 Watchdog 实际给出风险等级的记录（未降级、也未被预过滤），
+拟合温度并确定 Safe 预过滤阈值：模型放行的通话中 Watchdog 判为 Safe 的比例不低于目标精度
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+from typing import Dict, List, Optional, Tuple
+import logging
+
+from src.tools.risk_model import RISK_LEVELS, RiskModel, calibrate
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def load_llm_verdicts(verdict_db: str, limit: int = 50000) -> Tuple[List[str], List[str]]:
+    """
+    读取 Watchdog 判定（最新的 limit 条）
+
+    只取阶段记录中包含 agent:watchdog 且未降级的记录：预过滤放行与降级结果的
+    风险等级不是 Watchdog 给出的，计入会让校准自我强化。
+    """
+    conn = sqlite3.connect(f"file:{verdict_db}?mode=ro", uri=True)
+    try:
+        rows = conn.execute(
+            "SELECT transcript, risk_level, timings FROM verdicts "
+            "WHERE degraded = 0 AND transcript IS NOT NULL ORDER BY id DESC LIMIT ?",
+            (limit,)
+        ).fetchall()
+    finally:
+        conn.close()
+
+    texts, labels = [], []
+    for transcript, risk_level, timings in rows:
+        stages = {s.get("name") for s in json.loads(timings or "[]")}
+        if "agent:watchdog" in stages and risk_level in RISK_LEVELS and transcript.strip():
+            texts.append(transcript)
+            labels.append(risk_level)
+    return texts, labels
+
+
+def calibrate_from_verdicts(
+    model: RiskModel,
+    verdict_db: str,
+    min_precision: float = 0.98,
+    min_support: int = 20
+) -> Dict:
+    """读取判定库并校准 model（原地修改）"""
+    texts, labels = load_llm_verdicts(verdict_db)
+    if not texts:
+        logger.warning(f"⚠️ 判定库中没有可用于校准的 Watchdog 判定: {verdict_db}")
+        return {"samples": 0}
+    report = calibrate(model, texts, labels, min_precision, min_support)
+    if report["safe_threshold"] is None:
+        logger.warning(f"⚠️ {len(texts)} 条判定中找不到精度达到 {min_precision:.0%} 的 Safe 阈值，预过滤不生效")
+    else:
+        logger.info(
+            f"🎯 校准完成: 温度 {report['temperature']}，Safe 阈值 {report['safe_threshold']:.4f}，"
+            f"放行 {report['prefilter_rate']:.1%}（与 Watchdog 一致率 {report['agreement']:.1%}）"
+        )
+    return report
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    """命令行入口：python main.py calibrate-risk-model"""
+    parser = argparse.ArgumentParser(
+        prog='main.py calibrate-risk-model',
+        description='按判定库中的 Watchdog 判定校准风险模型的概率与 Safe 预过滤阈值'
+    )
+    parser.add_argument('--model', default=os.getenv("RISK_MODEL_PATH", "./models/risk_model.npz"),
+                        help='模型文件（原地更新）')
+    parser.add_argument('--verdicts', default=(os.getenv("VERDICT_DB") or "./db/verdicts.db"), help='判定库')
+    parser.add_argument('--min-precision', type=float, default=0.98,
+                        help='放行的通话中 Watchdog 判为 Safe 的最低比例')
+    parser.add_argument('--min-support', type=int, default=20, help='阈值以上至少需要的样本数')
+    args = parser.parse_args(argv)
+
+    model = RiskModel.load(args.model)
+    report = calibrate_from_verdicts(model, args.verdicts, args.min_precision, args.min_support)
+    if report.get("samples"):
+        model.save(args.model)
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,310 @@
+"""
+评测工具
+以 data/mapping_full.csv 中的真实 case_type / risk_level 为标准，
+对不同流水线模式统计准确率、混淆矩阵、延迟与 LLM 调用开销
+"""
+
+import argparse
+import csv
+import json
+import os
+import re
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+# 流水线模式：模式名 -> 需要覆盖的 AntiFraudSystem 属性
+# 新的加速模式在此注册后即可用 --modes 参与对比
+PIPELINE_MODES: Dict[str, Dict] = {
+    # 转录全文进入每个 Prompt
+    "full": {"prompt_budgets": {"monitor": 0, "profile": 0}},
+    # 按任务 token 预算压缩转录（系统默认配置）
+    "condensed": {},
+    # 不调用 LLM：本地信号打分 + RAG 近邻投票 + 建议模板
+    "degraded": {"force_degraded": True},
+    # 检测经过 LLM，防御建议查预生成建议库
+    "template_guardian": {"guardian_mode": "template"}
+}
+
+RISK_LEVELS = ["Critical", "High", "Medium", "Safe", "Unknown"]
+
+_ROLE_PATTERN = re.compile(r"^(R\d+)_")
+
+
+def register_mode(name: str, **overrides) -> None:
+    """注册流水线模式"""
+    PIPELINE_MODES[name] = overrides
+
+
+@contextmanager
+def apply_mode(system, mode: str):
+    """在上下文内把系统切换到指定模式，退出时恢复原配置（默认关闭指纹匹配与风险预过滤）"""
+    if mode not in PIPELINE_MODES:
+        raise ValueError(f"未知的流水线模式: {mode}，可选: {', '.join(PIPELINE_MODES)}")
+    # 指纹命中会直接返回已存储的判定，预过滤会跳过 Watchdog，二者都会让各模式的对比失真，
+    # 除非模式显式开启
+    overrides = {"fingerprints": None, "risk_prefilter": False, **PIPELINE_MODES[mode]}
+    original = {name: getattr(system, name) for name in overrides}
+    for name, value in overrides.items():
+        setattr(system, name, value)
+    try:
+        yield system
+    finally:
+        for name, value in original.items():
+            setattr(system, name, value)
+
+
+def load_samples(
+    mapping_csv: str = "./data/mapping_full.csv",
+    audio_dir: Optional[str] = None,
+    role_registry=None,
+    limit: Optional[int] = None
+) -> List[Dict]:
+    """
+    读取评测样本
+
+    Args:
+        mapping_csv: 标注文件（id, case_id, case_type, risk_level, role_name, text）
+        audio_dir: 音频目录；指定时按 <id>.mp3 查找音频，走 ASR
+        role_registry: 用于把 role_name 映射为角色 ID
+        limit: 只取前 N 条
+
+    Returns:
+        [{"id", "role_id", "case_type", "risk_level", "text", "audio_path"}, ...]
+    """
+    name_to_id = {}
+    if role_registry is not None:
+        name_to_id = {record.name: record.id for record in role_registry.all()}
+
+    samples = []
+    with open(mapping_csv, 'r', encoding='utf-8-sig', newline='') as f:
+        for row in csv.DictReader(f):
+            sample_id = str(row['id'])
+            match = _ROLE_PATTERN.match(sample_id)
+            role_id = match.group(1) if match else name_to_id.get(row.get('role_name'), "R01")
+
+            audio_path = None
+            if audio_dir:
+                audio_path = os.path.join(audio_dir, f"{sample_id}.mp3")
+                if not os.path.exists(audio_path):
+                    logger.warning(f"⚠️ 未找到音频，跳过: {audio_path}")
+                    continue
+
+            samples.append({
+                "id": sample_id,
+                "role_id": role_id,
+                "case_type": row['case_type'],
+                "risk_level": row['risk_level'],
+                "text": row['text'],
+                "audio_path": audio_path
+            })
+            if limit and len(samples) >= limit:
+                break
+    return samples
+
+
+def normalize_scam_type(predicted: str, labels: List[str]) -> str:
+    """把智能体输出的诈骗类型归一到标注的类型集合（如 '公检法诈骗' -> '公检法'）"""
+    if predicted in labels:
+        return predicted
+    for label in sorted(labels, key=len, reverse=True):
+        if label and label in predicted:
+            return label
+    return "Unknown" if predicted == "Unknown" else "Other"
+
+
+def confusion_matrix(pairs: List[tuple], labels: List[str]) -> Dict[str, Dict[str, int]]:
+    """混淆矩阵 {真实: {预测: 次数}}"""
+    matrix = {truth: {pred: 0 for pred in labels} for truth in labels}
+    for truth, pred in pairs:
+        matrix.setdefault(truth, {p: 0 for p in labels})
+        matrix[truth][pred] = matrix[truth].get(pred, 0) + 1
+    return matrix
+
+
+def _percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(int(round(q * (len(ordered) - 1))), len(ordered) - 1)
+    return ordered[index]
+
+
+def summarize(records: List[Dict], scam_labels: List[str]) -> Dict:
+    """汇总单个模式的评测结果"""
+    ok = [r for r in records if "error" not in r]
+    latencies = [r["latency"] for r in ok]
+    llm_calls = sum(r["llm_calls"] for r in ok)
+    prompt_tokens = sum(r["prompt_tokens"] for r in ok)
+    cached_prompt_tokens = sum(r.get("cached_prompt_tokens", 0) for r in ok)
+    completion_tokens = sum(r["completion_tokens"] for r in ok)
+
+    risk_pairs = [(r["truth_risk"], r["risk_level"]) for r in ok]
+    type_pairs = [(r["truth_type"], r["scam_type"]) for r in ok]
+    type_labels = scam_labels + ["Other", "Unknown"]
+
+    return {
+        "samples": len(records),
+        "failed": len(records) - len(ok),
+        "risk_accuracy": round(sum(t == p for t, p in risk_pairs) / len(ok), 4) if ok else 0.0,
+        "type_accuracy": round(sum(t == p for t, p in type_pairs) / len(ok), 4) if ok else 0.0,
+        "latency_mean": round(statistics.mean(latencies), 3) if latencies else 0.0,
+        "latency_p50": round(_percentile(latencies, 0.5), 3),
+        "latency_p95": round(_percentile(latencies, 0.95), 3),
+        "llm_calls_mean": round(llm_calls / len(ok), 2) if ok else 0.0,
+        "prompt_tokens_per_call": round(prompt_tokens / llm_calls, 1) if llm_calls else 0.0,
+        "completion_tokens_per_call": round(completion_tokens / llm_calls, 1) if llm_calls else 0.0,
+        "cached_prompt_ratio": round(cached_prompt_tokens / prompt_tokens, 4) if prompt_tokens else 0.0,
+        "prompt_tokens_saved": sum(r["prompt_tokens_saved"] for r in ok),
+        "risk_confusion": confusion_matrix(risk_pairs, RISK_LEVELS),
+        "type_confusion": confusion_matrix(type_pairs, type_labels)
+    }
+
+
+class Evaluator:
+    """按流水线模式运行评测样本"""
+
+    def __init__(self, system, concurrency: int = 4):
+        """
+        Args:
+            system: 已初始化的 AntiFraudSystem
+            concurrency: 并发分析的样本数
+        """
+        self.system = system
+        self.concurrency = concurrency
+
+    def _run_sample(self, sample: Dict, mode: str, scam_labels: List[str]) -> Dict:
+        record = {
+            "id": sample["id"],
+            "mode": mode,
+            "truth_risk": sample["risk_level"],
+            "truth_type": sample["case_type"]
+        }
+        start = time.perf_counter()
+        try:
+            if sample["audio_path"]:
+                result = self.system.analyze_audio(
+                    sample["audio_path"], sample["role_id"], trace_id=f"{mode}-{sample['id']}"
+                )
+            else:
+                result = self.system.analyze_text(
+                    sample["text"], sample["role_id"], trace_id=f"{mode}-{sample['id']}"
+                )
+        except Exception as e:
+            logger.error(f"❌ 样本 {sample['id']} 失败: {e}")
+            record["error"] = str(e)
+            return record
+
+        usage = result.get("usage") or {}
+        record.update({
+            "latency": round(time.perf_counter() - start, 3),
+            "risk_level": result["risk_level"],
+            "scam_type": normalize_scam_type(result["scam_type"], scam_labels),
+            "scam_type_raw": result["scam_type"],
+            "llm_calls": usage.get("llm_calls", 0),
+            "prompt_tokens": usage.get("prompt_tokens", 0),
+            "cached_prompt_tokens": usage.get("cached_prompt_tokens", 0),
+            "completion_tokens": usage.get("completion_tokens", 0),
+            "prompt_tokens_saved": sum(
+                s.get("saved_tokens", 0) for s in (result.get("prompt_stats") or {}).values()
+            )
+        })
+        return record
+
+    def run(self, samples: List[Dict], modes: List[str]) -> Dict:
+        """
+        依次以每个模式评测全部样本
+
+        Returns:
+            {"modes": {模式: 汇总}, "records": [逐样本记录]}
+        """
+        scam_labels = sorted({s["case_type"] for s in samples})
+        report = {"modes": {}, "records": []}
+
+        for mode in modes:
+            logger.info(f"🧪 评测模式 {mode}：{len(samples)} 个样本")
+            with apply_mode(self.system, mode):
+                with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+                    records = list(pool.map(
+                        lambda s: self._run_sample(s, mode, scam_labels), samples
+                    ))
+            report["modes"][mode] = summarize(records, scam_labels)
+            report["records"].extend(records)
+        return report
+
+
+def format_report(report: Dict) -> str:
+    """生成便于阅读的文本报告"""
+    lines = []
+    header = f"{'模式':<12}{'风险准确率':>10}{'类型准确率':>10}{'平均延迟':>10}{'P95':>8}" \
+             f"{'LLM次数':>9}{'输入tok/次':>11}{'输出tok/次':>11}{'缓存命中':>9}"
+    lines.append(header)
+    for mode, s in report["modes"].items():
+        lines.append(
+            f"{mode:<12}{s['risk_accuracy']:>10.2%}{s['type_accuracy']:>10.2%}"
+            f"{s['latency_mean']:>9.2f}s{s['latency_p95']:>7.2f}s"
+            f"{s['llm_calls_mean']:>9.2f}{s['prompt_tokens_per_call']:>11.1f}"
+            f"{s['completion_tokens_per_call']:>11.1f}{s['cached_prompt_ratio']:>9.1%}"
+        )
+
+    for mode, s in report["modes"].items():
+        for title, key in (("风险等级", "risk_confusion"), ("诈骗类型", "type_confusion")):
+            matrix = s[key]
+            # 只显示出现过的标签
+            labels = [l for l in matrix if any(matrix[l].values())
+                      or any(row.get(l) for row in matrix.values())]
+            if not labels:
+                continue
+            lines.append(f"\n[{mode}] {title}混淆矩阵（行=真实，列=预测）")
+            width = max(len(l) for l in labels) + 2
+            lines.append(" " * width + "".join(f"{l:>{width}}" for l in labels))
+            for truth in labels:
+                lines.append(f"{truth:<{width}}" +
+                             "".join(f"{matrix[truth].get(p, 0):>{width}}" for p in labels))
+    return "\n".join(lines)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    """命令行入口：python main.py evaluate --modes full,condensed"""
+    parser = argparse.ArgumentParser(
+        prog='main.py evaluate',
+        description='以标注数据评测不同流水线模式的准确率与开销'
+    )
+    parser.add_argument('--mapping', default='./data/mapping_full.csv', help='标注文件路径')
+    parser.add_argument('--audio-dir', default=None,
+                        help='音频目录（指定时走 ASR，否则直接使用标注文本）')
+    parser.add_argument('--modes', default='full,condensed',
+                        help=f'逗号分隔的模式（可选: {", ".join(PIPELINE_MODES)}）')
+    parser.add_argument('--limit', type=int, default=None, help='只评测前 N 个样本')
+    parser.add_argument('--concurrency', type=int, default=4, help='并发样本数（默认 4）')
+    parser.add_argument('--output', '-o', default='eval_report.json', help='报告输出路径')
+    parser.add_argument('--whisper-model', default='base', help='Whisper 模型大小')
+    args = parser.parse_args(argv)
+
+    modes = [m.strip() for m in args.modes.split(",") if m.strip()]
+    unknown = [m for m in modes if m not in PIPELINE_MODES]
+    if unknown:
+        parser.error(f"未知的模式: {', '.join(unknown)}")
+
+    from main import AntiFraudSystem
+
+    system = AntiFraudSystem(
+        whisper_model_size=args.whisper_model,
+        load_asr=bool(args.audio_dir)
+    )
+    samples = load_samples(args.mapping, args.audio_dir, system.role_registry, args.limit)
+    logger.info(f"📂 共 {len(samples)} 个评测样本")
+
+    report = Evaluator(system, args.concurrency).run(samples, modes)
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print("\n" + format_report(report) + "\n")
+    logger.info(f"✅ 评测报告已保存: {args.output}")
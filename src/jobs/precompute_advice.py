@@ -0,0 +1,157 @@
+"""
+离线预生成防御建议
+对每个 (诈骗类型, 风险等级, 受害者标签) 组合调用一次 Guardian，结果写入建议库，
+运行时 GUARDIAN_MODE=template 直接查表返回
+"""
+
+import argparse
+import csv
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, List, Optional, Tuple
+import logging
+
+import yaml
+
+from src.tools.advice_store import ADVICE_RISK_LEVELS
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def load_case_types(
+    cases_csv: str = "./data/cases.csv",
+    templates_path: str = "./config/advice_templates.yaml"
+) -> List[Dict]:
+    """
+    读取诈骗类型及其描述
+
+    cases.csv 不存在时使用建议模板中列出的类型。
+
+    Returns:
+        [{"type": ..., "desc": ..., "keywords": ...}, ...]
+    """
+    if os.path.exists(cases_csv):
+        with open(cases_csv, 'r', encoding='utf-8-sig', newline='') as f:
+            rows = list(csv.DictReader(f))
+        seen = set()
+        case_types = []
+        for row in rows:
+            if row.get('type') and row['type'] not in seen:
+                seen.add(row['type'])
+                case_types.append({
+                    "type": row['type'],
+                    "desc": row.get('desc', ''),
+                    "keywords": row.get('keywords', '')
+                })
+        return case_types
+
+    logger.warning(f"未找到 {cases_csv}，使用建议模板中的诈骗类型")
+    with open(templates_path, 'r', encoding='utf-8') as f:
+        templates = yaml.safe_load(f)
+    return [{"type": name, "desc": t["explain"], "keywords": ""}
+            for name, t in templates.items() if name != "default"]
+
+
+def _generate(case: Dict, risk_level: str, victim_info: Dict) -> str:
+    """调用 Guardian 为一个组合生成建议"""
+    from crewai import Crew, Process
+    from src.agents.anti_fraud_agents import create_guardian_agent
+    from src.tasks.anti_fraud_tasks import create_defend_task
+
+    guardian = create_guardian_agent()
+    # 以该类型的典型特征代替具体通话的监控 / 侧写结果
+    monitor_result = f"风险等级: {risk_level}\n触发关键词: {case['keywords'] or '无'}"
+    profile_result = f"诈骗类型: {case['type']}\n典型特征: {case['desc']}"
+    task = create_defend_task(guardian, monitor_result, profile_result, victim_info)
+
+    crew = Crew(agents=[guardian], tasks=[task], process=Process.sequential, verbose=False)
+    return str(crew.kickoff())
+
+
+def precompute_advice(
+    store,
+    role_registry,
+    case_types: List[Dict],
+    concurrency: int = 4,
+    force: bool = False
+) -> Tuple[int, int]:
+    """
+    生成缺失的建议并写入建议库（每条完成后立即保存，可中断后继续）
+
+    Args:
+        store: AdviceStore
+        role_registry: RoleRegistry（每个标签取第一个角色作为代表）
+        case_types: load_case_types() 的结果
+        concurrency: 并发 LLM 调用数
+        force: 重新生成已存在的条目
+
+    Returns:
+        (成功数, 失败数)
+    """
+    representatives: Dict[str, object] = {}
+    for record in role_registry.all():
+        representatives.setdefault(record.tag, record)
+
+    pairs = [
+        (case, risk_level, role)
+        for case in case_types
+        for risk_level in ADVICE_RISK_LEVELS
+        for role in representatives.values()
+        if force or (case["type"], risk_level, role.tag) not in store
+    ]
+    logger.info(
+        f"📋 {len(case_types)} 个诈骗类型 × {len(ADVICE_RISK_LEVELS)} 个风险等级 × "
+        f"{len(representatives)} 个标签，待生成 {len(pairs)} 条"
+    )
+
+    model = os.getenv("OPENAI_MODEL_NAME", "gpt-4o-mini")
+    succeeded, failed = 0, 0
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        futures = {
+            pool.submit(_generate, case, risk_level, role.to_victim_info()): (case, risk_level, role)
+            for case, risk_level, role in pairs
+        }
+        for future in as_completed(futures):
+            case, risk_level, role = futures[future]
+            try:
+                advice = future.result()
+            except Exception as e:
+                logger.error(f"❌ {case['type']} / {risk_level} / {role.tag} 生成失败: {e}")
+                failed += 1
+                continue
+            store.put(case["type"], risk_level, role.tag, advice, role.name, model)
+            store.save()
+            succeeded += 1
+            logger.info(f"✅ [{succeeded}/{len(pairs)}] {case['type']} / {risk_level} / {role.tag}")
+
+    return succeeded, failed
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    """命令行入口：python main.py precompute-advice"""
+    parser = argparse.ArgumentParser(
+        prog='main.py precompute-advice',
+        description='离线预生成 (诈骗类型, 风险等级, 受害者标签) 防御建议'
+    )
+    parser.add_argument('--store', default=os.getenv("ADVICE_STORE", "./db/advice_store.json"),
+                        help='建议库路径')
+    parser.add_argument('--cases', default='./data/cases.csv', help='案例类型表路径')
+    parser.add_argument('--roles', default=os.getenv("ROLES_CSV", "./data/roles.csv"),
+                        help='角色表路径')
+    parser.add_argument('--concurrency', type=int, default=4, help='并发 LLM 调用数（默认 4）')
+    parser.add_argument('--force', action='store_true', help='重新生成已存在的条目')
+    args = parser.parse_args(argv)
+
+    from src.tools.advice_store import AdviceStore
+    from src.tools.role_registry import RoleRegistry
+
+    store = AdviceStore(args.store)
+    succeeded, failed = precompute_advice(
+        store,
+        RoleRegistry(args.roles),
+        load_case_types(args.cases),
+        concurrency=args.concurrency,
+        force=args.force
+    )
+    logger.info(f"✅ 预生成完成：成功 {succeeded}，失败 {failed}，建议库共 {len(store)} 条 ({args.store})")
@@ -0,0 +1,124 @@
+"""
+训练轻量风险等级模型
+读取 mapping_full.csv（及新增的标注文件）的 text / risk_level，按分层抽样留出验证集评估，
+再用全部样本重新训练，按判定库（VERDICT_DB）中 Watchdog 的判定校准后写入 RISK_MODEL_PATH
+"""
+
+import argparse
+import json
+import os
+from typing import Dict, List, Optional
+import logging
+
+import numpy as np
+
+from src.tools.risk_model import evaluate, load_labeled_csv, train_logistic
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def _split(labels: List[str], holdout: float, seed: int):
+    """按类别分层划分训练 / 验证下标"""
+    rng = np.random.default_rng(seed)
+    train, test = [], []
+    labels = np.array(labels)
+    for label in np.unique(labels):
+        index = rng.permutation(np.nonzero(labels == label)[0])
+        cut = int(round(len(index) * holdout))
+        test.extend(index[:cut].tolist())
+        train.extend(index[cut:].tolist())
+    return train, test
+
+
+def train_risk_model(
+    data_files: List[str],
+    output: str,
+    holdout: float = 0.2,
+    seed: int = 42,
+    verdict_db: Optional[str] = None,
+    **params
+) -> Dict:
+    """
+    训练并保存模型
+
+    Args:
+        data_files: 标注 CSV（需包含 text 与 risk_level 列）
+        output: 模型文件（.npz）
+        holdout: 验证集比例（0 表示不评估）
+        verdict_db: 判定库路径，存在时训练后按 Watchdog 判定校准（不存在时模型未校准，不会预过滤）
+        params: 传给 train_logistic 的参数（n_features / epochs / learning_rate / l2）
+
+    Returns:
+        训练报告
+    """
+    texts, labels = load_labeled_csv(data_files)
+    if not texts:
+        raise ValueError(f"没有可用的标注样本: {data_files}")
+    logger.info(f"📚 标注样本 {len(texts)} 条")
+
+    report: Dict = {"samples": len(texts)}
+    if holdout > 0:
+        train, test = _split(labels, holdout, seed)
+        if train and test:
+            model = train_logistic([texts[i] for i in train], [labels[i] for i in train], **params)
+            report["holdout"] = evaluate(model, [texts[i] for i in test], [labels[i] for i in test])
+            logger.info(
+                f"📊 验证集 {report['holdout']['samples']} 条: 准确率 {report['holdout']['accuracy']:.2%}，"
+                f"宏平均 F1 {report['holdout']['macro_f1']:.3f}"
+            )
+
+    model = train_logistic(texts, labels, **params)
+    model.info["holdout"] = report.get("holdout")
+    model.info["data_files"] = list(data_files)
+
+    if verdict_db and os.path.exists(verdict_db):
+        from src.jobs.calibrate_risk_model import calibrate_from_verdicts
+        report["calibration"] = calibrate_from_verdicts(model, verdict_db)
+    else:
+        logger.warning(
+            f"⚠️ 判定库不存在（{verdict_db or '未指定'}），模型未校准："
+            f"运行 calibrate-risk-model 之前 RISK_PREFILTER 不会放行任何通话"
+        )
+
+    model.save(output)
+    logger.info(f"✅ 风险模型已保存: {output}")
+    return report
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    """命令行入口：python main.py train-risk-model"""
+    parser = argparse.ArgumentParser(
+        prog='main.py train-risk-model',
+        description='用 mapping_full.csv 的风险等级标注训练轻量风险模型（字符 n-gram 哈希 + 逻辑回归）'
+    )
+    parser.add_argument('--data', nargs='+', default=['./data/mapping_full.csv'],
+                        help='标注 CSV（text / risk_level 列），可追加新增的标注文件')
+    parser.add_argument('--output', default=os.getenv("RISK_MODEL_PATH", "./models/risk_model.npz"),
+                        help='模型文件')
+    parser.add_argument('--holdout', type=float, default=0.2, help='验证集比例（0 表示不评估）')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--n-features', type=int, default=2 ** 18, help='哈希桶数')
+    parser.add_argument('--epochs', type=int, default=300)
+    parser.add_argument('--learning-rate', type=float, default=0.5)
+    parser.add_argument('--l2', type=float, default=1e-5)
+    parser.add_argument('--verdicts', default=(os.getenv("VERDICT_DB") or "./db/verdicts.db"),
+                        help='判定库，训练后按其中的 Watchdog 判定校准（文件不存在时跳过）')
+    args = parser.parse_args(argv)
+
+    report = train_risk_model(
+        args.data,
+        args.output,
+        holdout=args.holdout,
+        seed=args.seed,
+        verdict_db=args.verdicts,
+        n_features=args.n_features,
+        epochs=args.epochs,
+        learning_rate=args.learning_rate,
+        l2=args.l2
+    )
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,25 @@
+"""
+反诈骗智能检测系统 - 服务模块
+"""
+
+from .worker_pool import InferenceWorkerPool
+from .batching import MicroBatcher, AnalysisScheduler
+from .live_session import LiveSession
+from .uploads import UploadLimitMiddleware, UploadRejected, check_audio, probe_duration
+from .verdict_store import VerdictStore
+from .priority import PriorityGate, PRIORITIES, normalize_priority
+
+__all__ = [
+    'InferenceWorkerPool',
+    'MicroBatcher',
+    'AnalysisScheduler',
+    'LiveSession',
+    'UploadLimitMiddleware',
+    'UploadRejected',
+    'check_audio',
+    'probe_duration',
+    'VerdictStore',
+    'PriorityGate',
+    'PRIORITIES',
+    'normalize_priority'
+]
@@ -0,0 +1,208 @@
+"""
+微批处理调度
+在极短的时间窗口内收集并发请求，合并为一个批次执行，提高饱和吞吐量
+"""
+
+import asyncio
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Awaitable, Callable, List, Optional, Tuple
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class MicroBatcher:
+    """
+    线程版微批处理器
+
+    多个线程并发调用 submit()，后台线程在 max_delay_ms 内或攒满 max_batch_size
+    后调用一次 batch_fn(items)，再把结果分发回各调用方。
+    用于合并 RAG 检索的查询向量计算等同步调用。
+    """
+
+    def __init__(
+        self,
+        batch_fn: Callable[[List[Any]], List[Any]],
+        max_batch_size: int = 16,
+        max_delay_ms: float = 5.0,
+        name: str = "micro-batcher"
+    ):
+        """
+        Args:
+            batch_fn: 批处理函数，输入 N 个元素，按顺序返回 N 个结果
+            max_batch_size: 单批最大元素数
+            max_delay_ms: 第一个元素到达后最多等待的时间（毫秒）
+            name: 后台线程名称
+        """
+        self.batch_fn = batch_fn
+        self.max_batch_size = max_batch_size
+        self.max_delay = max_delay_ms / 1000.0
+
+        self._pending: List[Tuple[Any, Future]] = []
+        self._cond = threading.Condition()
+        self._closed = False
+
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def submit(self, item: Any) -> Future:
+        """提交一个元素，返回其结果的 Future"""
+        future: Future = Future()
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("MicroBatcher 已关闭")
+            self._pending.append((item, future))
+            self._cond.notify()
+        return future
+
+    def __call__(self, item: Any) -> Any:
+        """提交并阻塞等待结果"""
+        return self.submit(item).result()
+
+    def _collect(self) -> List[Tuple[Any, Future]]:
+        """等待并取出一个批次"""
+        with self._cond:
+            while not self._pending and not self._closed:
+                self._cond.wait()
+            if not self._pending:
+                return []
+
+            deadline = time.monotonic() + self.max_delay
+            while len(self._pending) < self.max_batch_size and not self._closed:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+
+            batch = self._pending[:self.max_batch_size]
+            del self._pending[:self.max_batch_size]
+            return batch
+
+    def _run(self) -> None:
+        while True:
+            batch = self._collect()
+            if not batch:
+                return
+
+            items = [item for item, _ in batch]
+            try:
+                results = self.batch_fn(items)
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+
+            for (_, future), result in zip(batch, results):
+                future.set_result(result)
+
+    def close(self) -> None:
+        """处理完剩余元素后停止后台线程"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join()
+
+
+class AnalysisScheduler:
+    """
+    异步请求调度器
+
+    在 max_delay_ms 时间窗口内（或攒满 max_batch_size 个请求时）收集分析请求，
+    作为一个批次交给 batch_handler 执行。max_delay_ms 即批处理引入的最大额外延迟，
+    用于控制 p99。
+    """
+
+    def __init__(
+        self,
+        batch_handler: Callable[[List[Any]], Awaitable[List[Any]]],
+        max_batch_size: int = 8,
+        max_delay_ms: float = 20.0
+    ):
+        """
+        Args:
+            batch_handler: 异步批处理函数，按顺序返回结果；单个元素失败时返回 Exception 实例
+            max_batch_size: 单批最大请求数
+            max_delay_ms: 批处理最大等待时间（毫秒）
+        """
+        self.batch_handler = batch_handler
+        self.max_batch_size = max_batch_size
+        self.max_delay = max_delay_ms / 1000.0
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._collector: Optional[asyncio.Task] = None
+        self._inflight: set = set()
+
+    def start(self) -> None:
+        """在当前事件循环中启动收集协程"""
+        self._queue = asyncio.Queue()
+        self._collector = asyncio.get_running_loop().create_task(self._collect_loop())
+        logger.info(
+            f"✅ 微批调度器已启动 (max_batch_size={self.max_batch_size}, "
+            f"max_delay={self.max_delay * 1000:.0f}ms)"
+        )
+
+    @property
+    def queue_depth(self) -> int:
+        """等待进入批次的请求数"""
+        return self._queue.qsize() if self._queue is not None else 0
+
+    async def submit(self, item: Any) -> Any:
+        """提交一个请求并等待其结果"""
+        if self._queue is None:
+            raise RuntimeError("调度器尚未启动，请先调用 start()")
+
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((item, future))
+        return await future
+
+    async def _collect_loop(self) -> None:
+        while True:
+            first = await self._queue.get()
+            batch = [first]
+
+            deadline = time.monotonic() + self.max_delay
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+
+            # 批次并发执行，收集协程立即开始下一个时间窗口
+            task = asyncio.create_task(self._dispatch(batch))
+            self._inflight.add(task)
+            task.add_done_callback(self._inflight.discard)
+
+    async def _dispatch(self, batch: List[Tuple[Any, asyncio.Future]]) -> None:
+        items = [item for item, _ in batch]
+        logger.info(f"📦 派发批次: {len(items)} 个请求")
+
+        try:
+            results = await self.batch_handler(items)
+        except Exception as e:
+            results = [e] * len(batch)
+
+        for (_, future), result in zip(batch, results):
+            if future.done():
+                continue
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    async def stop(self) -> None:
+        """停止收集并等待已派发的批次完成"""
+        if self._collector is not None:
+            self._collector.cancel()
+            try:
+                await self._collector
+            except asyncio.CancelledError:
+                pass
+            self._collector = None
+        if self._inflight:
+            await asyncio.gather(*self._inflight, return_exceptions=True)
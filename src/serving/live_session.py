@@ -0,0 +1,95 @@
+"""
+实时通话会话
+ASR 分段逐条到达时由增量打分器更新风险状态，风险分越过阈值才调用 Watchdog，
+通话结束后对完整转录执行一次完整分析
+"""
+
+import os
+import uuid
+from typing import Dict, List, Optional, Union
+import logging
+
+from src.tools.incremental_scorer import IncrementalRiskScorer
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class LiveSession:
+    """一通实时通话的分析状态"""
+
+    def __init__(
+        self,
+        system,
+        victim_role_id: str = "R01",
+        session_id: Optional[str] = None,
+        scorer: Optional[IncrementalRiskScorer] = None
+    ):
+        """
+        Args:
+            system: AntiFraudSystem（不需要加载 ASR）
+            victim_role_id: 受害者角色 ID
+            session_id: 会话 ID（同时作为各次分析的 trace_id 前缀）
+            scorer: 增量打分器（为空时按环境变量创建）
+        """
+        self.system = system
+        self.victim_role_id = victim_role_id
+        self.session_id = session_id or uuid.uuid4().hex[:16]
+        self.scorer = scorer or IncrementalRiskScorer(
+            half_life=float(os.getenv("LIVE_HALF_LIFE", "60")),
+            threshold=float(os.getenv("LIVE_RISK_THRESHOLD", "6"))
+        )
+        self.segments: List[Dict] = []
+        self.watchdog_results: List[Dict] = []
+
+    def feed(self, segment: Union[str, Dict]) -> Dict:
+        """
+        输入一个新分段（只做本地增量打分，开销与分段长度成正比）
+
+        Returns:
+            IncrementalRiskScorer.update() 的结果；trigger 为 True 时调用方应执行 run_watchdog()
+        """
+        if isinstance(segment, str):
+            segment = {"text": segment}
+        text = segment.get("text", "").strip()
+        if not text:
+            return {**self.scorer.snapshot(), "trigger": False, "new_hits": {}}
+        self.segments.append({
+            "start": segment.get("start", 0.0),
+            "end": segment.get("end", 0.0),
+            "text": text
+        })
+        return self.scorer.update(segment)
+
+    def transcript(self) -> Dict:
+        """到目前为止的转录结果（结构同 ASRTool.transcribe_audio）"""
+        return {
+            "text": " ".join(s["text"] for s in self.segments),
+            "segments": list(self.segments),
+            "language": "zh",
+            "duration": self.segments[-1]["end"] if self.segments else 0.0
+        }
+
+    def run_watchdog(self) -> Dict:
+        """对当前转录调用 Watchdog（阻塞，应在线程池中执行）"""
+        result = self.system.run_watchdog(
+            self.transcript()["text"],
+            trace_id=f"{self.session_id}-w{len(self.watchdog_results) + 1}",
+            priority="live"
+        )
+        result["score"] = round(self.scorer.score, 3)
+        self.watchdog_results.append(result)
+        logger.info(
+            f"🐕 会话 {self.session_id} Watchdog 评估: {result['risk_level']} "
+            f"(风险分 {result['score']})"
+        )
+        return result
+
+    def finish(self, deep_advice: bool = False) -> Dict:
+        """通话结束：对完整转录执行完整分析（阻塞）"""
+        result = self.system.analyze_transcript(
+            self.transcript(), self.victim_role_id,
+            trace_id=f"{self.session_id}-final", deep_advice=deep_advice, priority="live"
+        )
+        result["live"] = self.scorer.snapshot()
+        return result
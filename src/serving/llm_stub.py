@@ -0,0 +1,378 @@
+"""
+本地确定性 LLM 替身服务（OpenAI 兼容）
+按 config/tasks.yaml 的输出格式生成 Watchdog / Profiler / Guardian 的合法输出，
+延迟与 token 分布可配置，支持流式返回，用于离线压测 api.py
+
+用法：
+    python -m src.serving.llm_stub --port 8001
+    OPENAI_BASE_URL=http://127.0.0.1:8001/v1 OPENAI_API_KEY=stub python api.py
+
+同一 Prompt 的输出与延迟由 Prompt 哈希决定，多次压测结果可复现。
+usage 中按 OpenAI 的前缀缓存规则模拟 prompt_tokens_details.cached_tokens，
+用于验证 Prompt 布局的缓存命中率。
+"""
+
+import asyncio
+import bisect
+import hashlib
+import json
+import math
+import os
+import random
+import re
+import time
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+import logging
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+from src.tools.risk_signals import load_signal_vocabulary, score_to_risk_level
+from src.utils.tokens import count_tokens
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+# cases.csv 不存在时可选的诈骗类型（与 main.py 解析时的备选类型一致）
+DEFAULT_SCAM_TYPES = ["AI换脸", "FaceTime诈骗", "百万保障", "公检法", "杀猪盘",
+                      "ETC", "退改签", "征信修复", "冒充领导", "虚假客服"]
+
+# Profiler 的 RAG 工具名（main.py 中 @tool 的名称）
+RAG_TOOL_NAME = "搜索诈骗案例知识库"
+
+_TRANSCRIPT = re.compile(r"【(?:转录文本|原始转录)】\s*(.*?)\s*(?:请完成以下任务|【|$)", re.S)
+_FIELD = re.compile(r"^\s*{}[:：]\s*(.+)$", re.M)
+# 工具说明中的 'Observation: the result of the action' 不算真正的工具返回
+_OBSERVATION = re.compile(r"Observation:\s*(?!the result of the action)\S")
+
+
+def _env_bool(name: str, default: str) -> bool:
+    return os.getenv(name, default).lower() not in ("0", "false", "no")
+
+
+class StubConfig:
+    """替身服务配置（默认值读取环境变量）"""
+
+    def __init__(
+        self,
+        ttft_ms: Optional[float] = None,
+        ttft_jitter: Optional[float] = None,
+        tokens_per_second: Optional[float] = None,
+        completion_tokens: Optional[int] = None,
+        completion_jitter: Optional[float] = None,
+        seed: Optional[int] = None,
+        profiler_tool_call: Optional[bool] = None,
+        cache_min_tokens: Optional[int] = None
+    ):
+        """
+        Args:
+            ttft_ms: 首 token 延迟中位数（毫秒）
+            ttft_jitter: 首 token 延迟的对数正态离散度（0 为固定延迟）
+            tokens_per_second: 输出速度（0 为瞬间输出）
+            completion_tokens: 目标输出 token 数均值（0 为按模板自然长度）
+            completion_jitter: 输出 token 数的相对标准差
+            seed: 全局随机种子（与 Prompt 哈希组合）
+            profiler_tool_call: Profiler 首轮是否先发起一次 RAG 工具调用
+            cache_min_tokens: 模拟 Prompt 缓存的最短命中前缀（token，0 为不模拟）
+        """
+        self.ttft_ms = ttft_ms if ttft_ms is not None else float(os.getenv("STUB_TTFT_MS", "300"))
+        self.ttft_jitter = ttft_jitter if ttft_jitter is not None \
+            else float(os.getenv("STUB_TTFT_JITTER", "0.3"))
+        self.tokens_per_second = tokens_per_second if tokens_per_second is not None \
+            else float(os.getenv("STUB_TOKENS_PER_SECOND", "60"))
+        self.completion_tokens = completion_tokens if completion_tokens is not None \
+            else int(os.getenv("STUB_COMPLETION_TOKENS", "0"))
+        self.completion_jitter = completion_jitter if completion_jitter is not None \
+            else float(os.getenv("STUB_COMPLETION_JITTER", "0.2"))
+        self.seed = seed if seed is not None else int(os.getenv("STUB_SEED", "0"))
+        self.profiler_tool_call = profiler_tool_call if profiler_tool_call is not None \
+            else _env_bool("STUB_PROFILER_TOOL_CALL", "true")
+        self.cache_min_tokens = cache_min_tokens if cache_min_tokens is not None \
+            else int(os.getenv("STUB_CACHE_MIN_TOKENS", "1024"))
+
+
+class PromptCache:
+    """
+    模拟服务商的 Prompt 前缀缓存
+
+    与近期请求的最长公共前缀达到 min_tokens 时命中，命中长度按 block_tokens 向下取整
+    （OpenAI 规则：1024 token 起，128 token 递增）。近期 Prompt 按字典序保存，
+    与任一 Prompt 的最长公共前缀必然出现在相邻位置，查找只需比较两次。
+    """
+
+    def __init__(self, min_tokens: int = 1024, block_tokens: int = 128, capacity: int = 1024):
+        self.min_tokens = min_tokens
+        self.block_tokens = block_tokens
+        self.capacity = capacity
+        self._sorted: List[str] = []
+        self._recent: deque = deque()
+
+    def lookup(self, prompt: str) -> int:
+        """返回命中缓存的 token 数，并记录本次 Prompt"""
+        if self.min_tokens <= 0:
+            return 0
+        index = bisect.bisect_left(self._sorted, prompt)
+        prefix = ""
+        for j in (index - 1, index):
+            if 0 <= j < len(self._sorted):
+                common = os.path.commonprefix([prompt, self._sorted[j]])
+                if len(common) > len(prefix):
+                    prefix = common
+
+        if index >= len(self._sorted) or self._sorted[index] != prompt:
+            self._sorted.insert(index, prompt)
+            self._recent.append(prompt)
+            if len(self._recent) > self.capacity:
+                oldest = self._recent.popleft()
+                del self._sorted[bisect.bisect_left(self._sorted, oldest)]
+
+        tokens = count_tokens(prefix)
+        if tokens < self.min_tokens:
+            return 0
+        return tokens // self.block_tokens * self.block_tokens
+
+
+def _field(text: str, name: str, default: str = "") -> str:
+    match = re.search(_FIELD.pattern.format(re.escape(name)), text, re.M)
+    return match.group(1).strip() if match else default
+
+
+class StubResponder:
+    """根据 Prompt 识别当前任务并生成符合格式的输出"""
+
+    def __init__(self, config: Optional[StubConfig] = None):
+        self.config = config or StubConfig()
+        self.vocabulary = load_signal_vocabulary()
+        self.scam_types = list(self.vocabulary.case_keywords) or DEFAULT_SCAM_TYPES
+
+    def _rng(self, prompt: str) -> random.Random:
+        digest = hashlib.sha256(f"{self.config.seed}:{prompt}".encode("utf-8")).digest()
+        return random.Random(int.from_bytes(digest[:8], "big"))
+
+    # === 判定逻辑（基于本地信号词表） ===
+
+    def _risk_level(self, transcript: str) -> Tuple[str, List[str]]:
+        hits = self.vocabulary.match(transcript)
+        score = sum(self.vocabulary.terms[term][1] for term, _, _ in hits)
+        return score_to_risk_level(score), [term for term, _, _ in hits]
+
+    def _scam_type(self, transcript: str, rng: random.Random) -> str:
+        best, best_hits = None, 0
+        for case_type, keywords in self.vocabulary.case_keywords.items():
+            hits = sum(1 for k in keywords if k in transcript)
+            if hits > best_hits:
+                best, best_hits = case_type, hits
+        if best:
+            return best
+        for case_type in self.scam_types:
+            if case_type in transcript:
+                return case_type
+        return rng.choice(self.scam_types)
+
+    # === 各任务输出 ===
+
+    def _monitor(self, transcript: str) -> str:
+        level, keywords = self._risk_level(transcript)
+        suspicious = [s for s in re.split(r"[。！？!?\n]", transcript)
+                      if any(k in s for k in keywords)][:3]
+        return (
+            f"风险等级: {level}\n"
+            f"触发关键词: {'、'.join(keywords) or '无'}\n"
+            f"可疑片段: {' | '.join(s.strip() for s in suspicious) or '无'}"
+        )
+
+    def _profile(self, transcript: str, rng: random.Random) -> str:
+        scam_type = self._scam_type(transcript, rng)
+        keywords = self.vocabulary.case_keywords.get(scam_type, [])[:5]
+        features = "、".join(keywords) or "冒充身份、制造紧迫感、诱导转账"
+        confidence = rng.choice(["High", "High", "Medium"])
+        return (
+            f"诈骗类型: {scam_type}\n"
+            f"典型特征: {features}\n"
+            f"历史案例: 知识库中的{scam_type}案例，骗子以相同话术诱导受害者操作\n"
+            f"置信度: {confidence}"
+        )
+
+    def _defend(self, prompt: str) -> str:
+        name = _field(prompt, "姓名", "您")
+        level = _field(prompt, "风险等级", "High")
+        scam_type = _field(prompt, "诈骗类型", "电信诈骗")
+        report = "建议立即拨打 110 报警" if level in ("High", "Critical") else "暂不需要报警，保持警惕"
+        return (
+            f"### 🚨 立即行动\n{name}，请马上挂断电话，不要转账，也不要透露验证码。\n\n"
+            f"### 🔍 验证问题\n1. 您能说出我的身份证后四位吗？\n2. 为什么不能到线下网点办理？\n\n"
+            f"### 📚 防骗科普\n这是典型的{scam_type}：正规机构不会要求通过电话转账。\n\n"
+            f"### ☎️ 报警建议\n{report}"
+        )
+
+    def _pad(self, content: str, rng: random.Random) -> str:
+        """按配置的 token 分布补足输出长度"""
+        if self.config.completion_tokens <= 0:
+            return content
+        target = int(rng.gauss(
+            self.config.completion_tokens,
+            self.config.completion_tokens * self.config.completion_jitter
+        ))
+        missing = target - count_tokens(content)
+        if missing <= 0:
+            return content
+        filler = "以上判断基于对话中的信号综合得出。"
+        repeats = math.ceil(missing / max(count_tokens(filler), 1))
+        return content + "\n补充说明: " + filler * repeats
+
+    def respond(self, messages: List[Dict]) -> str:
+        """生成一次补全（CrewAI ReAct 格式）"""
+        prompt = "\n".join(str(m.get("content") or "") for m in messages)
+        rng = self._rng(prompt)
+        transcript_match = _TRANSCRIPT.search(prompt)
+        transcript = transcript_match.group(1) if transcript_match else ""
+
+        if "【受害者信息】" in prompt:
+            content = self._defend(prompt)
+        elif "【原始转录】" in prompt:
+            # Profiler 首轮先调用一次 RAG 工具，拿到 Observation 后再给出结论
+            observed = any(m.get("role") == "assistant" for m in messages) \
+                or _OBSERVATION.search(prompt)
+            if self.config.profiler_tool_call and RAG_TOOL_NAME in prompt and not observed:
+                query = "、".join(self._risk_level(transcript)[1][:3]) or transcript[:30]
+                return (
+                    "Thought: 需要检索相似的历史案例\n"
+                    f"Action: {RAG_TOOL_NAME}\n"
+                    f"Action Input: {json.dumps({'query': query}, ensure_ascii=False)}"
+                )
+            content = self._profile(transcript, rng)
+        elif "【转录文本】" in prompt:
+            content = self._monitor(transcript)
+        else:
+            content = "OK"
+
+        return f"Thought: I now know the final answer\nFinal Answer: {self._pad(content, rng)}"
+
+    def latency(self, messages: List[Dict]) -> float:
+        """首 token 延迟（秒）"""
+        rng = self._rng("latency:" + json.dumps(messages, ensure_ascii=False, sort_keys=True))
+        base = self.config.ttft_ms / 1000
+        if self.config.ttft_jitter <= 0:
+            return base
+        return base * math.exp(rng.gauss(0, self.config.ttft_jitter))
+
+
+def _apply_stop(text: str, stop) -> str:
+    if not stop:
+        return text
+    for s in [stop] if isinstance(stop, str) else stop:
+        index = text.find(s)
+        if index >= 0:
+            text = text[:index]
+    return text
+
+
+def create_app(config: Optional[StubConfig] = None) -> FastAPI:
+    """创建替身服务应用"""
+    responder = StubResponder(config)
+    prompt_cache = PromptCache(min_tokens=responder.config.cache_min_tokens)
+    app = FastAPI(title="LLM Stub", description="OpenAI 兼容的本地确定性替身服务")
+
+    @app.get("/v1/models")
+    async def list_models():
+        return {"object": "list", "data": [{"id": "stub", "object": "model", "owned_by": "local"}]}
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        messages = body.get("messages", [])
+        model = body.get("model", "stub")
+        content = _apply_stop(responder.respond(messages), body.get("stop"))
+
+        prompt_tokens = sum(count_tokens(str(m.get("content") or "")) for m in messages)
+        completion_tokens = count_tokens(content)
+        cached_tokens = min(prompt_cache.lookup("".join(
+            f"<|{m.get('role')}|>{m.get('content') or ''}" for m in messages
+        )), prompt_tokens)
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+            "prompt_tokens_details": {"cached_tokens": cached_tokens}
+        }
+        completion_id = "chatcmpl-stub-" + hashlib.sha1(content.encode("utf-8")).hexdigest()[:12]
+        created = int(time.time())
+        ttft = responder.latency(messages)
+        tps = responder.config.tokens_per_second
+
+        if not body.get("stream"):
+            await asyncio.sleep(ttft + (completion_tokens / tps if tps > 0 else 0))
+            return JSONResponse({
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": created,
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": content},
+                    "finish_reason": "stop"
+                }],
+                "usage": usage
+            })
+
+        include_usage = (body.get("stream_options") or {}).get("include_usage", False)
+
+        def _chunk(delta: Dict, finish_reason=None, chunk_usage=None) -> str:
+            payload = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": [] if chunk_usage else
+                [{"index": 0, "delta": delta, "finish_reason": finish_reason}]
+            }
+            if chunk_usage:
+                payload["usage"] = chunk_usage
+            return f"data: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+        async def _stream():
+            await asyncio.sleep(ttft)
+            yield _chunk({"role": "assistant", "content": ""})
+            # 每个分片约 4 个字符，按输出速度均匀发送
+            pieces = [content[i:i + 4] for i in range(0, len(content), 4)]
+            interval = completion_tokens / tps / max(len(pieces), 1) if tps > 0 else 0
+            for piece in pieces:
+                if interval:
+                    await asyncio.sleep(interval)
+                yield _chunk({"content": piece})
+            yield _chunk({}, finish_reason="stop")
+            if include_usage:
+                yield _chunk({}, chunk_usage=usage)
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(_stream(), media_type="text/event-stream")
+
+    return app
+
+
+if __name__ == "__main__":
+    import argparse
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description='本地确定性 LLM 替身服务（OpenAI 兼容）')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8001)
+    parser.add_argument('--ttft-ms', type=float, default=None, help='首 token 延迟中位数（毫秒）')
+    parser.add_argument('--tokens-per-second', type=float, default=None, help='输出速度（0 为瞬间输出）')
+    parser.add_argument('--completion-tokens', type=int, default=None, help='目标输出 token 数均值')
+    parser.add_argument('--seed', type=int, default=None, help='随机种子')
+    parser.add_argument('--cache-min-tokens', type=int, default=None,
+                        help='模拟 Prompt 缓存的最短命中前缀（token，0 为不模拟）')
+    args = parser.parse_args()
+
+    stub_config = StubConfig(
+        ttft_ms=args.ttft_ms,
+        tokens_per_second=args.tokens_per_second,
+        completion_tokens=args.completion_tokens,
+        seed=args.seed,
+        cache_min_tokens=args.cache_min_tokens
+    )
+    logger.info(f"🧪 LLM 替身服务启动: http://{args.host}:{args.port}/v1")
+    uvicorn.run(create_app(stub_config), host=args.host, port=args.port, log_level="warning")
@@ -0,0 +1,194 @@
+"""
+优先级调度
+实时通话（live）、交互请求（interactive）与批量任务（bulk）共用 Whisper 与 LLM 配额。
+PriorityGate 挂在 tracing.stage() 上，在 ASR 与智能体阶段开始前按优先级分配执行槽位：
+
+- 严格优先：有更高优先级的请求在等待时，低优先级不获取新槽位
+- 各优先级并发上限：每类在每种资源上同时占用的槽位数
+- 批量任务只使用空闲容量：该资源上有 live 阶段在执行时不开始新的 bulk 阶段，
+  已开始的阶段不会被打断，但下一个阶段会让出（阶段之间让步）
+- LLM 令牌桶：按每分钟 token 数限速，bulk 需要桶内余量高于保留比例才能开始
+"""
+
+import threading
+import time
+from typing import Dict, Optional, Tuple
+import logging
+
+from src.utils import metrics
+
+logger = logging.getLogger(__name__)
+
+
+PRIORITIES = ("live", "interactive", "bulk")
+DEFAULT_PRIORITY = "interactive"
+
+# 受调度的阶段 -> 资源
+GATED_STAGES = {"asr": "asr", "crew": "llm"}
+
+
+def normalize_priority(value: Optional[str], default: str = DEFAULT_PRIORITY) -> str:
+    """把外部传入的优先级规范为 PRIORITIES 之一（无法识别时使用 default）"""
+    value = (value or "").strip().lower()
+    return value if value in PRIORITIES else default
+
+
+class TokenBucket:
+    """
+    每分钟 token 令牌桶
+
+    调用前只检查余量（实际用量在调用结束后才知道），结束后按实际用量扣除，允许透支，
+    透支部分按速率补回后才放行新的调用。
+    """
+
+    def __init__(self, tokens_per_minute: float):
+        self.capacity = float(tokens_per_minute)
+        self.rate = self.capacity / 60.0
+        self.level = self.capacity
+        self._updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def wait_seconds(self, reserve: float = 0.0) -> float:
+        """余量达到 reserve（占容量比例）还需等待的秒数，0 表示可以开始"""
+        self._refill()
+        needed = max(reserve * self.capacity, 1.0)
+        if self.level >= needed:
+            return 0.0
+        return (needed - self.level) / self.rate
+
+    def charge(self, tokens: float) -> None:
+        self._refill()
+        self.level -= tokens
+
+
+class PriorityGate:
+    """按优先级分配 ASR 与 LLM 阶段的执行槽位（tracing.set_stage_gate 安装）"""
+
+    def __init__(
+        self,
+        capacity: Dict[str, int],
+        limits: Optional[Dict[str, int]] = None,
+        tokens_per_minute: float = 0,
+        bulk_token_reserve: float = 0.3
+    ):
+        """
+        Args:
+            capacity: 各资源的槽位总数，如 {"asr": Whisper 副本数, "llm": 同时进行的智能体流程数}
+            limits: 各优先级在每种资源上的并发上限（缺省或 0 表示不超过资源容量）
+            tokens_per_minute: LLM 每分钟 token 上限（0 表示不限速）
+            bulk_token_reserve: bulk 开始 LLM 阶段时令牌桶需保留的余量比例
+        """
+        self.capacity = {resource: max(int(slots), 1) for resource, slots in capacity.items()}
+        self.limits = limits or {}
+        self.bucket = TokenBucket(tokens_per_minute) if tokens_per_minute > 0 else None
+        self.bulk_token_reserve = bulk_token_reserve
+        self._cond = threading.Condition()
+        self._running = {r: {p: 0 for p in PRIORITIES} for r in self.capacity}
+        self._waiting = {r: {p: 0 for p in PRIORITIES} for r in self.capacity}
+
+        for resource in self.capacity:
+            for priority in PRIORITIES:
+                metrics.PRIORITY_RUNNING.set_function(
+                    lambda r=resource, p=priority: self._running[r][p], resource=resource, priority=priority
+                )
+                metrics.PRIORITY_WAITING.set_function(
+                    lambda r=resource, p=priority: self._waiting[r][p], resource=resource, priority=priority
+                )
+
+    def _limit(self, resource: str, priority: str) -> int:
+        limit = self.limits.get(priority, 0)
+        return min(limit, self.capacity[resource]) if limit > 0 else self.capacity[resource]
+
+    def _blocked(self, resource: str, priority: str) -> Optional[float]:
+        """
+        不能开始时返回建议等待的秒数（None 表示可以开始）
+        """
+        running = self._running[resource]
+        if sum(running.values()) >= self.capacity[resource]:
+            return 1.0
+        if running[priority] >= self._limit(resource, priority):
+            return 1.0
+        rank = PRIORITIES.index(priority)
+        if any(self._waiting[resource][p] for p in PRIORITIES[:rank]):
+            return 1.0
+        if priority == "bulk" and running["live"] > 0:
+            return 1.0
+        if resource == "llm" and self.bucket is not None:
+            reserve = self.bulk_token_reserve if priority == "bulk" else 0.0
+            wait = self.bucket.wait_seconds(reserve)
+            if wait > 0:
+                return wait
+        return None
+
+    def acquire(self, name: str, priority: str, extra: Dict) -> Optional[Tuple[str, str]]:
+        """
+        阶段开始前获取槽位（不受调度的阶段立即返回 None）
+
+        排队耗时与优先级写入阶段属性（queued_seconds / priority）。
+        """
+        resource = GATED_STAGES.get(name)
+        if resource is None or resource not in self.capacity:
+            return None
+        priority = normalize_priority(priority)
+        start = time.perf_counter()
+        with self._cond:
+            self._waiting[resource][priority] += 1
+            try:
+                while True:
+                    wait = self._blocked(resource, priority)
+                    if wait is None:
+                        break
+                    self._cond.wait(timeout=wait)
+            finally:
+                self._waiting[resource][priority] -= 1
+            self._running[resource][priority] += 1
+        extra["priority"] = priority
+        extra["queued_seconds"] = round(time.perf_counter() - start, 4)
+        return resource, priority
+
+    def release(self, ticket: Tuple[str, str], extra: Dict) -> None:
+        """阶段结束：归还槽位，LLM 阶段按实际用量（阶段属性 llm_tokens）扣除令牌"""
+        resource, priority = ticket
+        with self._cond:
+            self._running[resource][priority] -= 1
+            if resource == "llm" and self.bucket is not None:
+                self.bucket.charge(extra.get("llm_tokens", 0))
+            self._cond.notify_all()
+
+    def status(self) -> Dict:
+        with self._cond:
+            return {
+                "capacity": dict(self.capacity),
+                "running": {r: dict(v) for r, v in self._running.items()},
+                "waiting": {r: dict(v) for r, v in self._waiting.items()},
+                "tokens_available": round(self.bucket.level) if self.bucket is not None else None
+            }
+
+
+if __name__ == "__main__":
+    # 测试代码：单个 LLM 槽位上，bulk 任务在 live 请求到达后让出下一个阶段
+    import concurrent.futures
+
+    print("\n=== 测试优先级调度 ===\n")
+
+    gate = PriorityGate({"llm": 1})
+    order = []
+
+    def run(priority: str, label: str, seconds: float = 0.1) -> None:
+        extra: Dict = {}
+        ticket = gate.acquire("crew", priority, extra)
+        order.append(f"{label} (排队 {extra['queued_seconds']:.2f}s)")
+        time.sleep(seconds)
+        gate.release(ticket, extra)
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=8) as pool:
+        futures = [pool.submit(run, "bulk", f"bulk-{i}") for i in range(4)]
+        time.sleep(0.05)
+        futures.append(pool.submit(run, "live", "live"))
+        futures.append(pool.submit(run, "interactive", "interactive"))
+        concurrent.futures.wait(futures)
+    print("\n".join(order))
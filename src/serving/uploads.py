@@ -0,0 +1,202 @@
+"""
+上传限制
+按 Content-Length 提前拒绝超大请求，未声明长度的分块上传在接收过程中计数截断；
+从 WAV / MP3 容器头估算音频时长，超长录音在转录前拒绝
+"""
+
+import json
+import struct
+from typing import BinaryIO, Iterable, Optional
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class UploadRejected(ValueError):
+    """上传不符合限制（status_code 为应返回的 HTTP 状态码）"""
+
+    def __init__(self, message: str, status_code: int = 413):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+# MPEG Layer III 比特率表（kbps），索引 0 / 15 无效
+_MP3_BITRATES = {
+    1: [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],
+    2: [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+}
+_MP3_SAMPLE_RATES = [44100, 48000, 32000]
+
+
+def _wav_duration(header: bytes, total_size: int) -> Optional[float]:
+    """RIFF/WAVE：fmt 块的 byte_rate 与 data 块长度"""
+    pos, byte_rate = 12, None
+    while pos + 8 <= len(header):
+        chunk_id, chunk_size = header[pos:pos + 4], struct.unpack("<I", header[pos + 4:pos + 8])[0]
+        if chunk_id == b"fmt " and pos + 16 <= len(header):
+            byte_rate = struct.unpack("<I", header[pos + 16:pos + 20])[0]
+        elif chunk_id == b"data":
+            if not byte_rate:
+                return None
+            # 流式写出的 WAV 常把 data 长度写成 0 或 0xFFFFFFFF，此时按文件剩余长度计算
+            data_size = chunk_size if 0 < chunk_size < 0xFFFFFFFF else total_size - pos - 8
+            return min(data_size, total_size - pos - 8) / byte_rate
+        pos += 8 + chunk_size + (chunk_size & 1)
+    return None
+
+
+def _mp3_duration(data: bytes, audio_start: int, total_size: int) -> Optional[float]:
+    """MPEG Layer III：优先读 Xing/Info/VBRI 帧数，否则按首帧比特率（CBR）估算"""
+    for i in range(len(data) - 4):
+        b1, b2, b3 = data[i + 1], data[i + 2], data[i + 3]
+        if data[i] != 0xFF or (b1 & 0xE0) != 0xE0:
+            continue
+        version_bits, layer_bits = (b1 >> 3) & 3, (b1 >> 1) & 3
+        bitrate_index, rate_index = b2 >> 4, (b2 >> 2) & 3
+        if version_bits == 1 or layer_bits != 1 or bitrate_index in (0, 15) or rate_index == 3:
+            continue
+
+        mpeg1 = version_bits == 3
+        sample_rate = _MP3_SAMPLE_RATES[rate_index] // {3: 1, 2: 2, 0: 4}[version_bits]
+        bitrate = _MP3_BITRATES[1 if mpeg1 else 2][bitrate_index] * 1000
+        samples_per_frame = 1152 if mpeg1 else 576
+        mono = (b3 >> 6) == 3
+        side_info = (17 if mono else 32) if mpeg1 else (9 if mono else 17)
+
+        xing = i + 4 + side_info
+        if data[xing:xing + 4] in (b"Xing", b"Info") and len(data) >= xing + 12:
+            flags = struct.unpack(">I", data[xing + 4:xing + 8])[0]
+            if flags & 1:
+                frames = struct.unpack(">I", data[xing + 8:xing + 12])[0]
+                return frames * samples_per_frame / sample_rate
+        vbri = i + 36
+        if data[vbri:vbri + 4] == b"VBRI" and len(data) >= vbri + 18:
+            frames = struct.unpack(">I", data[vbri + 14:vbri + 18])[0]
+            return frames * samples_per_frame / sample_rate
+
+        return (total_size - audio_start - i) * 8 / bitrate
+    return None
+
+
+def probe_duration(fileobj: BinaryIO) -> Optional[float]:
+    """
+    从容器头估算音频时长（秒），只读取文件开头几 KB
+
+    支持 WAV 与 MP3（Layer III）；其他格式或无法识别时返回 None。
+    调用后文件位置回到开头。
+    """
+    fileobj.seek(0, 2)
+    total_size = fileobj.tell()
+    fileobj.seek(0)
+    try:
+        head = fileobj.read(10)
+        if head[:4] == b"RIFF":
+            fileobj.seek(0)
+            header = fileobj.read(4096)
+            return _wav_duration(header, total_size) if header[8:12] == b"WAVE" else None
+
+        # 跳过 ID3v2 标签（可能包含封面图片，长度不定）
+        audio_start = 0
+        if head[:3] == b"ID3" and len(head) == 10:
+            size = 0
+            for b in head[6:10]:
+                size = (size << 7) | (b & 0x7F)
+            audio_start = 10 + size + (10 if head[5] & 0x10 else 0)
+        fileobj.seek(audio_start)
+        return _mp3_duration(fileobj.read(8192), audio_start, total_size)
+    finally:
+        fileobj.seek(0)
+
+
+def check_audio(fileobj: BinaryIO, max_bytes: int, max_seconds: float) -> Optional[float]:
+    """
+    检查音频大小与时长
+
+    Returns:
+        估算时长（无法识别格式时为 None，不拒绝，交给 ASR 解码）
+
+    Raises:
+        UploadRejected: 超过大小（413）或时长（422）限制
+    """
+    fileobj.seek(0, 2)
+    size = fileobj.tell()
+    fileobj.seek(0)
+    if max_bytes and size > max_bytes:
+        raise UploadRejected(f"音频过大: {size / 1024 / 1024:.1f}MB（上限 {max_bytes / 1024 / 1024:.0f}MB）")
+
+    duration = probe_duration(fileobj)
+    if max_seconds and duration is not None and duration > max_seconds:
+        raise UploadRejected(
+            f"音频过长: {duration:.0f}s（上限 {max_seconds:.0f}s）", status_code=422
+        )
+    return duration
+
+
+class UploadLimitMiddleware:
+    """
+    限制上传请求体大小的 ASGI 中间件
+
+    声明了 Content-Length 的请求在读取请求体之前直接返回 413；
+    分块上传在累计字节数超限时停止接收，并把应用的响应替换为 413。
+    """
+
+    def __init__(self, app, max_bytes: int, paths: Iterable[str] = ("/analyze",)):
+        self.app = app
+        self.max_bytes = max_bytes
+        self.paths = tuple(paths)
+
+    async def _reject(self, send, message: str) -> None:
+        body = json.dumps({"success": False, "error": message}, ensure_ascii=False).encode("utf-8")
+        await send({
+            "type": "http.response.start",
+            "status": 413,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+    async def __call__(self, scope, receive, send):
+        if (scope["type"] != "http" or not self.max_bytes
+                or not scope["path"].startswith(self.paths)):
+            await self.app(scope, receive, send)
+            return
+
+        limit_message = f"请求体超过上限 {self.max_bytes / 1024 / 1024:.0f}MB"
+        headers = dict(scope.get("headers") or [])
+        content_length = headers.get(b"content-length")
+        if content_length is not None and int(content_length) > self.max_bytes:
+            logger.warning(f"拒绝超大上传: {scope['path']} Content-Length={int(content_length)}")
+            await self._reject(send, limit_message)
+            return
+
+        state = {"received": 0, "exceeded": False, "started": False}
+
+        async def limited_receive():
+            message = await receive()
+            if message["type"] == "http.request":
+                state["received"] += len(message.get("body", b""))
+                if state["received"] > self.max_bytes:
+                    state["exceeded"] = True
+                    raise UploadRejected(limit_message)
+            return message
+
+        async def guarded_send(message):
+            if state["exceeded"]:
+                # 应用对截断请求体的错误响应（解析失败等）替换为 413
+                if message["type"] == "http.response.start" and not state["started"]:
+                    state["started"] = True
+                    await self._reject(send, limit_message)
+                return
+            if message["type"] == "http.response.start":
+                state["started"] = True
+            await send(message)
+
+        try:
+            await self.app(scope, limited_receive, guarded_send)
+        except UploadRejected:
+            if not state["started"]:
+                state["started"] = True
+                await self._reject(send, limit_message)
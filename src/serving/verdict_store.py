@@ -0,0 +1,314 @@
+"""
+分析判定持久化
+SQLite（WAL 模式）存储每次分析的转录、分段、风险等级、诈骗类型、角色、阶段耗时与模型版本。
+请求路径只把记录放入内存队列，由后台线程批量写入，不增加响应延迟
+"""
+
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS verdicts (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    trace_id TEXT,
+    created_at REAL NOT NULL,
+    source TEXT,
+    role_id TEXT,
+    risk_level TEXT,
+    scam_type TEXT,
+    degraded INTEGER NOT NULL DEFAULT 0,
+    degraded_reason TEXT,
+    advice_source TEXT,
+    audio_duration REAL,
+    transcript TEXT,
+    segments TEXT,
+    defense_advice TEXT,
+    timings TEXT,
+    usage TEXT,
+    models TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_verdicts_created_at ON verdicts (created_at);
+DROP INDEX IF EXISTS idx_verdicts_scam_type;
+DROP INDEX IF EXISTS idx_verdicts_risk_level;
+CREATE INDEX IF NOT EXISTS idx_verdicts_risk_level_id ON verdicts (risk_level, id);
+CREATE INDEX IF NOT EXISTS idx_verdicts_scam_type_id ON verdicts (scam_type, id);
+CREATE INDEX IF NOT EXISTS idx_verdicts_role_id_id ON verdicts (role_id, id);
+"""
+
+_COLUMNS = (
+    "trace_id", "created_at", "source", "role_id", "risk_level", "scam_type",
+    "degraded", "degraded_reason", "advice_source", "audio_duration",
+    "transcript", "segments", "defense_advice", "timings", "usage", "models"
+)
+
+# JSON 编码存储的列
+_JSON_COLUMNS = ("segments", "timings", "usage", "models")
+
+# 列表查询不返回的大字段（通过 get() 获取完整记录）
+_DETAIL_COLUMNS = ("transcript", "segments", "defense_advice", "timings", "usage")
+
+_STOP = object()
+
+
+class VerdictStore:
+    """
+    判定存储
+
+    写入：submit() 只做字段提取并放入有界队列（满时丢弃并计数，不阻塞请求）；
+    后台线程攒够 batch_size 条或等待 flush_interval 秒后在一个事务中批量插入。
+    读取：每个线程使用独立的只读连接，WAL 模式下与写入互不阻塞。
+    """
+
+    def __init__(
+        self,
+        path: str = "./db/verdicts.db",
+        model_versions: Optional[Dict[str, Any]] = None,
+        batch_size: int = 64,
+        flush_interval: float = 0.5,
+        max_queue: int = 10000
+    ):
+        """
+        Args:
+            path: SQLite 数据库文件
+            model_versions: 随每条记录保存的模型版本 {"llm": ..., "whisper": ..., "embedding": ...}
+            batch_size: 单个事务最多写入的记录数
+            flush_interval: 队列不满一批时的最长等待时间（秒）
+            max_queue: 待写入队列上限
+        """
+        self.path = path
+        self.model_versions = model_versions or {}
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.dropped = 0
+        self.written = 0
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        conn = self._connect()
+        conn.executescript(_SCHEMA)
+        conn.close()
+
+        self._queue: "queue.Queue" = queue.Queue(maxsize=max_queue)
+        self._local = threading.local()
+        self._thread = threading.Thread(target=self._writer, name="verdict-writer", daemon=True)
+        self._thread.start()
+        logger.info(f"🗄️ 判定存储已就绪: {path}")
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    @property
+    def pending(self) -> int:
+        """尚未写入的记录数"""
+        return self._queue.qsize()
+
+    def submit(self, result: Dict, role_id: str, source: str = "audio") -> bool:
+        """
+        提交一次分析结果（不阻塞）
+
+        Args:
+            result: analyze_audio / analyze_transcript 的返回值
+            role_id: 受害者角色 ID
+            source: 来源（audio / text / live）
+
+        Returns:
+            是否已放入写入队列（队列已满时丢弃）
+        """
+        trace = result.get("trace") or {}
+        row = (
+            trace.get("trace_id"),
+            time.time(),
+            source,
+            role_id,
+            result.get("risk_level"),
+            result.get("scam_type"),
+            int(bool(result.get("degraded"))),
+            result.get("degraded_reason"),
+            result.get("advice_source"),
+            result.get("audio_duration"),
+            result.get("transcript"),
+            result.get("transcript_segments"),
+            result.get("defense_advice"),
+            [{"name": s["name"], "seconds": s["seconds"]} for s in trace.get("stages", [])],
+            result.get("usage"),
+            self.model_versions
+        )
+        try:
+            self._queue.put_nowait(row)
+            return True
+        except queue.Full:
+            self.dropped += 1
+            logger.warning(f"⚠️ 判定写入队列已满，丢弃记录（累计 {self.dropped} 条）")
+            return False
+
+    def _writer(self) -> None:
+        """后台写入线程：按批次在单个事务中插入"""
+        conn = self._connect()
+        placeholders = ", ".join("?" for _ in _COLUMNS)
+        sql = f"INSERT INTO verdicts ({', '.join(_COLUMNS)}) VALUES ({placeholders})"
+        json_idx = [_COLUMNS.index(c) for c in _JSON_COLUMNS]
+
+        stopping = False
+        while not stopping:
+            item = self._queue.get()
+            if item is _STOP:
+                break
+            batch = [item]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+
+            rows = []
+            for row in batch:
+                row = list(row)
+                for i in json_idx:
+                    row[i] = json.dumps(row[i], ensure_ascii=False) if row[i] is not None else None
+                rows.append(row)
+            try:
+                with conn:
+                    conn.executemany(sql, rows)
+                self.written += len(rows)
+            except sqlite3.Error as e:
+                logger.error(f"❌ 判定批量写入失败（{len(rows)} 条）: {e}")
+        conn.close()
+
+    def _reader(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._connect()
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _decode(row: sqlite3.Row) -> Dict:
+        record = dict(row)
+        for column in _JSON_COLUMNS:
+            if record.get(column) is not None:
+                record[column] = json.loads(record[column])
+        record["degraded"] = bool(record["degraded"])
+        return record
+
+    def _first_id_since(self, timestamp: float) -> Optional[int]:
+        """created_at >= timestamp 的第一条记录的 id（走 created_at 索引，只读一行）"""
+        row = self._reader().execute(
+            "SELECT id FROM verdicts WHERE created_at >= ? ORDER BY created_at LIMIT 1", (timestamp,)
+        ).fetchone()
+        return row[0] if row is not None else None
+
+    def query(
+        self,
+        limit: int = 50,
+        before_id: Optional[int] = None,
+        risk_level: Optional[str] = None,
+        scam_type: Optional[str] = None,
+        role_id: Optional[str] = None,
+        since: Optional[float] = None,
+        until: Optional[float] = None
+    ) -> Tuple[List[Dict], Optional[int]]:
+        """
+        按时间倒序分页查询（游标分页：下一页传入上一页返回的游标，深翻页不扫描已跳过的行）
+
+        id 与 created_at 同序递增，时间范围先换算为 id 范围，过滤条件配合 (列, id) 索引，
+        按 id 倒序读取时不需要临时排序。
+
+        Args:
+            limit: 每页条数
+            before_id: 游标，只返回 id 小于该值的记录
+            since / until: 创建时间范围（Unix 时间戳，秒）
+
+        Returns:
+            (记录列表, 下一页游标；没有更多记录时为 None)
+        """
+        conditions, params = [], []
+        for column, value in (("risk_level", risk_level), ("scam_type", scam_type), ("role_id", role_id)):
+            if value is not None:
+                conditions.append(f"{column} = ?")
+                params.append(value)
+        if since is not None:
+            since_id = self._first_id_since(since)
+            if since_id is None:
+                return [], None
+            conditions.append("id >= ?")
+            params.append(since_id)
+        if until is not None:
+            until_id = self._first_id_since(until)
+            if until_id is not None:
+                before_id = until_id if before_id is None else min(before_id, until_id)
+        if before_id is not None:
+            conditions.append("id < ?")
+            params.append(before_id)
+
+        columns = ["id"] + [c for c in _COLUMNS if c not in _DETAIL_COLUMNS]
+        sql = f"SELECT {', '.join(columns)} FROM verdicts"
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        sql += " ORDER BY id DESC LIMIT ?"
+        params.append(limit + 1)
+
+        rows = self._reader().execute(sql, params).fetchall()
+        records = [self._decode(row) for row in rows[:limit]]
+        next_cursor = records[-1]["id"] if len(rows) > limit else None
+        return records, next_cursor
+
+    def get(self, verdict_id: int) -> Optional[Dict]:
+        """按 id 获取完整记录（含分段、建议、阶段耗时与 token 用量）"""
+        row = self._reader().execute("SELECT * FROM verdicts WHERE id = ?", (verdict_id,)).fetchone()
+        return self._decode(row) if row is not None else None
+
+    def close(self, timeout: float = 10.0) -> None:
+        """写完队列中的记录后停止后台线程"""
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+        logger.info(f"🗄️ 判定存储已关闭（写入 {self.written} 条，丢弃 {self.dropped} 条）")
+
+
+if __name__ == "__main__":
+    # 测试代码：批量提交后分页查询
+    print("\n=== 测试判定存储 ===\n")
+
+    store = VerdictStore("/tmp/verdicts_demo.db", model_versions={"llm": "stub"})
+    start = time.perf_counter()
+    for i in range(1000):
+        store.submit({
+            "transcript": f"对话 {i}",
+            "transcript_segments": [{"start": 0.0, "end": 1.0, "text": f"对话 {i}"}],
+            "risk_level": ["Critical", "High", "Safe"][i % 3],
+            "scam_type": ["公检法", "刷单", "Safe"][i % 3],
+            "trace": {"trace_id": f"demo-{i}", "stages": [{"name": "asr", "seconds": 0.1}]}
+        }, "R01", source="text")
+    print(f"提交 1000 条耗时: {(time.perf_counter() - start) * 1000:.1f}ms")
+    store.close()
+
+    store = VerdictStore("/tmp/verdicts_demo.db")
+    page, cursor = store.query(limit=5, risk_level="Critical")
+    print(f"第一页: {[r['trace_id'] for r in page]} 游标={cursor}")
+    page, cursor = store.query(limit=5, risk_level="Critical", before_id=cursor)
+    print(f"第二页: {[r['trace_id'] for r in page]} 游标={cursor}")
+    print(f"完整记录: {store.get(page[0]['id'])}")
+    store.close()
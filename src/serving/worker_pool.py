@@ -0,0 +1,263 @@
+"""
+多进程推理 Worker 池
+前端进程负责 HTTP 与 ASR，固定数量的 Worker 进程负责 RAG 检索与智能体协作
+
+内存布局：
+- Whisper（CTranslate2）只在前端进程加载一份，多个推理副本共享权重
+- 嵌入模型在前端加载后放入共享内存，各 Worker 直接映射使用，不重复加载
+- 知识库在前端构建（唯一写入方），各 Worker 以只读方式打开
+"""
+
+import asyncio
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, List, Optional, Tuple
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+# Worker 进程内的系统实例（由 _init_worker 创建）
+_worker_system = None
+
+
+def _init_worker(system_kwargs: Dict, embedder) -> None:
+    """Worker 进程初始化：以只读、无 ASR 的方式创建系统实例"""
+    global _worker_system
+
+    from main import AntiFraudSystem
+
+    _worker_system = AntiFraudSystem(
+        load_asr=False,
+        read_only_kb=True,
+        embedder=embedder,
+        **system_kwargs
+    )
+    logger.info(f"✅ 推理 Worker 已就绪 (pid={os.getpid()})")
+
+
+def _ping() -> int:
+    """预热用：触发 Worker 进程启动并完成初始化"""
+    return os.getpid()
+
+
+def _analyze_transcript(transcript_result: Dict, victim_role_id: str, options: Dict) -> Dict:
+    """在 Worker 进程中分析转录结果"""
+    result = _worker_system.analyze_transcript(transcript_result, victim_role_id, **options)
+    # CrewOutput 不保证可跨进程序列化，转为字符串返回
+    result["raw_result"] = str(result.get("raw_result", ""))
+    return result
+
+
+def _analyze_transcript_batch(jobs: List[Tuple]) -> List:
+    """在 Worker 进程中并发分析一个批次"""
+    results = _worker_system.analyze_transcript_batch(jobs)
+    for result in results:
+        if isinstance(result, dict):
+            result["raw_result"] = str(result.get("raw_result", ""))
+    return results
+
+
+def _detect_transcript(transcript_result: Dict, options: Dict) -> Dict:
+    """在 Worker 进程中执行与受害者无关的检测"""
+    return _worker_system.detect_transcript(transcript_result, **options)
+
+
+def _advise_detected_batch(jobs: List[Tuple]) -> List:
+    """在 Worker 进程中并发执行一批建议步骤"""
+    results = _worker_system.advise_detected_batch(jobs)
+    for result in results:
+        if isinstance(result, dict):
+            result["raw_result"] = str(result.get("raw_result", ""))
+    return results
+
+
+def _get_mp_context():
+    """
+    获取多进程上下文
+
+    使用 spawn 而非 fork：CTranslate2 / PyTorch 的线程池在 fork 后不可用。
+    优先使用 torch.multiprocessing，使模型参数以共享内存方式传递给 Worker。
+    """
+    try:
+        import torch.multiprocessing as mp
+    except ImportError:
+        import multiprocessing as mp
+    return mp.get_context("spawn")
+
+
+class InferenceWorkerPool:
+    """固定大小的推理 Worker 进程池"""
+
+    def __init__(
+        self,
+        num_workers: int,
+        embedder=None,
+        system_kwargs: Optional[Dict] = None
+    ):
+        """
+        初始化 Worker 池（调用 start() 后才会启动进程）
+
+        Args:
+            num_workers: Worker 进程数
+            embedder: 前端已加载的 SentenceTransformer 实例，放入共享内存后传给 Worker
+            system_kwargs: 传给 AntiFraudSystem 的其他参数
+        """
+        if num_workers < 1:
+            raise ValueError("num_workers 必须大于 0")
+
+        self.num_workers = num_workers
+        self.embedder = embedder
+        self.system_kwargs = system_kwargs or {}
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+        if self.embedder is not None and hasattr(self.embedder, "share_memory"):
+            # 参数移入共享内存，Worker 反序列化时只映射不复制
+            self.embedder.share_memory()
+
+    def _create_executor(self) -> ProcessPoolExecutor:
+        return ProcessPoolExecutor(
+            max_workers=self.num_workers,
+            mp_context=_get_mp_context(),
+            initializer=_init_worker,
+            initargs=(self.system_kwargs, self.embedder)
+        )
+
+    def start(self) -> None:
+        """启动所有 Worker 并等待其完成模型加载"""
+        logger.info(f"🚀 启动 {self.num_workers} 个推理 Worker...")
+        self._executor = self._create_executor()
+
+        futures = [self._executor.submit(_ping) for _ in range(self.num_workers)]
+        pids = {f.result() for f in futures}
+        logger.info(f"✅ 推理 Worker 池已启动: {sorted(pids)}")
+
+    def _restart(self) -> None:
+        """Worker 异常退出导致进程池损坏时重建"""
+        logger.error("⚠️ 推理 Worker 进程池已损坏，正在重建...")
+        old = self._executor
+        self._executor = self._create_executor()
+        if old is not None:
+            old.shutdown(wait=False, cancel_futures=True)
+
+    async def analyze_transcript(
+        self,
+        transcript_result: Dict,
+        victim_role_id: str = "R01",
+        **options
+    ) -> Dict:
+        """
+        将转录结果派发给空闲 Worker 分析
+
+        Args:
+            transcript_result: ASRTool.transcribe_audio 的返回结果
+            victim_role_id: 受害者角色 ID
+            **options: 传给 analyze_transcript 的其他参数（如 trace_id）
+
+        Returns:
+            AntiFraudSystem.analyze_transcript 的结果（raw_result 已转为字符串）
+        """
+        if self._executor is None:
+            raise RuntimeError("Worker 池尚未启动，请先调用 start()")
+
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(
+                self._executor,
+                _analyze_transcript,
+                transcript_result,
+                victim_role_id,
+                options
+            )
+        except BrokenProcessPool:
+            self._restart()
+            raise
+
+    async def analyze_transcript_batch(
+        self,
+        jobs: List[Tuple]
+    ) -> List:
+        """
+        将一个批次整体派发给同一个 Worker，由其并发执行
+
+        Args:
+            jobs: [(transcript_result, victim_role_id[, options]), ...]
+
+        Returns:
+            与 jobs 顺序一致的结果列表；单个请求失败时对应位置为 Exception 实例
+        """
+        if self._executor is None:
+            raise RuntimeError("Worker 池尚未启动，请先调用 start()")
+
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(
+                self._executor,
+                _analyze_transcript_batch,
+                jobs
+            )
+        except BrokenProcessPool:
+            self._restart()
+            raise
+
+    async def _submit(self, fn, *args):
+        """派发给空闲 Worker，进程池损坏时重建后重新抛出"""
+        if self._executor is None:
+            raise RuntimeError("Worker 池尚未启动，请先调用 start()")
+
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(self._executor, fn, *args)
+        except BrokenProcessPool:
+            self._restart()
+            raise
+
+    async def detect_transcript(self, transcript_result: Dict, **options) -> Dict:
+        """
+        派发与受害者无关的检测（前端按音频哈希合并后只派发一次）
+
+        Args:
+            **options: 传给 detect_transcript 的其他参数
+                （trace_id / profile / priority / victim_role_id / deep_advice）
+
+        Returns:
+            AntiFraudSystem.detect_transcript 的结果
+        """
+        return await self._submit(_detect_transcript, transcript_result, options)
+
+    async def advise_detected(
+        self,
+        transcript_result: Dict,
+        victim_role_id: str,
+        detection: Dict,
+        shared: bool = False,
+        **options
+    ) -> Dict:
+        """派发单个角色的建议步骤（结果同 analyze_transcript，raw_result 已转为字符串）"""
+        results = await self.advise_detected_batch(
+            [(transcript_result, victim_role_id, detection, shared, options)]
+        )
+        if isinstance(results[0], Exception):
+            raise results[0]
+        return results[0]
+
+    async def advise_detected_batch(self, jobs: List[Tuple]) -> List:
+        """
+        将一批建议步骤整体派发给同一个 Worker，由其并发执行
+
+        Args:
+            jobs: [(transcript_result, victim_role_id, detection, shared[, options]), ...]
+
+        Returns:
+            与 jobs 顺序一致的结果列表；单个请求失败时对应位置为 Exception 实例
+        """
+        return await self._submit(_advise_detected_batch, jobs)
+
+    def shutdown(self) -> None:
+        """关闭所有 Worker"""
+        if self._executor is not None:
+            logger.info("🛑 关闭推理 Worker 池...")
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
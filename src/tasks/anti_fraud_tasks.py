@@ -1,8 +1,15 @@
 """
 CrewAI 任务定义模块
 定义三个顺序执行的任务：监控 -> 侧写 -> 防御
+
+各任务的 Prompt 以静态内容开头、本次调用的数据结尾（见 config/tasks.yaml），
+以便命中服务商的 Prompt 前缀缓存
 """
 
+import csv
+import os
+from functools import lru_cache
+
 import yaml
 from crewai import Task
 
@@ -13,6 +20,37 @@ def load_task_config(config_path: str = "./config/tasks.yaml") -> dict:
         return yaml.safe_load(f)
 
 
+@lru_cache(maxsize=4)
+def load_case_catalog(cases_csv: str = "./data/cases.csv", limit: int = 10, desc_chars: int = 80) -> str:
+    """
+    生成 Profiler Prompt 中的常见诈骗类型列表（进程内缓存）
+    
+    按 cases.csv 中的顺序取前 limit 个类型，输出只由文件内容决定，
+    作为静态前缀的一部分在所有请求间逐字节相同。
+    
+    Args:
+        cases_csv: 案例类型表路径
+        limit: 列出的类型数（0 表示不列出）
+        desc_chars: 每个类型描述的最大字符数
+    """
+    if limit <= 0 or not os.path.exists(cases_csv):
+        return "无"
+    
+    lines, seen = [], set()
+    with open(cases_csv, 'r', encoding='utf-8-sig', newline='') as f:
+        for row in csv.DictReader(f):
+            case_type = (row.get('type') or '').strip()
+            if not case_type or case_type in seen:
+                continue
+            seen.add(case_type)
+            desc = ' '.join((row.get('desc') or '').split())[:desc_chars]
+            keywords = (row.get('keywords') or '').strip()
+            lines.append(f"- {case_type}：{desc}" + (f"（关键词：{keywords}）" if keywords else ""))
+            if len(lines) >= limit:
+                break
+    return "\n".join(lines) or "无"
+
+
 def create_monitor_task(agent, transcript_text: str) -> Task:
     """
     创建监控任务
@@ -49,6 +87,7 @@ def create_profile_task(agent, monitor_result: str, transcript_text: str) -> Tas
     
     return Task(
         description=config['description'].format(
+            case_catalog=load_case_catalog(limit=int(os.getenv("PROMPT_CASE_EXAMPLES", "10"))),
             monitor_result=monitor_result,
             transcript_text=transcript_text
         ),
@@ -4,10 +4,33 @@
 
 from .asr_tool import ASRTool, transcribe_audio
 from .rag_tool import RAGSearchTool, search_scam_knowledge
+from .kb_snapshots import KBSnapshots, KBSnapshotError
+from .role_registry import RoleRegistry, RoleRecord
+from .risk_signals import SignalVocabulary, load_signal_vocabulary
+from .transcript_condenser import TranscriptCondenser
+from .local_analyzer import LocalAnalyzer
+from .advice_store import AdviceStore
+from .incremental_scorer import IncrementalRiskScorer
+from .audio_fingerprint import FingerprintIndex, fingerprint
+from .risk_model import RISK_LEVELS, RiskModel
 
 __all__ = [
     'ASRTool',
     'transcribe_audio',
     'RAGSearchTool',
-    'search_scam_knowledge'
+    'search_scam_knowledge',
+    'KBSnapshots',
+    'KBSnapshotError',
+    'RoleRegistry',
+    'RoleRecord',
+    'SignalVocabulary',
+    'load_signal_vocabulary',
+    'TranscriptCondenser',
+    'LocalAnalyzer',
+    'AdviceStore',
+    'IncrementalRiskScorer',
+    'FingerprintIndex',
+    'fingerprint',
+    'RISK_LEVELS',
+    'RiskModel'
 ]
@@ -0,0 +1,126 @@
+"""
+预生成防御建议库
+按 (诈骗类型, 风险等级, 受害者标签) 离线生成 Guardian 建议并存为 JSON，
+运行时直接查表返回，Guardian 不再位于关键路径上
+"""
+
+import json
+import os
+import threading
+import time
+from typing import Dict, List, Optional
+import logging
+
+from src.tools.risk_signals import match_case_type
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+# 预生成建议的风险等级（Safe 使用通用模板，不预生成）
+ADVICE_RISK_LEVELS = ("Medium", "High", "Critical")
+
+# 旧版建议库不区分风险等级，生成时固定使用 High
+_LEGACY_RISK_LEVEL = "High"
+
+
+class AdviceStore:
+    """(case_type, risk_level, tag) -> 防御建议"""
+
+    def __init__(self, path: str = "./db/advice_store.json"):
+        """
+        Args:
+            path: 建议库文件路径（不存在时为空库）
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._entries: Dict[str, Dict] = {}
+        self.reload()
+
+    @staticmethod
+    def _key(case_type: str, risk_level: str, tag: str) -> str:
+        return f"{case_type}|{risk_level}|{tag}"
+
+    def reload(self) -> None:
+        """从文件加载建议库（旧版不含风险等级的条目按 High 载入）"""
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, 'r', encoding='utf-8') as f:
+            raw = json.load(f)
+        entries = {}
+        for entry in raw.values():
+            entry.setdefault("risk_level", _LEGACY_RISK_LEVEL)
+            entries[self._key(entry["case_type"], entry["risk_level"], entry["tag"])] = entry
+        with self._lock:
+            self._entries = entries
+        logger.info(f"预生成防御建议已加载，共 {len(entries)} 条")
+
+    def case_types(self) -> List[str]:
+        with self._lock:
+            return sorted({e["case_type"] for e in self._entries.values()})
+
+    def put(
+        self,
+        case_type: str,
+        risk_level: str,
+        tag: str,
+        advice: str,
+        victim_name: str,
+        model: Optional[str] = None
+    ) -> None:
+        """
+        写入一条建议
+
+        Args:
+            victim_name: 生成时使用的代表角色姓名（运行时替换为实际受害者姓名）
+        """
+        with self._lock:
+            self._entries[self._key(case_type, risk_level, tag)] = {
+                "case_type": case_type,
+                "risk_level": risk_level,
+                "tag": tag,
+                "advice": advice,
+                "victim_name": victim_name,
+                "model": model,
+                "generated_at": time.strftime("%Y-%m-%dT%H:%M:%S")
+            }
+
+    def __contains__(self, item) -> bool:
+        case_type, risk_level, tag = item
+        with self._lock:
+            return self._key(case_type, risk_level, tag) in self._entries
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+    def save(self) -> None:
+        """原子写入（先写临时文件再替换，避免读到半个文件）"""
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with self._lock:
+            entries = dict(self._entries)
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(entries, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def get(self, scam_type: str, risk_level: str, victim_info: Dict) -> Optional[str]:
+        """
+        查询建议
+
+        诈骗类型按名称模糊匹配到已知类型；同类型下找不到该风险等级与标签的条目时不返回
+        （由调用方退回到通用模板），不同等级的建议语气与紧迫程度不同，不相互替代。
+        """
+        case_type = match_case_type(scam_type, self.case_types())
+        if case_type is None:
+            return None
+        with self._lock:
+            entry = self._entries.get(self._key(case_type, risk_level, victim_info.get("tag", "")))
+        if entry is None:
+            return None
+
+        advice = entry["advice"]
+        name = victim_info.get("name")
+        if name and entry.get("victim_name") and entry["victim_name"] != name:
+            advice = advice.replace(entry["victim_name"], name)
+        return advice
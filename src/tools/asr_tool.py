@@ -4,14 +4,25 @@ ASR 语音转录工具
 """
 
 import os
-from typing import Dict, List, Optional
+from concurrent.futures import ThreadPoolExecutor
+from typing import BinaryIO, Dict, List, Optional, Tuple, Union
 from faster_whisper import WhisperModel
+from faster_whisper.audio import decode_audio
+from faster_whisper.vad import VadOptions, get_speech_timestamps
+import numpy as np
 import logging
 
+from src.utils.resources import ManagedResource
+from src.utils.tracing import stage
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
+# faster-whisper 解码后的采样率
+SAMPLE_RATE = 16000
+
+
 class ASRTool:
     """Faster-Whisper 语音转录工具类"""
     
@@ -19,7 +30,10 @@ class ASRTool:
         self,
         model_size: str = "base",
         device: str = "cpu",
-        compute_type: str = "int8"
+        compute_type: str = "int8",
+        cpu_threads: int = 0,
+        num_workers: int = 1,
+        chunk_seconds: float = 0
     ):
         """
         初始化 Whisper 模型
@@ -28,17 +42,36 @@ class ASRTool:
             model_size: 模型大小 (tiny, base, small, medium, large-v3)
             device: 运行设备 (cpu, cuda)
             compute_type: 计算精度 (int8, float16, float32)
+            cpu_threads: 每个推理副本使用的 CPU 线程数（0 表示自动）
+            num_workers: 推理副本数，多线程并发调用 transcribe 时可真正并行，
+                         同一设备上的副本共享模型权重
+            chunk_seconds: 长录音分块并行转录的目标块长（秒）；大于 0 且 num_workers > 1 时，
+                           超过该长度的录音先用 VAD 在静音处切块，各块由多个副本并行解码
         """
-        logger.info(f"加载 Faster-Whisper 模型: {model_size} on {device}")
-        self.model = WhisperModel(
+        logger.info(
+            f"加载 Faster-Whisper 模型: {model_size} on {device} "
+            f"(workers={num_workers}, threads={cpu_threads or 'auto'})"
+        )
+        self.num_workers = num_workers
+        self.chunk_seconds = chunk_seconds
+        # 模型可由 ResourceManager 空闲卸载，下次转录时重新加载
+        self.resource = ManagedResource("whisper", loader=lambda: WhisperModel(
             model_size,
             device=device,
-            compute_type=compute_type
-        )
+            compute_type=compute_type,
+            cpu_threads=cpu_threads,
+            num_workers=num_workers
+        ))
+        self.resource.get()
+    
+    @property
+    def model(self) -> WhisperModel:
+        """Whisper 模型（已卸载时重新加载）"""
+        return self.resource.get()
         
     def transcribe_audio(
         self,
-        audio_path: str,
+        audio_path: Union[str, BinaryIO],
         language: str = "zh",
         vad_filter: bool = True
     ) -> Dict:
@@ -46,7 +79,7 @@ class ASRTool:
         转录音频文件为文本
         
         Args:
-            audio_path: 音频文件路径
+            audio_path: 音频文件路径，或已打开的文件对象（如上传的内存缓冲，不落盘）
             language: 语言代码 (zh, en)
             vad_filter: 是否启用语音活动检测（过滤静音）
             
@@ -57,42 +90,144 @@ class ASRTool:
                 "language": "zh"
             }
         """
-        if not os.path.exists(audio_path):
+        if isinstance(audio_path, str) and not os.path.exists(audio_path):
             raise FileNotFoundError(f"音频文件不存在: {audio_path}")
         
-        logger.info(f"开始转录: {audio_path}")
-        
-        # 执行转录
-        segments, info = self.model.transcribe(
-            audio_path,
-            language=language,
-            vad_filter=vad_filter,
-            beam_size=5
-        )
+        logger.info(f"开始转录: {audio_path if isinstance(audio_path, str) else '<内存缓冲>'}")
         
-        # 处理结果
-        segment_list = []
-        full_text = ""
-        
-        for segment in segments:
-            seg_dict = {
-                "start": round(segment.start, 2),
-                "end": round(segment.end, 2),
-                "text": segment.text.strip()
-            }
-            segment_list.append(seg_dict)
-            full_text += segment.text.strip() + " "
+        with self.resource.lease(), stage("asr") as span:
+            audio = audio_path
+            chunks: List[Tuple[int, int]] = []
+            if self.chunk_seconds > 0 and self.num_workers > 1:
+                # 先解码为波形，超过块长时在静音处切块
+                audio = decode_audio(audio_path, sampling_rate=SAMPLE_RATE)
+                if len(audio) > self.chunk_seconds * SAMPLE_RATE:
+                    chunks = self.split_on_silence(audio)
+            
+            if len(chunks) > 1:
+                segment_list, detected_language = self._transcribe_chunks(
+                    audio, chunks, language, vad_filter
+                )
+                duration = len(audio) / SAMPLE_RATE
+                span["chunks"] = len(chunks)
+            else:
+                # 执行转录
+                segments, info = self.model.transcribe(
+                    audio,
+                    language=language,
+                    vad_filter=vad_filter,
+                    beam_size=5
+                )
+                # 处理结果（segments 为惰性生成器，解码在遍历时发生）
+                segment_list = _collect_segments(segments)
+                detected_language, duration = info.language, info.duration
+            
+            span["audio_duration"] = round(duration, 2)
         
         result = {
-            "text": full_text.strip(),
+            "text": " ".join(seg["text"] for seg in segment_list),
             "segments": segment_list,
-            "language": info.language,
-            "duration": info.duration
+            "language": detected_language,
+            "duration": duration
         }
         
-        logger.info(f"转录完成，共 {len(segment_list)} 个片段，总时长 {info.duration:.2f}s")
+        logger.info(f"转录完成，共 {len(segment_list)} 个片段，总时长 {duration:.2f}s")
         
         return result
+    
+    def split_on_silence(self, audio: np.ndarray) -> List[Tuple[int, int]]:
+        """
+        用 VAD 把波形切成约 chunk_seconds 长的块，切点只落在静音处
+        
+        连续语音超过块长时由 VAD 在其内部最长的停顿处强制切开。
+        
+        Returns:
+            [(起始采样点, 结束采样点), ...]，按时间顺序；没有检测到语音时为空
+        """
+        speech = get_speech_timestamps(
+            audio,
+            VadOptions(max_speech_duration_s=self.chunk_seconds, min_silence_duration_ms=500)
+        )
+        if not speech:
+            return []
+        
+        target = int(self.chunk_seconds * SAMPLE_RATE)
+        chunks = []
+        start, end = speech[0]["start"], speech[0]["end"]
+        for region in speech[1:]:
+            if region["end"] - start > target:
+                chunks.append((start, end))
+                start = region["start"]
+            end = region["end"]
+        chunks.append((start, end))
+        return chunks
+    
+    def _transcribe_chunks(
+        self,
+        audio: np.ndarray,
+        chunks: List[Tuple[int, int]],
+        language: str,
+        vad_filter: bool
+    ) -> Tuple[List[Dict], str]:
+        """各块由多个推理副本并行解码，按顺序合并并把时间戳换算回整段录音"""
+        def _transcribe(chunk: Tuple[int, int]) -> Tuple[List[Dict], str]:
+            start, end = chunk
+            segments, info = self.model.transcribe(
+                audio[start:end],
+                language=language,
+                vad_filter=vad_filter,
+                beam_size=5
+            )
+            return _collect_segments(segments, offset=start / SAMPLE_RATE), info.language
+        
+        logger.info(f"长录音切分为 {len(chunks)} 块，{self.num_workers} 个副本并行转录")
+        with ThreadPoolExecutor(max_workers=min(self.num_workers, len(chunks))) as pool:
+            results = list(pool.map(_transcribe, chunks))
+        
+        segment_list = [seg for segments, _ in results for seg in segments]
+        return segment_list, results[0][1]
+    
+    def transcribe_batch(
+        self,
+        audio_paths: List[str],
+        language: str = "zh",
+        vad_filter: bool = True
+    ) -> List:
+        """
+        批量转录：按推理副本数并发执行，填满 CPU 线程
+        
+        Args:
+            audio_paths: 音频文件路径列表
+            language: 语言代码 (zh, en)
+            vad_filter: 是否启用语音活动检测
+            
+        Returns:
+            与 audio_paths 顺序一致的结果列表；单个文件失败时对应位置为 Exception 实例
+        """
+        def _transcribe(path):
+            try:
+                return self.transcribe_audio(path, language=language, vad_filter=vad_filter)
+            except Exception as e:
+                logger.error(f"转录失败: {path}: {e}")
+                return e
+        
+        if len(audio_paths) <= 1 or self.num_workers <= 1:
+            return [_transcribe(path) for path in audio_paths]
+        
+        with ThreadPoolExecutor(max_workers=min(self.num_workers, len(audio_paths))) as pool:
+            return list(pool.map(_transcribe, audio_paths))
+
+
+def _collect_segments(segments, offset: float = 0.0) -> List[Dict]:
+    """把 faster-whisper 的分段转为字典（offset 为该块在整段录音中的起始秒数）"""
+    return [
+        {
+            "start": round(segment.start + offset, 2),
+            "end": round(segment.end + offset, 2),
+            "text": segment.text.strip()
+        }
+        for segment in segments
+    ]
 
 
 def transcribe_audio(audio_path: str, model_size: str = "base") -> str:
@@ -0,0 +1,384 @@
+"""
+音频指纹索引
+对频谱峰值两两配对生成哈希（Shazam 式地标指纹），识别重新编码、截取或不同码率的
+已知诈骗录音；命中时直接返回已存储的判定，跳过 ASR 与 LLM
+"""
+
+import glob
+import json
+import os
+import threading
+import time
+import uuid
+from typing import BinaryIO, Dict, List, Optional, Tuple, Union
+import logging
+
+import numpy as np
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+# 指纹参数（修改后需重建索引）
+FP_SAMPLE_RATE = 8000
+FP_WINDOW = 1024
+FP_HOP = 256
+PEAK_NEIGHBORHOOD = (15, 15)   # 局部极大值邻域（帧, 频点）
+PEAK_MIN_CONTRAST = 1.0        # 峰值高出所在帧中位对数幅度的最小值（约 8.7dB）
+PEAKS_PER_SECOND = 30
+FAN_OUT = 10                   # 每个锚点配对的峰值数
+MAX_DELTA_FRAMES = 63          # 配对的最大帧间隔（6 bit）
+
+
+def load_audio(source: Union[str, BinaryIO]) -> np.ndarray:
+    """解码为 8kHz 单声道波形（文件对象读取后回到开头，可继续交给 ASR）"""
+    from faster_whisper.audio import decode_audio
+
+    samples = decode_audio(source, sampling_rate=FP_SAMPLE_RATE)
+    if not isinstance(source, str):
+        source.seek(0)
+    return samples
+
+
+def _sliding_max(values: np.ndarray, size: int, axis: int) -> np.ndarray:
+    """沿一个轴的滑动窗口最大值（边缘按最小值填充）"""
+    pad = [(0, 0)] * values.ndim
+    pad[axis] = (size // 2, size // 2)
+    padded = np.pad(values, pad, mode="constant", constant_values=values.min())
+    return np.lib.stride_tricks.sliding_window_view(padded, size, axis=axis).max(axis=-1)
+
+
+def spectral_peaks(samples: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    对数幅度谱中的局部极大值
+
+    Returns:
+        (帧索引, 频点索引)，按帧排序
+    """
+    if len(samples) < FP_WINDOW:
+        return np.empty(0, dtype=np.int32), np.empty(0, dtype=np.int32)
+
+    frames = np.lib.stride_tricks.sliding_window_view(samples, FP_WINDOW)[::FP_HOP]
+    spectrum = np.abs(np.fft.rfft(frames * np.hanning(FP_WINDOW), axis=1))
+    log_spec = np.log(spectrum + 1e-6).astype(np.float32)
+
+    local_max = _sliding_max(_sliding_max(log_spec, PEAK_NEIGHBORHOOD[0], 0), PEAK_NEIGHBORHOOD[1], 1)
+    # 峰值需高出所在帧的中位能量（静音帧没有峰）
+    floor = np.median(log_spec, axis=1, keepdims=True) + PEAK_MIN_CONTRAST
+    times, freqs = np.nonzero((log_spec == local_max) & (log_spec > floor))
+
+    # 每秒只保留最强的 PEAKS_PER_SECOND 个峰，使峰值密度不随音量与噪声变化
+    block = times // (FP_SAMPLE_RATE // FP_HOP)
+    order = np.lexsort((-log_spec[times, freqs], block))
+    block_sorted = block[order]
+    starts = np.searchsorted(block_sorted, block_sorted, side="left")
+    keep = np.sort(order[np.arange(len(order)) - starts < PEAKS_PER_SECOND])
+    return times[keep].astype(np.int32), freqs[keep].astype(np.int32)
+
+
+def fingerprint(samples: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    生成指纹
+
+    每个峰值作为锚点，与其后 MAX_DELTA_FRAMES 帧内的 FAN_OUT 个峰值配对，
+    哈希 = 锚点频点(10 bit) | 目标频点(10 bit) | 帧间隔(6 bit)。
+
+    Returns:
+        (哈希 uint32 数组, 锚点帧索引 int32 数组)
+    """
+    times, freqs = spectral_peaks(samples)
+    hashes, offsets = [], []
+    for k in range(1, FAN_OUT + 1):
+        anchor_t, anchor_f = times[:-k], freqs[:-k]
+        target_t, target_f = times[k:], freqs[k:]
+        delta = target_t - anchor_t
+        valid = (delta > 0) & (delta <= MAX_DELTA_FRAMES)
+        hashes.append(
+            (anchor_f[valid].astype(np.uint32) << 16)
+            | (target_f[valid].astype(np.uint32) << 6)
+            | delta[valid].astype(np.uint32)
+        )
+        offsets.append(anchor_t[valid])
+    if not hashes:
+        return np.empty(0, dtype=np.uint32), np.empty(0, dtype=np.int32)
+    return np.concatenate(hashes), np.concatenate(offsets).astype(np.int32)
+
+
+Columns = Tuple[np.ndarray, np.ndarray, np.ndarray]
+
+
+def _empty_columns() -> Columns:
+    return np.empty(0, dtype=np.uint32), np.empty(0, dtype=np.int32), np.empty(0, dtype=np.int32)
+
+
+def _sort_columns(hashes: np.ndarray, tracks: np.ndarray, offsets: np.ndarray) -> Columns:
+    """按哈希排序（哈希, 录音编号, 锚点帧）三列"""
+    order = np.argsort(hashes, kind="stable")
+    return hashes[order], tracks[order], offsets[order]
+
+
+def _merge_sorted(base: Columns, extra: Columns) -> Columns:
+    """合并两组按哈希排序的列（线性时间，无需重新排序）"""
+    if len(extra[0]) == 0:
+        return base
+    positions = np.searchsorted(base[0], extra[0], side="right")
+    return tuple(np.insert(b, positions, e) for b, e in zip(base, extra))
+
+
+def _candidates(columns: Columns, hashes: np.ndarray, offsets: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """查询哈希在一组有序列中的全部 (录音编号, 库内帧 - 查询帧)"""
+    db_hashes, db_tracks, db_offsets = columns
+    left = np.searchsorted(db_hashes, hashes, side="left")
+    right = np.searchsorted(db_hashes, hashes, side="right")
+    counts = right - left
+    # 展开所有 (查询哈希, 库内条目) 对
+    query_idx = np.repeat(np.arange(len(hashes)), counts)
+    db_idx = np.repeat(left - np.cumsum(counts) + counts, counts) + np.arange(counts.sum())
+    tracks = db_tracks[db_idx].astype(np.int64)
+    deltas = db_offsets[db_idx].astype(np.int64) - offsets[query_idx]
+    return tracks, deltas
+
+
+class FingerprintIndex:
+    """
+    指纹倒排索引
+
+    哈希、录音编号、锚点帧三列以按哈希排序的 NumPy 数组存放，查询用二分查找。
+    新增的录音并入一组较小的有序数组（写入只排序这一部分），查询同时检索两组；
+    累计超过 merge_threshold 个哈希后在后台线程线性合并进主数组。
+    录音的判定（风险等级、诈骗类型、转录）存于 JSON。
+
+    保存时只把上次保存后新增的录音追加为分段文件（<path>.segNNNN.npz），
+    分段数达到 max_segments（或 save(compact=True)）时才重写完整索引。
+    """
+
+    def __init__(
+        self,
+        path: str = "./db/fingerprints",
+        min_matches: int = 20,
+        min_ratio: float = 0.05,
+        merge_threshold: int = 1 << 21,
+        max_segments: int = 32
+    ):
+        """
+        Args:
+            path: 索引路径前缀（<path>.npz、<path>.json 与分段文件）
+            min_matches: 判定命中所需的最少对齐哈希数
+            min_ratio: 对齐哈希数占查询哈希数的最小比例
+            merge_threshold: 新增哈希数超过该值后合并进主数组
+            max_segments: 分段文件数达到该值后重写完整索引
+        """
+        self.path = path
+        self.min_matches = min_matches
+        self.min_ratio = min_ratio
+        self.merge_threshold = merge_threshold
+        self.max_segments = max_segments
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+
+        self._main: Columns = _empty_columns()
+        # 新增录音（有序，较小）；正在后台并入主数组的一批（合并完成前仍参与查询）
+        self._recent: Columns = _empty_columns()
+        self._merging: Optional[Columns] = None
+        self.verdicts: List[Dict] = []
+        # 上次保存后新增的列，以及已保存的录音数
+        self._unsaved: List[Columns] = []
+        self._saved_tracks = 0
+        self._segment_seq = 0
+        self.load()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self.verdicts)
+
+    def _segment_paths(self) -> List[str]:
+        return sorted(glob.glob(glob.escape(self.path) + ".seg*.npz"))
+
+    def load(self) -> None:
+        """从文件加载索引与分段（不存在时为空索引）"""
+        if not (os.path.exists(self.path + ".npz") and os.path.exists(self.path + ".json")):
+            return
+        data = np.load(self.path + ".npz")
+        with open(self.path + ".json", 'r', encoding='utf-8') as f:
+            verdicts = json.load(f)
+        parts = [(data["hashes"], data["tracks"], data["offsets"])]
+
+        segment_paths = self._segment_paths()
+        for segment_path in segment_paths:
+            segment = np.load(segment_path)
+            first_track = int(segment["first_track"])
+            if first_track < len(verdicts):
+                # 重写完整索引后未及删除的分段，内容已包含在主文件中
+                continue
+            if first_track > len(verdicts):
+                logger.warning(f"指纹索引分段不连续，忽略 {segment_path} 及之后的分段")
+                break
+            verdicts.extend(json.loads(str(segment["verdicts"])))
+            parts.append((segment["hashes"], segment["tracks"], segment["offsets"]))
+
+        main = _sort_columns(*(np.concatenate(column) for column in zip(*parts)))
+        with self._lock:
+            self._main, self._recent, self._merging = main, _empty_columns(), None
+            self.verdicts = verdicts
+            self._unsaved, self._saved_tracks = [], len(verdicts)
+            self._segment_seq = len(segment_paths)
+        logger.info(
+            f"音频指纹索引已加载：{len(verdicts)} 段录音，{len(main[0])} 个哈希"
+            f"（分段 {len(segment_paths)} 个）"
+        )
+
+    def _merge_recent(self) -> None:
+        """后台线程：把 _merging 并入主数组（查询在合并期间继续检索旧数组）"""
+        with self._lock:
+            main, merging = self._main, self._merging
+        merged = _merge_sorted(main, merging)
+        with self._lock:
+            self._main, self._merging = merged, None
+
+    def add(self, hashes: np.ndarray, offsets: np.ndarray, verdict: Dict) -> int:
+        """
+        加入一段录音及其判定
+
+        Returns:
+            录音编号
+        """
+        with self._lock:
+            track = len(self.verdicts)
+            self.verdicts.append({
+                "fingerprint_id": verdict.get("fingerprint_id") or uuid.uuid4().hex[:12],
+                "added_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                **verdict
+            })
+            columns = _sort_columns(
+                hashes.astype(np.uint32),
+                np.full(len(hashes), track, dtype=np.int32),
+                offsets.astype(np.int32)
+            )
+            self._recent = _merge_sorted(self._recent, columns)
+            self._unsaved.append(columns)
+            if len(self._recent[0]) >= self.merge_threshold and self._merging is None:
+                self._merging, self._recent = self._recent, _empty_columns()
+                threading.Thread(target=self._merge_recent, name="fingerprint-merge", daemon=True).start()
+        return track
+
+    def match(self, hashes: np.ndarray, offsets: np.ndarray) -> Optional[Dict]:
+        """
+        查询最相似的已知录音
+
+        同一录音的匹配哈希按 (库内帧 - 查询帧) 分组，时间对齐的哈希数最多者胜出，
+        因此截取片段、前后加静音也能命中。
+
+        Returns:
+            命中时为 {"verdict": {...}, "matches": 对齐哈希数, "ratio": 占比, "offset_seconds": ...}，
+            否则为 None
+        """
+        if len(hashes) == 0:
+            return None
+        with self._lock:
+            groups = [c for c in (self._main, self._merging, self._recent) if c is not None and len(c[0])]
+            verdicts = self.verdicts
+        if not groups:
+            return None
+
+        found = [_candidates(columns, hashes, offsets) for columns in groups]
+        tracks = np.concatenate([f[0] for f in found])
+        deltas = np.concatenate([f[1] for f in found])
+        if len(tracks) == 0:
+            return None
+
+        pairs, votes = np.unique(np.stack([tracks, deltas]), axis=1, return_counts=True)
+        best = int(votes.argmax())
+        matches = int(votes[best])
+        ratio = matches / len(hashes)
+        if matches < self.min_matches or ratio < self.min_ratio:
+            return None
+
+        track, delta = int(pairs[0, best]), int(pairs[1, best])
+        return {
+            "verdict": verdicts[track],
+            "matches": matches,
+            "ratio": round(ratio, 3),
+            "offset_seconds": round(delta * FP_HOP / FP_SAMPLE_RATE, 2)
+        }
+
+    def save(self, compact: bool = False) -> None:
+        """
+        保存新增录音
+
+        平时只追加一个分段文件；compact=True、分段数达到上限或主文件不存在时
+        重写完整索引并删除分段。各文件均先写临时文件再替换。
+        """
+        with self._save_lock:
+            with self._lock:
+                full = (compact or self._segment_seq >= self.max_segments
+                        or not os.path.exists(self.path + ".npz"))
+                if not full and not self._unsaved:
+                    return
+                parts, self._unsaved = self._unsaved, []
+                first_track, self._saved_tracks = self._saved_tracks, len(self.verdicts)
+                verdicts = list(self.verdicts)
+                groups = [c for c in (self._main, self._merging, self._recent) if c is not None]
+
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            if full:
+                columns = groups[0]
+                for extra in groups[1:]:
+                    columns = _merge_sorted(columns, extra)
+                with open(self.path + ".tmp.npz", 'wb') as f:
+                    np.savez(f, hashes=columns[0], tracks=columns[1], offsets=columns[2])
+                with open(self.path + ".json.tmp", 'w', encoding='utf-8') as f:
+                    json.dump(verdicts, f, ensure_ascii=False)
+                os.replace(self.path + ".tmp.npz", self.path + ".npz")
+                os.replace(self.path + ".json.tmp", self.path + ".json")
+                for segment_path in self._segment_paths():
+                    os.remove(segment_path)
+                self._segment_seq = 0
+                return
+
+            segment_path = f"{self.path}.seg{self._segment_seq:04d}.npz"
+            with open(segment_path + ".tmp", 'wb') as f:
+                np.savez(
+                    f,
+                    hashes=np.concatenate([p[0] for p in parts]),
+                    tracks=np.concatenate([p[1] for p in parts]),
+                    offsets=np.concatenate([p[2] for p in parts]),
+                    first_track=np.int64(first_track),
+                    verdicts=np.array(json.dumps(verdicts[first_track:], ensure_ascii=False))
+                )
+            os.replace(segment_path + ".tmp", segment_path)
+            self._segment_seq += 1
+
+    def maybe_save(self, every: int = 10) -> None:
+        """累计新增 every 段录音后保存一次"""
+        if len(self.verdicts) - self._saved_tracks >= every:
+            self.save()
+
+
+if __name__ == "__main__":
+    # 测试代码：合成录音，截取并加噪后查询
+    print("\n=== 测试音频指纹 ===\n")
+
+    rng = np.random.default_rng(0)
+    # 300 个随机频率的短音（近似语音的时频结构），约 30 秒
+    bursts = []
+    for _ in range(300):
+        n = int(FP_SAMPLE_RATE * rng.uniform(0.05, 0.15))
+        t = np.arange(n) / FP_SAMPLE_RATE
+        freqs = rng.uniform(200, 3500, size=3)
+        bursts.append(np.sin(2 * np.pi * freqs[:, None] * t).sum(axis=0) * np.hanning(n))
+    original = np.concatenate(bursts).astype(np.float32)
+    other = rng.normal(size=len(original)).astype(np.float32)
+
+    index = FingerprintIndex(path="/tmp/fingerprint_demo")
+    index.add(*fingerprint(original), {"risk_level": "Critical", "scam_type": "公检法"})
+    index.add(*fingerprint(other), {"risk_level": "Safe", "scam_type": "Unknown"})
+
+    clip = 0.5 * original[FP_SAMPLE_RATE * 7:FP_SAMPLE_RATE * 19]
+    clip = clip + rng.normal(scale=0.3, size=len(clip)).astype(np.float32)
+    start = time.perf_counter()
+    result = index.match(*fingerprint(clip))
+    elapsed = (time.perf_counter() - start) * 1000
+    print(f"截取 12s 加噪片段: {result and result['verdict']['scam_type']} "
+          f"matches={result and result['matches']} offset={result and result['offset_seconds']}s "
+          f"({elapsed:.1f}ms)")
+    print(f"无关音频: {index.match(*fingerprint(rng.normal(size=len(clip)).astype(np.float32)))}")
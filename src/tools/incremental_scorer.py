@@ -0,0 +1,174 @@
+"""
+增量风险打分
+实时通话中每到达一个 ASR 分段，只对新分段做信号匹配并更新运行状态
+（关键词计数、施压话术计数、身份声明标记、指数衰减的风险分），
+风险分越过阈值时才触发 LLM Watchdog
+"""
+
+import math
+from collections import Counter
+from typing import Dict, List, Optional, Union
+import logging
+
+from src.tools.risk_signals import SignalVocabulary, load_signal_vocabulary, score_to_risk_level
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class IncrementalRiskScorer:
+    """单通电话的增量风险打分器"""
+
+    def __init__(
+        self,
+        vocabulary: Optional[SignalVocabulary] = None,
+        half_life: float = 60.0,
+        threshold: float = 6.0,
+        rearm_ratio: float = 0.5
+    ):
+        """
+        Args:
+            vocabulary: 诈骗信号词表（为空时从 agents.yaml / cases.csv 加载）
+            half_life: 风险分半衰期（秒；分段没有时间戳时按分段数计）
+            threshold: 触发 Watchdog 的风险分阈值
+            rearm_ratio: 触发后风险分回落到阈值的该比例以下才允许再次触发
+        """
+        self.vocabulary = vocabulary or load_signal_vocabulary()
+        self.half_life = half_life
+        self.threshold = threshold
+        self.rearm_ratio = rearm_ratio
+
+        # 跨分段边界的信号词：保留上一分段末尾（最长信号词长度 - 1）个字符
+        self._tail_size = max((len(t) for t in self.vocabulary.terms), default=1) - 1
+        self._case_index = {
+            keyword: case_type
+            for case_type, keywords in self.vocabulary.case_keywords.items()
+            for keyword in keywords
+        }
+        self.reset()
+
+    def reset(self) -> None:
+        """清空运行状态"""
+        self.keyword_counts: Counter = Counter()
+        self.category_counts: Counter = Counter()
+        self.case_type_counts: Counter = Counter()
+        self.identity_claims: List[str] = []
+        self.score = 0.0
+        self.peak_score = 0.0
+        self.segments = 0
+        self.triggers = 0
+        self._armed = True
+        self._tail = ""
+        self._clock = 0.0
+
+    def _new_hits(self, text: str) -> Counter:
+        """只统计结束位置落在新分段内的命中（避免重复计数跨界信号词）"""
+        window = self._tail + text
+        offset = len(self._tail)
+        hits: Counter = Counter()
+        for term in self.vocabulary.terms:
+            start = window.find(term)
+            while start >= 0:
+                if start + len(term) > offset:
+                    hits[term] += 1
+                start = window.find(term, start + 1)
+        self._tail = window[-self._tail_size:] if self._tail_size > 0 else ""
+        return hits
+
+    def update(self, segment: Union[str, Dict]) -> Dict:
+        """
+        输入一个新分段，更新风险状态
+
+        Args:
+            segment: 分段文本，或 ASR 分段 {"text": ..., "start": ..., "end": ...}
+
+        Returns:
+            {
+                "score": 7.2,            # 衰减后的当前风险分
+                "risk_level": "High",
+                "trigger": True,         # 本次更新是否应触发 Watchdog
+                "new_hits": {"验证码": 1},
+                "identity_claims": ["警官"],
+                "likely_case_type": "公检法"
+            }
+        """
+        if isinstance(segment, dict):
+            text = segment.get("text", "")
+            now = segment.get("end", segment.get("start"))
+        else:
+            text, now = segment, None
+
+        # 指数衰减：有时间戳按秒，否则按分段数
+        now = float(now) if now is not None else self._clock + 1.0
+        elapsed = max(now - self._clock, 0.0)
+        self._clock = now
+        self.score *= math.pow(0.5, elapsed / self.half_life) if self.half_life > 0 else 1.0
+        self.segments += 1
+
+        hits = self._new_hits(text)
+        for term, count in hits.items():
+            category, weight = self.vocabulary.terms[term]
+            # 同一分段内重复出现只加一次分，计数照常累计
+            self.score += weight
+            self.keyword_counts[term] += count
+            self.category_counts[category] += count
+            if category == "identity" and term not in self.identity_claims:
+                self.identity_claims.append(term)
+            if term in self._case_index:
+                self.case_type_counts[self._case_index[term]] += count
+        self.peak_score = max(self.peak_score, self.score)
+
+        trigger = False
+        if self._armed and self.score >= self.threshold:
+            trigger = True
+            self._armed = False
+            self.triggers += 1
+        elif not self._armed and self.score < self.threshold * self.rearm_ratio:
+            self._armed = True
+
+        return {
+            "score": round(self.score, 3),
+            "risk_level": score_to_risk_level(self.score),
+            "trigger": trigger,
+            "new_hits": dict(hits),
+            "identity_claims": list(self.identity_claims),
+            "likely_case_type": self.likely_case_type()
+        }
+
+    def likely_case_type(self) -> Optional[str]:
+        """按 cases.csv 关键词累计命中推断的诈骗类型"""
+        if not self.case_type_counts:
+            return None
+        return self.case_type_counts.most_common(1)[0][0]
+
+    def snapshot(self) -> Dict:
+        """当前完整状态"""
+        return {
+            "score": round(self.score, 3),
+            "peak_score": round(self.peak_score, 3),
+            "risk_level": score_to_risk_level(self.score),
+            "segments": self.segments,
+            "triggers": self.triggers,
+            "keyword_counts": dict(self.keyword_counts),
+            "category_counts": dict(self.category_counts),
+            "identity_claims": list(self.identity_claims),
+            "likely_case_type": self.likely_case_type()
+        }
+
+
+if __name__ == "__main__":
+    # 测试代码
+    print("\n=== 测试增量风险打分 ===\n")
+
+    scorer = IncrementalRiskScorer()
+    segments = [
+        {"text": "喂，您好，请问是李奶奶吗？", "start": 0.0, "end": 3.0},
+        {"text": "我是公安局的王警官。", "start": 3.0, "end": 6.0},
+        {"text": "您的银行卡涉嫌洗钱，必须立", "start": 6.0, "end": 9.0},
+        {"text": "即把钱转到安全账户。", "start": 9.0, "end": 12.0},
+    ]
+    for seg in segments:
+        state = scorer.update(seg)
+        print(f"{seg['text']:<20} score={state['score']:<6} {state['risk_level']:<8} "
+              f"trigger={state['trigger']} hits={state['new_hits']}")
+    print(f"\n最终状态: {scorer.snapshot()}")
@@ -0,0 +1,187 @@
+"""
+知识库版本快照
+每个版本是持久化目录下一个完整的 ChromaDB 目录（v0001、v0002 ...），CURRENT 文件记录当前版本。
+新版本先在 .partial 临时目录中构建，完成后改名，CURRENT 通过原子替换切换，
+读取方在每次检索时获取当前版本，不会看到空的或构建到一半的集合
+
+目录结构：
+    <persist_dir>/CURRENT       当前版本名
+    <persist_dir>/v0001/        ChromaDB 持久化目录
+    <persist_dir>/v0002.partial 构建中的版本（不会被读取）
+
+旧版本布局（chroma.sqlite3 直接位于 persist_dir 下、没有 CURRENT）视为版本 "legacy"
+"""
+
+import os
+import re
+import shutil
+from typing import List, Optional, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+POINTER_NAME = "CURRENT"
+LEGACY_VERSION = "legacy"
+_VERSION_RE = re.compile(r"^v(\d{4,})$")
+
+
+class KBSnapshotError(RuntimeError):
+    """版本不存在或无法切换"""
+
+
+def release_client(client) -> None:
+    """
+    释放 chromadb 按路径缓存的 System（HNSW 索引随之释放）
+
+    只移除该客户端所在路径的缓存，不影响其他版本的客户端；
+    chromadb 版本不提供该缓存时什么也不做，依赖垃圾回收。
+    """
+    cache = getattr(type(client), "_identifier_to_system", None)
+    identifier = getattr(client, "_identifier", None)
+    if isinstance(cache, dict) and identifier in cache:
+        system = cache.pop(identifier)
+        stop = getattr(system, "stop", None)
+        if stop is not None:
+            stop()
+
+
+class KBSnapshot:
+    """
+    一个已打开的知识库版本
+
+    readers 为正在使用该版本的检索数；被替换后标记为 retired，最后一个读取方释放时关闭。
+    """
+
+    def __init__(self, version: Optional[str], client=None, collection=None):
+        self.version = version
+        self.client = client
+        self.collection = collection
+        self.readers = 0
+        self.retired = False
+
+    def count(self) -> int:
+        return self.collection.count() if self.collection is not None else 0
+
+    def close(self) -> None:
+        if self.client is not None:
+            release_client(self.client)
+        self.client = None
+        self.collection = None
+        logger.info(f"🗑️ 知识库版本 {self.version} 已关闭")
+
+
+class KBSnapshots:
+    """持久化目录下的版本管理（目录与 CURRENT 指针，不涉及 ChromaDB）"""
+
+    def __init__(self, root: str):
+        """
+        Args:
+            root: 知识库持久化目录
+        """
+        self.root = root
+        self.pointer_path = os.path.join(root, POINTER_NAME)
+
+    def versions(self) -> List[str]:
+        """已构建完成的版本（按版本号升序）"""
+        if not os.path.isdir(self.root):
+            return []
+        names = [
+            name for name in os.listdir(self.root)
+            if _VERSION_RE.match(name) and os.path.isdir(os.path.join(self.root, name))
+        ]
+        return sorted(names, key=lambda name: int(_VERSION_RE.match(name).group(1)))
+
+    def has_legacy(self) -> bool:
+        return os.path.exists(os.path.join(self.root, "chroma.sqlite3"))
+
+    def current(self) -> Optional[str]:
+        """当前版本；没有 CURRENT 时依次退回旧布局与最新版本，都没有时为 None"""
+        try:
+            with open(self.pointer_path, 'r', encoding='utf-8') as f:
+                version = f.read().strip()
+            if version:
+                return version
+        except FileNotFoundError:
+            pass
+        if self.has_legacy():
+            return LEGACY_VERSION
+        versions = self.versions()
+        return versions[-1] if versions else None
+
+    def pointer_stamp(self) -> Optional[Tuple[int, int]]:
+        """CURRENT 的 (inode, 修改时间)，用于低开销地发现其他进程的切换（每次切换都替换为新文件）"""
+        try:
+            st = os.stat(self.pointer_path)
+        except FileNotFoundError:
+            return None
+        return st.st_ino, st.st_mtime_ns
+
+    def path(self, version: str) -> str:
+        if version == LEGACY_VERSION:
+            return self.root
+        return os.path.join(self.root, version)
+
+    def exists(self, version: str) -> bool:
+        if version == LEGACY_VERSION:
+            return self.has_legacy()
+        return version in self.versions()
+
+    def set_current(self, version: str) -> None:
+        """原子地把 CURRENT 指向 version"""
+        if not self.exists(version):
+            raise KBSnapshotError(f"知识库版本不存在: {version}")
+        tmp = self.pointer_path + ".tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            f.write(version)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.pointer_path)
+
+    def previous(self, version: Optional[str]) -> Optional[str]:
+        """version 之前的一个版本（用于回滚）"""
+        versions = self.versions()
+        if self.has_legacy():
+            versions.insert(0, LEGACY_VERSION)
+        if version not in versions:
+            return versions[-1] if versions else None
+        index = versions.index(version)
+        return versions[index - 1] if index > 0 else None
+
+    def stage(self) -> str:
+        """
+        分配下一个版本号并创建临时构建目录
+
+        Returns:
+            临时目录（<version>.partial），构建完成后调用 publish()
+        """
+        versions = self.versions()
+        number = int(_VERSION_RE.match(versions[-1]).group(1)) + 1 if versions else 1
+        staging = os.path.join(self.root, f"v{number:04d}.partial")
+        shutil.rmtree(staging, ignore_errors=True)
+        os.makedirs(staging)
+        return staging
+
+    def publish(self, staging: str) -> str:
+        """把构建完成的临时目录改名为正式版本，返回版本名"""
+        target = staging[:-len(".partial")]
+        os.replace(staging, target)
+        return os.path.basename(target)
+
+    def prune(self, keep: int, protect: Optional[List[str]] = None) -> List[str]:
+        """
+        删除较旧的版本，保留最新的 keep 个（protect 中的版本始终保留）
+
+        Returns:
+            已删除的版本
+        """
+        protect = set(protect or [])
+        protect.add(self.current())
+        removed = []
+        versions = self.versions()
+        for version in versions[:max(len(versions) - keep, 0)]:
+            if version in protect:
+                continue
+            shutil.rmtree(self.path(version), ignore_errors=True)
+            removed.append(version)
+        return removed
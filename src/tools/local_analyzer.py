@@ -0,0 +1,138 @@
+"""
+本地降级分析
+LLM 不可用时，用信号词表 + RAG 近邻投票给出风险等级与诈骗类型，
+并按诈骗类型套用预先编写的防御建议模板（config/advice_templates.yaml）
+"""
+
+from collections import defaultdict
+from typing import Dict, Optional, Tuple
+import logging
+
+import yaml
+
+from src.tools.risk_signals import SignalVocabulary, load_signal_vocabulary, match_case_type
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+# 关键词命中与近邻相似度在投票中的权重
+KEYWORD_VOTE_WEIGHT = 1.0
+NEIGHBOR_VOTE_WEIGHT = 2.0
+
+
+class LocalAnalyzer:
+    """不依赖 LLM 的风险评估与防御建议生成"""
+
+    def __init__(
+        self,
+        rag_tool=None,
+        vocabulary: Optional[SignalVocabulary] = None,
+        templates_path: str = "./config/advice_templates.yaml",
+        neighbors: int = 5
+    ):
+        """
+        Args:
+            rag_tool: RAGSearchTool（为空时只用关键词投票）
+            vocabulary: 诈骗信号词表（为空时从配置加载）
+            templates_path: 防御建议模板路径
+            neighbors: 近邻投票检索的案例数
+        """
+        self.rag_tool = rag_tool
+        self.vocabulary = vocabulary or load_signal_vocabulary()
+        self.neighbors = neighbors
+        with open(templates_path, 'r', encoding='utf-8') as f:
+            self.templates: Dict[str, Dict] = yaml.safe_load(f)
+
+    def risk_level(self, text: str) -> str:
+        """按信号词加权得分评估风险等级"""
+        return self.vocabulary.risk_level(text)
+
+    def scam_type(self, text: str) -> Tuple[str, float]:
+        """
+        关键词与 RAG 近邻投票识别诈骗类型
+
+        Returns:
+            (诈骗类型, 得票占比)；没有任何依据时为 ("Unknown", 0.0)
+        """
+        votes: Dict[str, float] = defaultdict(float)
+        for case_type, keywords in self.vocabulary.case_keywords.items():
+            hits = sum(1 for k in keywords if k in text)
+            if hits:
+                votes[case_type] += hits * KEYWORD_VOTE_WEIGHT
+
+        if self.rag_tool is not None:
+            try:
+                for case in self.rag_tool.search_similar_cases(text[:500], top_k=self.neighbors):
+                    if case["case_type"] != "Unknown":
+                        votes[case["case_type"]] += NEIGHBOR_VOTE_WEIGHT / (1 + case["distance"])
+            except Exception as e:
+                logger.warning(f"近邻检索失败，仅使用关键词投票: {e}")
+
+        if not votes:
+            return "Unknown", 0.0
+        best = max(votes, key=votes.get)
+        return best, round(votes[best] / sum(votes.values()), 3)
+
+    def _template(self, scam_type: str) -> Dict:
+        name = match_case_type(scam_type, [t for t in self.templates if t != "default"])
+        return self.templates[name or "default"]
+
+    def advice(self, scam_type: str, risk_level: str, victim_info: Dict) -> str:
+        """按模板生成防御建议（格式同 defend_task 输出）"""
+        template = self._template(scam_type)
+        values = {
+            "victim_name": victim_info.get("name", "您"),
+            "victim_tag": victim_info.get("tag", "普通用户"),
+            "scam_type": scam_type,
+            "risk_level": risk_level
+        }
+        questions = "\n".join(
+            f"{i}. {q.format(**values)}" for i, q in enumerate(template["questions"], 1)
+        )
+        if risk_level in ("High", "Critical"):
+            report = "情况危急，如已转账或泄露信息，请立即拨打 110 报警并联系银行冻结账户。"
+        else:
+            report = "暂无需报警，但请保持警惕；如对方继续索要钱款或信息，请拨打 110 或 96110 咨询。"
+
+        return (
+            f"### 🚨 立即行动\n{template['action'].format(**values)}\n\n"
+            f"### 🔍 验证问题\n{questions}\n\n"
+            f"### 📚 防骗科普\n{template['explain'].format(**values)}\n\n"
+            f"### ☎️ 报警建议\n{report}"
+        )
+
+    def analyze(
+        self,
+        text: str,
+        victim_info: Dict,
+        risk_level: Optional[str] = None,
+        scam_type: Optional[str] = None
+    ) -> Dict:
+        """
+        降级分析（已由 LLM 得出的部分结果可直接传入，不再重复评估）
+
+        Returns:
+            {"risk_level": ..., "scam_type": ..., "defense_advice": ...}
+        """
+        if not risk_level or risk_level == "Unknown":
+            risk_level = self.risk_level(text)
+        if not scam_type or scam_type == "Unknown":
+            scam_type, _ = self.scam_type(text)
+        return {
+            "risk_level": risk_level,
+            "scam_type": scam_type,
+            "defense_advice": self.advice(scam_type, risk_level, victim_info)
+        }
+
+
+if __name__ == "__main__":
+    # 测试代码
+    print("\n=== 测试本地降级分析 ===\n")
+
+    analyzer = LocalAnalyzer()
+    text = "我是公安局的王警官，你的账户涉嫌洗钱，必须立即把钱转到安全账户。"
+    result = analyzer.analyze(text, {"name": "李奶奶", "tag": "独居老人"})
+    print(f"风险等级: {result['risk_level']}")
+    print(f"诈骗类型: {result['scam_type']}")
+    print(f"防御建议:\n{result['defense_advice']}")
@@ -3,132 +3,374 @@ RAG 知识检索工具
 基于 ChromaDB 实现诈骗案例的向量化存储与检索
 """
 
-import os
+import shutil
+import threading
+from contextlib import contextmanager
 import pandas as pd
 import chromadb
 from chromadb.config import Settings
-from chromadb.utils import embedding_functions
-from typing import List, Dict, Optional
+from chromadb.api.types import Documents, EmbeddingFunction, Embeddings
+from typing import List, Dict, Iterator, Optional, Tuple
 import logging
 
+from src.serving.batching import MicroBatcher
+from src.tools.kb_snapshots import KBSnapshot, KBSnapshotError, KBSnapshots, release_client
+from src.utils import metrics
+from src.utils.resources import ManagedResource
+from src.utils.tracing import stage
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
+class SentenceTransformerEmbedding(EmbeddingFunction[Documents]):
+    """
+    基于 sentence-transformers 的嵌入函数
+
+    与 chromadb 自带实现不同，这里直接持有模型实例，
+    以便多进程服务模式下把已放入共享内存的模型传给各个 Worker。
+    按名称加载的模型可由 ResourceManager 空闲卸载，外部传入的共享模型不卸载。
+    """
+
+    def __init__(self, model_name: Optional[str] = None, model=None):
+        """
+        Args:
+            model_name: 嵌入模型名称（model 为空时加载）
+            model: 已加载的 SentenceTransformer 实例
+        """
+        if model is None:
+            def _load():
+                from sentence_transformers import SentenceTransformer
+                return SentenceTransformer(model_name)
+            self.resource = ManagedResource("embedder", loader=_load)
+            self.resource.get()
+        else:
+            self.resource = ManagedResource("embedder", instance=model)
+
+    @property
+    def model(self):
+        """SentenceTransformer 模型实例（已卸载时重新加载）"""
+        return self.resource.get()
+
+    def __call__(self, input: Documents) -> Embeddings:
+        with self.resource.lease() as model:
+            return model.encode(
+                list(input),
+                convert_to_numpy=True,
+                normalize_embeddings=False
+            ).tolist()
+
+
 class RAGSearchTool:
-    """基于 ChromaDB 的反诈知识库检索工具"""
+    """
+    基于 ChromaDB 的反诈知识库检索工具
+
+    知识库按版本快照存放（见 kb_snapshots），重建时在新版本目录中构建，完成后原子切换；
+    每次检索开始时取得当前版本并持有引用，被替换的版本在最后一个检索结束后关闭。
+    """
     
     def __init__(
         self,
         persist_dir: str = "./db/chroma",
         embedding_model: str = "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2",
-        collection_name: str = "scam_cases"
+        collection_name: str = "scam_cases",
+        read_only: bool = False,
+        embedder=None,
+        batch_max_delay_ms: float = 0.0,
+        batch_max_size: int = 16,
+        keep_versions: int = 3
     ):
         """
         初始化 ChromaDB 客户端
         
         Args:
-            persist_dir: 数据库持久化目录
+            persist_dir: 数据库持久化目录（其下为各版本快照）
             embedding_model: 嵌入模型名称
             collection_name: 集合名称
+            read_only: 只读模式（推理 Worker 使用，不执行迁移、不允许重建）
+            embedder: 已加载的 SentenceTransformer 实例（为空时按名称加载）
+            batch_max_delay_ms: 并发检索合并窗口（毫秒），0 表示不合并
+            batch_max_size: 单次合并的最大查询数
+            keep_versions: 重建后保留的版本数（供回滚，更早的版本目录被删除）
         """
         self.persist_dir = persist_dir
-        os.makedirs(persist_dir, exist_ok=True)
-        
-        # 初始化 ChromaDB
-        self.client = chromadb.PersistentClient(path=persist_dir)
+        self.read_only = read_only
+        self.collection_name = collection_name
+        self.keep_versions = keep_versions
+        self.snapshots = KBSnapshots(persist_dir)
         
         # 配置嵌入函数（使用 sentence-transformers）
-        self.embedding_function = embedding_functions.SentenceTransformerEmbeddingFunction(
-            model_name=embedding_model
+        self.embedding_function = SentenceTransformerEmbedding(
+            model_name=embedding_model,
+            model=embedder
         )
         
-        # 获取或创建集合
-        self.collection = self.client.get_or_create_collection(
-            name=collection_name,
-            embedding_function=self.embedding_function,
-            metadata={"description": "反诈骗案例知识库"}
+        # 读取引用计数锁；切换锁保证同一时间只有一个线程打开新版本；构建锁保证同一时间只有一次重建
+        self._readers_lock = threading.Lock()
+        self._swap_lock = threading.Lock()
+        self._build_lock = threading.Lock()
+        self._pointer_stamp = None
+        # 已被替换、等待读取方释放的版本
+        self._draining: List[KBSnapshot] = []
+        
+        # 当前版本的 ChromaDB 客户端与集合（HNSW 索引常驻内存，可由 ResourceManager 空闲卸载）
+        self.chroma = ManagedResource("chroma", loader=self._open_current, unloader=KBSnapshot.close)
+        self.chroma.get()
+        
+        # 并发检索的微批合并器
+        self._batcher = None
+        if batch_max_delay_ms > 0:
+            self._batcher = MicroBatcher(
+                self._search_batched,
+                max_batch_size=batch_max_size,
+                max_delay_ms=batch_max_delay_ms,
+                name="rag-query-batcher"
+            )
+        
+        snapshot = self.chroma.get()
+        logger.info(f"RAG 知识库已初始化，版本 {snapshot.version}，当前文档数: {snapshot.count()}")
+    
+    def _open(self, version: Optional[str]) -> KBSnapshot:
+        """打开指定版本（None 表示尚未构建任何版本）"""
+        if version is None:
+            return KBSnapshot(None)
+        path = self.snapshots.path(version)
+        if self.read_only:
+            # 只读模式：不创建目录、不执行数据库迁移，仅校验 schema
+            client = chromadb.PersistentClient(
+                path=path,
+                settings=Settings(
+                    anonymized_telemetry=False,
+                    allow_reset=False,
+                    migrations="validate"
+                )
+            )
+        else:
+            client = chromadb.PersistentClient(path=path)
+        # 集合必须已由构建完成，不在读取路径上创建
+        collection = client.get_collection(
+            name=self.collection_name,
+            embedding_function=self.embedding_function
         )
+        return KBSnapshot(version, client, collection)
+    
+    def _open_current(self) -> KBSnapshot:
+        """打开 CURRENT 指向的版本（ManagedResource 加载函数）"""
+        self._pointer_stamp = self.snapshots.pointer_stamp()
+        return self._open(self.snapshots.current())
+    
+    @property
+    def version(self) -> Optional[str]:
+        """当前使用的版本（已卸载时按 CURRENT 指针）"""
+        snapshot = self.chroma.peek()
+        return snapshot.version if snapshot is not None else self.snapshots.current()
+    
+    @property
+    def client(self):
+        """当前版本的 ChromaDB 客户端（已卸载时重新打开）"""
+        return self.chroma.get().client
+    
+    @property
+    def collection(self):
+        """当前版本的知识库集合（已卸载时重新打开）"""
+        return self.chroma.get().collection
+    
+    def _follow_pointer(self) -> None:
+        """CURRENT 被其他进程或线程修改时切换到其指向的版本（每次检索调用，未变化时只有一次 stat）"""
+        stamp = self.snapshots.pointer_stamp()
+        if stamp == self._pointer_stamp:
+            return
+        with self._swap_lock:
+            if stamp == self._pointer_stamp:
+                return
+            self._pointer_stamp = stamp
+            version = self.snapshots.current()
+            snapshot = self.chroma.peek()
+            if snapshot is None or snapshot.version == version:
+                return
+            self._activate(self._open(version))
+            metrics.KB_SWAPS.inc(action="follow")
+            logger.info(f"🔀 知识库已跟随切换到版本 {version}")
+    
+    def _activate(self, snapshot: KBSnapshot) -> None:
+        """替换当前版本，旧版本在读取方全部释放后关闭"""
+        with self._readers_lock:
+            old = self.chroma.swap(snapshot)
+            drained = False
+            if old is not None:
+                old.retired = True
+                drained = old.readers == 0
+                if not drained:
+                    self._draining.append(old)
+        if drained:
+            old.close()
+    
+    @contextmanager
+    def _reading(self) -> Iterator[KBSnapshot]:
+        """检索期间持有当前版本的引用（切换后仍读取已取得的版本，直到本次检索结束）"""
+        self._follow_pointer()
+        with self.chroma.lease():
+            with self._readers_lock:
+                snapshot = self.chroma.get()
+                snapshot.readers += 1
+            try:
+                yield snapshot
+            finally:
+                with self._readers_lock:
+                    snapshot.readers -= 1
+                    drained = snapshot.retired and snapshot.readers == 0
+                    if drained:
+                        self._draining.remove(snapshot)
+                if drained:
+                    snapshot.close()
+    
+    def swap(self, version: str, action: str = "swap") -> str:
+        """
+        切换到已构建的版本（新版本打开并确认非空后才替换，CURRENT 原子更新）
         
-        logger.info(f"RAG 知识库已初始化，当前文档数: {self.collection.count()}")
+        Returns:
+            切换后的版本
+        """
+        if not self.snapshots.exists(version):
+            raise KBSnapshotError(f"知识库版本不存在: {version}")
+        with self._swap_lock:
+            snapshot = self._open(version)
+            if snapshot.count() == 0:
+                snapshot.close()
+                raise KBSnapshotError(f"知识库版本 {version} 为空，拒绝切换")
+            if not self.read_only:
+                self.snapshots.set_current(version)
+            self._pointer_stamp = self.snapshots.pointer_stamp()
+            self._activate(snapshot)
+        metrics.KB_SWAPS.inc(action=action)
+        logger.info(f"🔀 知识库已切换到版本 {version}（{snapshot.count()} 条记录）")
+        return version
+    
+    def rollback(self) -> str:
+        """回滚到当前版本之前的一个版本"""
+        previous = self.snapshots.previous(self.version)
+        if previous is None:
+            raise KBSnapshotError(f"版本 {self.version} 之前没有可回滚的版本")
+        return self.swap(previous, action="rollback")
+    
+    def kb_status(self) -> Dict:
+        """当前版本、可用版本与各打开版本的读取数"""
+        with self._readers_lock:
+            snapshot = self.chroma.peek()
+            opened = [snapshot] if snapshot is not None else []
+            opened += self._draining
+            return {
+                "current": self.version,
+                "versions": self.snapshots.versions(),
+                "open": [
+                    {"version": s.version, "readers": s.readers, "retired": s.retired}
+                    for s in opened
+                ]
+            }
     
     def build_knowledge_base(
         self,
         cases_csv: str = "./data/cases.csv",
-        mapping_csv: str = "./data/mapping_full.csv"
-    ):
+        mapping_csv: str = "./data/mapping_full.csv",
+        activate: bool = True
+    ) -> str:
         """
-        构建知识库：将案例数据向量化并存入 ChromaDB
+        构建知识库：将案例数据向量化并存入新的版本快照
+        
+        在 <persist_dir>/vNNNN.partial 中构建，完成后改名为正式版本；
+        构建期间检索继续使用当前版本。
         
         Args:
             cases_csv: 案例类型表路径
             mapping_csv: 完整对话映射表路径
+            activate: 构建完成后是否切换到新版本
+            
+        Returns:
+            新版本名
         """
-        logger.info("开始构建知识库...")
-        
-        # 清空现有数据（重建模式）
-        if self.collection.count() > 0:
-            logger.warning("检测到已有数据，将清空后重建...")
-            self.client.delete_collection(self.collection.name)
-            self.collection = self.client.get_or_create_collection(
-                name=self.collection.name,
-                embedding_function=self.embedding_function
-            )
+        if self.read_only:
+            raise RuntimeError("只读模式下不能重建知识库，请在主进程中构建")
         
-        # 读取案例类型表
-        cases_df = pd.read_csv(cases_csv)
-        logger.info(f"加载 {len(cases_df)} 个诈骗类型...")
-        
-        # 读取完整对话数据
-        mapping_df = pd.read_csv(mapping_csv)
-        logger.info(f"加载 {len(mapping_df)} 个对话样本...")
-        
-        documents = []
-        metadatas = []
-        ids = []
-        
-        # 1. 添加案例类型描述
-        for _, row in cases_df.iterrows():
-            doc_id = f"case_{row['id']}"
-            document = f"诈骗类型：{row['type']}\n描述：{row['desc']}\n关键词：{row['keywords']}"
-            
-            documents.append(document)
-            metadatas.append({
-                "source": "cases",
-                "case_id": row['id'],
-                "case_type": row['type'],
-                "keywords": row['keywords']
-            })
-            ids.append(doc_id)
-        
-        # 2. 添加典型对话样本（每种类型选前5个）
-        for case_id in cases_df['id'].unique():
-            samples = mapping_df[mapping_df['case_id'] == case_id].head(5)
-            
-            for idx, row in samples.iterrows():
-                doc_id = f"dialogue_{row['id']}"
-                document = f"案例：{row['case_type']}\n对话内容：\n{row['text']}"
-                
+        with self._build_lock:
+            logger.info("开始构建知识库...")
+            
+            # 读取案例类型表
+            cases_df = pd.read_csv(cases_csv)
+            logger.info(f"加载 {len(cases_df)} 个诈骗类型...")
+            
+            # 读取完整对话数据
+            mapping_df = pd.read_csv(mapping_csv)
+            logger.info(f"加载 {len(mapping_df)} 个对话样本...")
+            
+            documents = []
+            metadatas = []
+            ids = []
+            
+            # 1. 添加案例类型描述
+            for _, row in cases_df.iterrows():
+                doc_id = f"case_{row['id']}"
+                document = f"诈骗类型：{row['type']}\n描述：{row['desc']}\n关键词：{row['keywords']}"
+            
                 documents.append(document)
                 metadatas.append({
-                    "source": "dialogues",
-                    "dialogue_id": row['id'],
-                    "case_type": row['case_type'],
-                    "risk_level": row['risk_level'],
-                    "role_name": row['role_name']
+                    "source": "cases",
+                    "case_id": row['id'],
+                    "case_type": row['type'],
+                    "keywords": row['keywords']
                 })
                 ids.append(doc_id)
-        
-        # 批量添加到 ChromaDB
-        self.collection.add(
-            documents=documents,
-            metadatas=metadatas,
-            ids=ids
-        )
-        
-        logger.info(f"✅ 知识库构建完成，共 {len(documents)} 条记录")
-        logger.info(f"   - 案例类型: {len(cases_df)} 条")
-        logger.info(f"   - 对话样本: {len(documents) - len(cases_df)} 条")
+            
+            # 2. 添加典型对话样本（每种类型选前5个）
+            for case_id in cases_df['id'].unique():
+                samples = mapping_df[mapping_df['case_id'] == case_id].head(5)
+            
+                for idx, row in samples.iterrows():
+                    doc_id = f"dialogue_{row['id']}"
+                    document = f"案例：{row['case_type']}\n对话内容：\n{row['text']}"
+            
+                    documents.append(document)
+                    metadatas.append({
+                        "source": "dialogues",
+                        "dialogue_id": row['id'],
+                        "case_type": row['case_type'],
+                        "risk_level": row['risk_level'],
+                        "role_name": row['role_name']
+                    })
+                    ids.append(doc_id)
+            
+            staging = self.snapshots.stage()
+            try:
+                client = chromadb.PersistentClient(path=staging)
+                collection = client.create_collection(
+                    name=self.collection_name,
+                    embedding_function=self.embedding_function,
+                    metadata={"description": "反诈骗案例知识库"}
+                )
+                # 批量添加到 ChromaDB
+                collection.add(
+                    documents=documents,
+                    metadatas=metadatas,
+                    ids=ids
+                )
+                if collection.count() != len(documents):
+                    raise KBSnapshotError(f"写入记录数不一致: {collection.count()} != {len(documents)}")
+                release_client(client)
+                version = self.snapshots.publish(staging)
+            except BaseException:
+                shutil.rmtree(staging, ignore_errors=True)
+                raise
+            
+            logger.info(f"✅ 知识库版本 {version} 构建完成，共 {len(documents)} 条记录")
+            logger.info(f"   - 案例类型: {len(cases_df)} 条")
+            logger.info(f"   - 对话样本: {len(documents) - len(cases_df)} 条")
+            
+            if activate:
+                previous = self.version
+                self.swap(version, action="build")
+                removed = self.snapshots.prune(self.keep_versions, protect=[previous])
+                if removed:
+                    logger.info(f"🗑️ 已删除旧版本目录: {removed}")
+            return version
     
     def search_similar_cases(
         self,
@@ -153,30 +395,70 @@ class RAGSearchTool:
                 ...
             ]
         """
-        if self.collection.count() == 0:
-            logger.warning("知识库为空，请先调用 build_knowledge_base()")
+        with stage("rag_query"):
+            if self._batcher is not None:
+                # 与其他线程的并发检索合并为一次批量向量计算
+                return self._batcher((query_text, top_k))
+            
+            return self.search_similar_cases_batch([query_text], top_k=top_k)[0]
+    
+    def search_similar_cases_batch(
+        self,
+        query_texts: List[str],
+        top_k: int = 3
+    ) -> List[List[Dict]]:
+        """
+        批量检索：多条查询的向量在一次前向计算中完成
+        
+        Args:
+            query_texts: 查询文本列表
+            top_k: 每条查询返回前 K 个最相似结果
+            
+        Returns:
+            与 query_texts 顺序一致的结果列表，每项格式同 search_similar_cases
+        """
+        if not query_texts:
             return []
         
-        results = self.collection.query(
-            query_texts=[query_text],
-            n_results=top_k
-        )
+        with self._reading() as snapshot:
+            if snapshot.count() == 0:
+                logger.warning("知识库为空，请先调用 build_knowledge_base()")
+                return [[] for _ in query_texts]
+            
+            results = snapshot.collection.query(
+                query_texts=list(query_texts),
+                n_results=top_k
+            )
         
         # 格式化结果
-        formatted_results = []
-        
-        if results['ids'] and len(results['ids'][0]) > 0:
-            for i in range(len(results['ids'][0])):
-                formatted_results.append({
-                    "id": results['ids'][0][i],
-                    "case_type": results['metadatas'][0][i].get('case_type', 'Unknown'),
-                    "document": results['documents'][0][i],
-                    "distance": results['distances'][0][i] if 'distances' in results else 0,
-                    "metadata": results['metadatas'][0][i]
-                })
+        batch_results = []
+        
+        for q in range(len(query_texts)):
+            formatted_results = []
+            if results['ids'] and len(results['ids'][q]) > 0:
+                for i in range(len(results['ids'][q])):
+                    formatted_results.append({
+                        "id": results['ids'][q][i],
+                        "case_type": results['metadatas'][q][i].get('case_type', 'Unknown'),
+                        "document": results['documents'][q][i],
+                        "distance": results['distances'][q][i] if 'distances' in results else 0,
+                        "metadata": results['metadatas'][q][i]
+                    })
+            batch_results.append(formatted_results)
         
-        logger.info(f"检索到 {len(formatted_results)} 个相似案例")
-        return formatted_results
+        logger.info(
+            f"检索到 {sum(len(r) for r in batch_results)} 个相似案例 "
+            f"({len(query_texts)} 条查询)"
+        )
+        return batch_results
+    
+    def _search_batched(self, items: List[Tuple[str, int]]) -> List[List[Dict]]:
+        """MicroBatcher 回调：按最大 top_k 统一检索后再截断"""
+        max_k = max(top_k for _, top_k in items)
+        results = self.search_similar_cases_batch(
+            [query for query, _ in items], top_k=max_k
+        )
+        return [r[:top_k] for r, (_, top_k) in zip(results, items)]
     
     def get_case_info(self, case_id: str) -> Optional[Dict]:
         """
@@ -188,9 +470,12 @@ class RAGSearchTool:
         Returns:
             案例详细信息字典
         """
-        results = self.collection.get(
-            ids=[f"case_{case_id}"]
-        )
+        with self._reading() as snapshot:
+            if snapshot.collection is None:
+                return None
+            results = snapshot.collection.get(
+                ids=[f"case_{case_id}"]
+            )
         
         if results['ids']:
             return {
@@ -198,6 +483,11 @@ class RAGSearchTool:
                 "metadata": results['metadatas'][0]
             }
         return None
+    
+    @property
+    def embedder(self):
+        """底层 SentenceTransformer 模型实例"""
+        return self.embedding_function.model
 
 
 # CrewAI 工具包装器
@@ -0,0 +1,374 @@
+"""
+轻量风险等级模型
+字符 n-gram 哈希特征 + 多分类逻辑回归，权重以 NumPy 数组保存（.npz），CPU 上单条预测远低于 1ms。
+用于在调用 LLM 之前识别明显正常的通话（预过滤），概率经温度缩放按 Watchdog 的历史判定校准
+
+训练：python main.py train-risk-model（mapping_full.csv 的 risk_level 标注）
+校准：python main.py calibrate-risk-model（判定库中 Watchdog 给出的风险等级）
+"""
+
+import json
+import os
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+RISK_LEVELS = ("Safe", "Medium", "High", "Critical")
+
+# 按 n-gram 长度区分哈希空间的盐值与多项式哈希的乘数
+_NGRAM_SALT = 0x9E3779B97F4A7C15
+_HASH_MULT = np.uint64(1000003)
+
+
+def ngram_ids(
+    text: str,
+    n_features: int,
+    ngram_range: Tuple[int, int] = (1, 3),
+    max_chars: int = 2000
+) -> np.ndarray:
+    """
+    字符 n-gram 的哈希桶编号（向量化计算，不逐个构造子串）
+
+    去除空白后按 Unicode 码点做多项式哈希，再经 splitmix64 混合取模。
+
+    Returns:
+        int64 数组，每个 n-gram 一个桶编号（可重复）
+    """
+    text = "".join(text.lower().split())[:max_chars]
+    codes = np.frombuffer(text.encode("utf-32-le"), dtype=np.uint32).astype(np.uint64)
+    parts = []
+    for n in range(ngram_range[0], ngram_range[1] + 1):
+        count = len(codes) - n + 1
+        if count <= 0:
+            break
+        h = np.full(count, (_NGRAM_SALT * n) & 0xFFFFFFFFFFFFFFFF, dtype=np.uint64)
+        for j in range(n):
+            h = (h * _HASH_MULT) ^ codes[j:j + count]
+        parts.append(h)
+    if not parts:
+        return np.zeros(0, dtype=np.int64)
+    h = np.concatenate(parts)
+    h ^= h >> np.uint64(30)
+    h *= np.uint64(0xBF58476D1CE4E5B9)
+    h ^= h >> np.uint64(27)
+    h *= np.uint64(0x94D049BB133111EB)
+    h ^= h >> np.uint64(31)
+    return (h % np.uint64(n_features)).astype(np.int64)
+
+
+def _softmax(logits: np.ndarray) -> np.ndarray:
+    z = logits - logits.max(axis=-1, keepdims=True)
+    e = np.exp(z)
+    return e / e.sum(axis=-1, keepdims=True)
+
+
+class RiskModel:
+    """
+    已训练的风险等级模型
+
+    特征为 n-gram 桶的 L1 归一化计数，logits = 平均(W[桶]) + b，再除以校准温度。
+    safe_threshold 为预过滤阈值：P(Safe) 不低于该值时可跳过 LLM（未校准时为 None）。
+    """
+
+    def __init__(
+        self,
+        weights: np.ndarray,
+        bias: np.ndarray,
+        n_features: int,
+        ngram_range: Tuple[int, int] = (1, 3),
+        max_chars: int = 2000,
+        temperature: float = 1.0,
+        safe_threshold: Optional[float] = None,
+        info: Optional[Dict] = None
+    ):
+        self.weights = weights.astype(np.float32, copy=False)
+        self.bias = bias.astype(np.float32, copy=False)
+        self.n_features = n_features
+        self.ngram_range = tuple(ngram_range)
+        self.max_chars = max_chars
+        self.temperature = temperature
+        self.safe_threshold = safe_threshold
+        self.info = info or {}
+
+    def logits(self, text: str) -> np.ndarray:
+        ids = ngram_ids(text, self.n_features, self.ngram_range, self.max_chars)
+        if len(ids) == 0:
+            return self.bias.astype(np.float64)
+        return self.weights[ids].mean(axis=0, dtype=np.float64) + self.bias
+
+    def predict_proba(self, text: str) -> np.ndarray:
+        """各风险等级的概率（顺序同 RISK_LEVELS）"""
+        return _softmax(self.logits(text) / self.temperature)
+
+    def predict(self, text: str) -> Dict:
+        """
+        Returns:
+            {"risk_level": ..., "confidence": 最大概率, "safe_probability": P(Safe)}
+        """
+        proba = self.predict_proba(text)
+        best = int(proba.argmax())
+        return {
+            "risk_level": RISK_LEVELS[best],
+            "confidence": round(float(proba[best]), 4),
+            "safe_probability": round(float(proba[0]), 4)
+        }
+
+    def is_safe(self, prediction: Dict) -> bool:
+        """是否可作为正常通话直接放行（未校准时始终为 False）"""
+        return self.safe_threshold is not None and prediction["safe_probability"] >= self.safe_threshold
+
+    def save(self, path: str) -> None:
+        """写入 .npz（先写临时文件再替换，运行中的进程不会读到写了一半的文件）"""
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp = path + ".tmp"
+        with open(tmp, 'wb') as f:
+            np.savez_compressed(
+                f,
+                weights=self.weights,
+                bias=self.bias,
+                classes=np.array(RISK_LEVELS),
+                n_features=np.int64(self.n_features),
+                ngram_range=np.array(self.ngram_range, dtype=np.int64),
+                max_chars=np.int64(self.max_chars),
+                temperature=np.float64(self.temperature),
+                safe_threshold=np.float64(np.nan if self.safe_threshold is None else self.safe_threshold),
+                info=np.array(json.dumps(self.info, ensure_ascii=False))
+            )
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str) -> "RiskModel":
+        with np.load(path, allow_pickle=False) as data:
+            if tuple(data["classes"].tolist()) != RISK_LEVELS:
+                raise ValueError(f"风险模型类别不符: {data['classes'].tolist()}")
+            threshold = float(data["safe_threshold"])
+            return cls(
+                weights=data["weights"],
+                bias=data["bias"],
+                n_features=int(data["n_features"]),
+                ngram_range=tuple(int(n) for n in data["ngram_range"]),
+                max_chars=int(data["max_chars"]),
+                temperature=float(data["temperature"]),
+                safe_threshold=None if np.isnan(threshold) else threshold,
+                info=json.loads(str(data["info"]))
+            )
+
+
+def _design(
+    texts: Sequence[str],
+    n_features: int,
+    ngram_range: Tuple[int, int],
+    max_chars: int
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    稀疏特征矩阵（按行拼接的桶编号）
+
+    Returns:
+        (桶编号, 每个编号所属的行, 每行的编号数)
+    """
+    rows = [ngram_ids(t, n_features, ngram_range, max_chars) for t in texts]
+    lengths = np.array([max(len(r), 1) for r in rows], dtype=np.float64)
+    ids = np.concatenate(rows) if rows else np.zeros(0, dtype=np.int64)
+    owner = np.repeat(np.arange(len(rows)), [len(r) for r in rows])
+    return ids, owner, lengths
+
+
+def _forward(weights, bias, ids, owner, lengths, n_rows: int) -> np.ndarray:
+    sums = np.zeros((n_rows, weights.shape[1]))
+    np.add.at(sums, owner, weights[ids])
+    return sums / lengths[:, None] + bias
+
+
+def train_logistic(
+    texts: Sequence[str],
+    labels: Sequence[str],
+    n_features: int = 2 ** 18,
+    ngram_range: Tuple[int, int] = (1, 3),
+    max_chars: int = 2000,
+    epochs: int = 300,
+    learning_rate: float = 0.5,
+    l2: float = 1e-5
+) -> RiskModel:
+    """
+    训练多分类逻辑回归（全批量 Adam，类别按频率反比加权）
+
+    Args:
+        texts: 对话文本
+        labels: 风险等级（RISK_LEVELS 之一）
+        n_features: 哈希桶数
+        l2: 权重 L2 正则系数
+    """
+    y = np.array([RISK_LEVELS.index(label) for label in labels])
+    n_rows, n_classes = len(texts), len(RISK_LEVELS)
+    ids, owner, lengths = _design(texts, n_features, ngram_range, max_chars)
+    targets = np.eye(n_classes)[y]
+    # 类别平衡：每类样本权重之和相同（缺失的类别不参与）
+    counts = np.bincount(y, minlength=n_classes).astype(np.float64)
+    class_weight = np.where(counts > 0, n_rows / (np.count_nonzero(counts) * np.maximum(counts, 1)), 0.0)
+    sample_weight = class_weight[y] / n_rows
+
+    weights = np.zeros((n_features, n_classes))
+    bias = np.log(np.maximum(counts, 1) / n_rows)
+    params = [weights, bias]
+    moments = [(np.zeros_like(p), np.zeros_like(p)) for p in params]
+    beta1, beta2, eps = 0.9, 0.999, 1e-8
+
+    for step in range(1, epochs + 1):
+        proba = _softmax(_forward(weights, bias, ids, owner, lengths, n_rows))
+        error = (proba - targets) * sample_weight[:, None]
+        per_id = error[owner] / lengths[owner][:, None]
+        grad_w = np.stack(
+            [np.bincount(ids, weights=per_id[:, k], minlength=n_features) for k in range(n_classes)],
+            axis=1
+        ) + l2 * weights
+        grad_b = error.sum(axis=0)
+        for param, grad, (m, v) in zip(params, (grad_w, grad_b), moments):
+            m *= beta1
+            m += (1 - beta1) * grad
+            v *= beta2
+            v += (1 - beta2) * grad * grad
+            param -= learning_rate * (m / (1 - beta1 ** step)) / (np.sqrt(v / (1 - beta2 ** step)) + eps)
+
+    return RiskModel(
+        weights.astype(np.float32), bias.astype(np.float32), n_features, ngram_range, max_chars,
+        info={
+            "trained_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "samples": n_rows,
+            "class_counts": dict(zip(RISK_LEVELS, counts.astype(int).tolist()))
+        }
+    )
+
+
+def evaluate(model: RiskModel, texts: Sequence[str], labels: Sequence[str]) -> Dict:
+    """准确率、宏平均 F1 与混淆矩阵（行：真实，列：预测）"""
+    y = np.array([RISK_LEVELS.index(label) for label in labels])
+    pred = np.array([RISK_LEVELS.index(model.predict(t)["risk_level"]) for t in texts])
+    n = len(RISK_LEVELS)
+    confusion = np.zeros((n, n), dtype=int)
+    np.add.at(confusion, (y, pred), 1)
+    f1 = []
+    for k in range(n):
+        tp = confusion[k, k]
+        support, predicted = confusion[k].sum(), confusion[:, k].sum()
+        if support == 0:
+            continue
+        precision = tp / predicted if predicted else 0.0
+        recall = tp / support
+        f1.append(2 * precision * recall / (precision + recall) if precision + recall else 0.0)
+    return {
+        "samples": len(y),
+        "accuracy": round(float((pred == y).mean()), 4) if len(y) else 0.0,
+        "macro_f1": round(float(np.mean(f1)), 4) if f1 else 0.0,
+        "confusion": {RISK_LEVELS[i]: dict(zip(RISK_LEVELS, confusion[i].tolist())) for i in range(n)}
+    }
+
+
+def fit_temperature(logits: np.ndarray, y: np.ndarray) -> float:
+    """温度缩放：在对数网格上选使负对数似然最小的温度"""
+    best_t, best_nll = 1.0, np.inf
+    for t in np.exp(np.linspace(np.log(0.05), np.log(20), 200)):
+        proba = _softmax(logits / t)
+        nll = -np.log(np.maximum(proba[np.arange(len(y)), y], 1e-12)).mean()
+        if nll < best_nll:
+            best_t, best_nll = float(t), nll
+    return best_t
+
+
+def safe_threshold(
+    safe_proba: np.ndarray,
+    is_safe: np.ndarray,
+    min_precision: float = 0.98,
+    min_support: int = 20
+) -> Optional[float]:
+    """
+    预过滤阈值：P(Safe) 不低于阈值的样本中，LLM 判为 Safe 的比例不低于 min_precision
+
+    在满足条件的阈值中取最小值（放行最多），样本数不足 min_support 时返回 None（不启用）。
+    """
+    order = np.argsort(-safe_proba, kind="stable")
+    ranked = safe_proba[order]
+    precision = np.cumsum(is_safe[order]) / np.arange(1, len(order) + 1)
+    # 同一概率值的样本只能同时放行，只在每组相同取值的末尾取候选
+    boundary = np.append(ranked[1:] != ranked[:-1], True)
+    valid = np.nonzero(boundary & (precision >= min_precision) & (np.arange(1, len(order) + 1) >= min_support))[0]
+    if len(valid) == 0:
+        return None
+    return float(ranked[valid[-1]])
+
+
+def calibrate(
+    model: RiskModel,
+    texts: Sequence[str],
+    llm_labels: Sequence[str],
+    min_precision: float = 0.98,
+    min_support: int = 20
+) -> Dict:
+    """
+    按 Watchdog 判定校准模型：拟合温度并确定 Safe 预过滤阈值（原地修改 model）
+
+    Returns:
+        校准报告（与 LLM 的一致率、温度、阈值与放行比例）
+    """
+    y = np.array([RISK_LEVELS.index(label) for label in llm_labels])
+    logits = np.stack([model.logits(t) for t in texts])
+    model.temperature = fit_temperature(logits, y)
+    proba = _softmax(logits / model.temperature)
+    model.safe_threshold = safe_threshold(proba[:, 0], y == 0, min_precision, min_support)
+    admitted = proba[:, 0] >= model.safe_threshold if model.safe_threshold is not None else np.zeros(len(y), bool)
+    report = {
+        "samples": len(y),
+        "agreement": round(float((proba.argmax(axis=1) == y).mean()), 4),
+        "temperature": round(model.temperature, 4),
+        "safe_threshold": model.safe_threshold,
+        "prefilter_rate": round(float(admitted.mean()), 4),
+        "prefilter_precision": round(float((y[admitted] == 0).mean()), 4) if admitted.any() else None,
+        "calibrated_at": time.strftime("%Y-%m-%dT%H:%M:%S")
+    }
+    model.info["calibration"] = report
+    return report
+
+
+def load_labeled_csv(paths: List[str], text_column: str = "text", label_column: str = "risk_level") -> Tuple[List[str], List[str]]:
+    """读取带风险等级标注的 CSV（标注不在 RISK_LEVELS 中的行跳过）"""
+    import pandas as pd
+
+    texts, labels = [], []
+    for path in paths:
+        df = pd.read_csv(path)
+        for text, label in zip(df[text_column], df[label_column]):
+            label = str(label).strip().capitalize()
+            if isinstance(text, str) and text.strip() and label in RISK_LEVELS:
+                texts.append(text)
+                labels.append(label)
+    return texts, labels
+
+
+if __name__ == "__main__":
+    # 测试代码：合成数据上训练并测量单条预测耗时
+    print("\n=== 测试轻量风险模型 ===\n")
+
+    rng = np.random.default_rng(0)
+    phrases = {
+        "Safe": ["明天一起吃饭吧", "快递放门口了", "周末去爬山", "妈妈身体很好"],
+        "Medium": ["有个理财产品收益不错", "加个微信了解一下", "中奖了需要确认信息"],
+        "High": ["你的快递丢失需要理赔", "先交保证金再退款", "屏幕共享一下操作"],
+        "Critical": ["你涉嫌洗钱马上转到安全账户", "我是公安局的不要告诉家人", "立即转账否则冻结"]
+    }
+    texts, labels = [], []
+    for label, items in phrases.items():
+        for _ in range(50):
+            texts.append("，".join(rng.choice(items, size=3)) + "。喂你好")
+            labels.append(label)
+    model = train_logistic(texts, labels, n_features=2 ** 16, epochs=100)
+    print(f"训练集: {evaluate(model, texts, labels)['accuracy']}")
+
+    sample = "喂，我是公安局的，你涉嫌洗钱，马上把钱转到安全账户，不要告诉家人。" * 10
+    start = time.perf_counter()
+    for _ in range(1000):
+        prediction = model.predict(sample)
+    print(f"预测: {prediction}，单条耗时 {(time.perf_counter() - start):.3f}ms（{len(sample)} 字）")
@@ -0,0 +1,158 @@
+"""
+诈骗信号词表
+从 config/agents.yaml 中 Watchdog 列出的信号与 cases.csv 的关键词构建本地规则词表，
+供转录压缩、本地风险打分等无需 LLM 的环节使用
+"""
+
+import csv
+import os
+import re
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+import logging
+
+import yaml
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+# agents.yaml 中 Watchdog 背景描述的信号类别
+CATEGORY_LABELS = {
+    "高危关键词": "keyword",
+    "情绪施压": "pressure",
+    "身份伪装": "identity",
+    "时间压力": "urgency"
+}
+
+# 各类别信号的权重
+CATEGORY_WEIGHTS = {
+    "keyword": 3.0,
+    "pressure": 2.0,
+    "identity": 2.0,
+    "urgency": 1.0,
+    "case_keyword": 2.0
+}
+
+# 信号得分 -> 风险等级（得分下限，从高到低匹配）
+RISK_THRESHOLDS = [(10.0, "Critical"), (4.0, "High"), (0.1, "Medium")]
+
+_LINE_PATTERN = re.compile(r"^\s*-\s*(\S+?)[：:](.+)$")
+_TERM_SPLIT = re.compile(r"[、/，,；;|\s]+")
+
+
+class SignalVocabulary:
+    """诈骗信号词表：词 -> (类别, 权重)，以及诈骗类型 -> 关键词"""
+
+    def __init__(
+        self,
+        terms: Dict[str, Tuple[str, float]],
+        case_keywords: Optional[Dict[str, List[str]]] = None
+    ):
+        self.terms = terms
+        self.case_keywords = case_keywords or {}
+
+    def match(self, text: str) -> List[Tuple[str, str, int]]:
+        """返回文本中命中的信号 [(词, 类别, 次数), ...]"""
+        hits = []
+        for term, (category, _) in self.terms.items():
+            count = text.count(term)
+            if count:
+                hits.append((term, category, count))
+        return hits
+
+    def score(self, text: str) -> float:
+        """文本的信号加权得分（同一词多次出现只计一次）"""
+        return sum(self.terms[term][1] for term, _, _ in self.match(text))
+
+    def risk_level(self, text: str) -> str:
+        """按信号得分给出风险等级（Safe/Medium/High/Critical）"""
+        return score_to_risk_level(self.score(text))
+
+    def __len__(self) -> int:
+        return len(self.terms)
+
+
+def match_case_type(scam_type: str, known_types) -> Optional[str]:
+    """
+    把智能体输出的诈骗类型匹配到已知类型（如 '冒充公检法诈骗' -> '公检法'）
+
+    先精确匹配，再按名称长度从长到短做包含匹配；匹配不到时返回 None。
+    """
+    known = [t for t in known_types if t]
+    if scam_type in known:
+        return scam_type
+    for name in sorted(known, key=len, reverse=True):
+        if name in scam_type or (scam_type and scam_type in name):
+            return name
+    return None
+
+
+def score_to_risk_level(score: float) -> str:
+    """信号得分对应的风险等级"""
+    for threshold, level in RISK_THRESHOLDS:
+        if score >= threshold:
+            return level
+    return "Safe"
+
+
+def _parse_agent_signals(agents_yaml: str) -> Dict[str, Tuple[str, float]]:
+    """解析 Watchdog backstory 中形如 '- 高危关键词：验证码、安全账户' 的信号行"""
+    with open(agents_yaml, 'r', encoding='utf-8') as f:
+        backstory = yaml.safe_load(f)['watchdog']['backstory']
+
+    terms: Dict[str, Tuple[str, float]] = {}
+    for line in backstory.splitlines():
+        match = _LINE_PATTERN.match(line)
+        if not match or match.group(1) not in CATEGORY_LABELS:
+            continue
+        category = CATEGORY_LABELS[match.group(1)]
+        for term in _TERM_SPLIT.split(match.group(2)):
+            # '我是XX警官' -> '警官'
+            term = term.replace("我是", "").replace("XX", "").strip()
+            if term:
+                terms[term] = (category, CATEGORY_WEIGHTS[category])
+    return terms
+
+
+def _parse_case_keywords(cases_csv: str) -> Dict[str, List[str]]:
+    """读取 cases.csv 的 type / keywords 列"""
+    case_keywords: Dict[str, List[str]] = {}
+    with open(cases_csv, 'r', encoding='utf-8-sig', newline='') as f:
+        for row in csv.DictReader(f):
+            case_type = (row.get('type') or '').strip()
+            keywords = [k for k in _TERM_SPLIT.split(row.get('keywords') or '') if k]
+            if case_type and keywords:
+                case_keywords[case_type] = keywords
+    return case_keywords
+
+
+@lru_cache(maxsize=4)
+def load_signal_vocabulary(
+    agents_yaml: str = "./config/agents.yaml",
+    cases_csv: str = "./data/cases.csv"
+) -> SignalVocabulary:
+    """
+    构建诈骗信号词表（进程内缓存）
+
+    Args:
+        agents_yaml: Agent 配置文件路径
+        cases_csv: 案例类型表路径（不存在时仅使用 Agent 配置中的信号）
+
+    Returns:
+        SignalVocabulary
+    """
+    terms = _parse_agent_signals(agents_yaml)
+
+    case_keywords: Dict[str, List[str]] = {}
+    if os.path.exists(cases_csv):
+        case_keywords = _parse_case_keywords(cases_csv)
+        for keywords in case_keywords.values():
+            for keyword in keywords:
+                # Watchdog 信号的类别优先
+                terms.setdefault(keyword, ("case_keyword", CATEGORY_WEIGHTS["case_keyword"]))
+    else:
+        logger.warning(f"未找到 {cases_csv}，信号词表仅包含 Agent 配置中的信号")
+
+    logger.info(f"诈骗信号词表已加载，共 {len(terms)} 个信号词")
+    return SignalVocabulary(terms, case_keywords)
@@ -0,0 +1,203 @@
+"""
+受害者角色注册表
+一次加载 roles.csv，按 id 建立字典索引，文件变更时自动热加载
+"""
+
+import csv
+import json
+import os
+import threading
+import time
+from typing import Dict, List, Optional
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+# 未找到角色时使用的默认信息
+DEFAULT_VICTIM_INFO = {
+    'name': '用户',
+    'age': '未知',
+    'tag': '普通用户',
+    'weakness': '无特殊信息'
+}
+
+
+class RoleRecord:
+    """单个角色画像（使用 __slots__ 降低几十万条记录时的内存占用）"""
+
+    __slots__ = ('id', 'name', 'age', 'tag', 'weakness', 'extra')
+
+    def __init__(
+        self,
+        id: str,
+        name: str,
+        age,
+        tag: str,
+        weakness: str,
+        extra: Optional[Dict] = None
+    ):
+        self.id = id
+        self.name = name
+        self.age = age
+        self.tag = tag
+        self.weakness = weakness
+        # roles.csv 中的其他列（仅在存在时保存）
+        self.extra = extra
+
+    def to_victim_info(self) -> Dict:
+        """转换为 Guardian 任务使用的受害者信息字典"""
+        return {
+            'name': self.name,
+            'age': self.age,
+            'tag': self.tag,
+            'weakness': self.weakness
+        }
+
+    def to_dict(self) -> Dict:
+        """转换为 /roles 接口返回的完整记录"""
+        record = {
+            'id': self.id,
+            'name': self.name,
+            'age': self.age,
+            'tag': self.tag,
+            'weakness': self.weakness
+        }
+        if self.extra:
+            record.update(self.extra)
+        return record
+
+
+_CORE_FIELDS = set(RoleRecord.__slots__)
+
+
+def _parse_age(value: str):
+    """年龄列尽量转为整数，保持与原 pandas 读取结果一致"""
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return value
+
+
+class RoleRegistry:
+    """按 id 索引的角色注册表，O(1) 查询，mtime 变化时热加载"""
+
+    def __init__(
+        self,
+        roles_csv: str = "./data/roles.csv",
+        check_interval: float = 2.0
+    ):
+        """
+        初始化角色注册表
+
+        Args:
+            roles_csv: 角色画像表路径
+            check_interval: 检查文件 mtime 的最小间隔（秒），避免每次查询都 stat
+        """
+        self.roles_csv = roles_csv
+        self.check_interval = check_interval
+
+        self._lock = threading.Lock()
+        self._records: Dict[str, RoleRecord] = {}
+        self._mtime: Optional[float] = None
+        self._last_check = 0.0
+        self._json_body: Optional[bytes] = None
+
+        self.reload()
+
+    def reload(self) -> None:
+        """从磁盘重新加载角色表，并重建缓存的 JSON 响应体"""
+        with self._lock:
+            mtime = os.path.getmtime(self.roles_csv)
+            records: Dict[str, RoleRecord] = {}
+
+            with open(self.roles_csv, 'r', encoding='utf-8-sig', newline='') as f:
+                for row in csv.DictReader(f):
+                    role_id = (row.get('id') or '').strip()
+                    if not role_id:
+                        continue
+                    extra = {
+                        k: v for k, v in row.items()
+                        if k not in _CORE_FIELDS and k is not None
+                    }
+                    records[role_id] = RoleRecord(
+                        id=role_id,
+                        name=row.get('name', ''),
+                        age=_parse_age(row.get('age')),
+                        tag=row.get('tag', ''),
+                        weakness=row.get('weakness', ''),
+                        extra=extra or None
+                    )
+
+            body = json.dumps(
+                {"success": True, "data": [r.to_dict() for r in records.values()]},
+                ensure_ascii=False
+            ).encode('utf-8')
+
+            # 整体替换引用，读取方无需加锁
+            self._records = records
+            self._json_body = body
+            self._mtime = mtime
+
+        logger.info(f"角色注册表已加载，共 {len(records)} 个角色")
+
+    def _maybe_reload(self) -> None:
+        """按间隔检查文件 mtime，变化时热加载"""
+        now = time.monotonic()
+        if now - self._last_check < self.check_interval:
+            return
+        self._last_check = now
+
+        try:
+            mtime = os.path.getmtime(self.roles_csv)
+        except OSError:
+            # 文件暂时不可用（如正在被替换），继续使用旧数据
+            return
+
+        if mtime != self._mtime:
+            logger.info("检测到角色表变更，重新加载...")
+            try:
+                self.reload()
+            except Exception as e:
+                logger.error(f"角色表热加载失败，继续使用旧数据: {e}")
+
+    def get(self, role_id: str) -> Optional[RoleRecord]:
+        """按 id 查询角色，不存在时返回 None"""
+        self._maybe_reload()
+        return self._records.get(role_id)
+
+    def get_victim_info(self, role_id: str) -> Dict:
+        """按 id 获取受害者信息，不存在时返回默认信息"""
+        record = self.get(role_id)
+        if record is None:
+            logger.warning(f"未找到角色 {role_id}，使用默认信息")
+            return dict(DEFAULT_VICTIM_INFO)
+        return record.to_victim_info()
+
+    def all(self) -> List[RoleRecord]:
+        """返回全部角色"""
+        self._maybe_reload()
+        return list(self._records.values())
+
+    def json_body(self) -> bytes:
+        """返回预先序列化好的 /roles 响应体"""
+        self._maybe_reload()
+        return self._json_body
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def __contains__(self, role_id: str) -> bool:
+        return role_id in self._records
+
+
+if __name__ == "__main__":
+    # 测试代码
+    print("\n=== 测试角色注册表 ===\n")
+
+    registry = RoleRegistry("../data/roles.csv")
+    print(f"角色数量: {len(registry)}")
+    print(f"R01: {registry.get_victim_info('R01')}")
+    print(f"R99: {registry.get_victim_info('R99')}")
+    print(f"JSON 响应体大小: {len(registry.json_body())} 字节")
@@ -0,0 +1,191 @@
+"""
+转录文本压缩
+在构建 Prompt 之前按风险信号筛选片段，保留命中片段及其上下文，
+去除重复的寒暄/语气词，并把文本控制在每个任务的 token 预算之内
+"""
+
+import re
+from typing import Dict, List, Optional
+import logging
+
+from src.tools.risk_signals import SignalVocabulary, load_signal_vocabulary
+from src.utils.tokens import count_tokens, truncate_to_tokens
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+# 常见无信息量的语气词/寒暄（整句只包含这些内容时视为填充语）
+FILLER_WORDS = {
+    "嗯", "啊", "哦", "喂", "呃", "额", "唉", "诶", "哎", "嗯嗯", "啊啊", "哦哦",
+    "好", "好的", "好好", "对", "对对", "对对对", "是", "是的", "是是", "行", "行行",
+    "喂你好", "你好", "您好", "喂您好", "谢谢", "明白", "知道了", "那个", "就是"
+}
+
+GAP_MARKER = "……"
+
+_SENTENCE_SPLIT = re.compile(r"(?<=[。！？!?；;\n])")
+_NORMALIZE = re.compile(r"[\s，。！？、,.!?；;：:…\-~～\"'“”‘’]+")
+_FILLER = re.compile("|".join(sorted(FILLER_WORDS, key=len, reverse=True)))
+
+
+def _normalize(text: str) -> str:
+    return _NORMALIZE.sub("", text)
+
+
+def is_filler(text: str) -> bool:
+    """整句只由语气词/寒暄组成"""
+    return not _FILLER.sub("", _normalize(text))
+
+
+def split_segments(text: str) -> List[str]:
+    """没有 ASR 分段时（如纯文本输入）按句末标点切分"""
+    return [s.strip() for s in _SENTENCE_SPLIT.split(text) if s.strip()]
+
+
+class TranscriptCondenser:
+    """按风险信号压缩转录文本"""
+
+    def __init__(
+        self,
+        vocabulary: Optional[SignalVocabulary] = None,
+        neighbor_window: int = 1
+    ):
+        """
+        Args:
+            vocabulary: 诈骗信号词表（为空时从配置加载）
+            neighbor_window: 命中片段前后各保留的片段数
+        """
+        self.vocabulary = vocabulary or load_signal_vocabulary()
+        self.neighbor_window = neighbor_window
+
+    def _dedupe(self, segments: List[str]) -> List[str]:
+        """去除填充语与重复的无信号片段"""
+        kept = []
+        seen = set()
+        for text in segments:
+            key = _normalize(text)
+            if is_filler(text):
+                continue
+            if key in seen and self.vocabulary.score(text) == 0:
+                continue
+            seen.add(key)
+            kept.append(text)
+        return kept
+
+    def condense(
+        self,
+        transcript_text: str,
+        token_budget: int,
+        segments: Optional[List[Dict]] = None
+    ) -> Dict:
+        """
+        压缩转录文本
+
+        Args:
+            transcript_text: 完整转录文本
+            token_budget: token 预算（<= 0 表示不压缩；原文未超出预算时原样返回）
+            segments: ASR 分段结果 [{"text": ...}, ...]，为空时按标点切分
+
+        Returns:
+            {
+                "text": "压缩后的文本",
+                "stats": {
+                    "original_tokens": 3200,
+                    "condensed_tokens": 1480,
+                    "saved_tokens": 1720,
+                    "saved_ratio": 0.54,
+                    "segments_total": 120,
+                    "segments_kept": 41,
+                    "flagged_segments": 17
+                }
+            }
+        """
+        original_tokens = count_tokens(transcript_text)
+        texts = [s["text"] for s in segments] if segments else split_segments(transcript_text)
+
+        if token_budget <= 0 or original_tokens <= token_budget:
+            return self._result(transcript_text, original_tokens, len(texts), len(texts), 0)
+
+        texts = self._dedupe(texts)
+        deduped = " ".join(texts)
+        scores = [self.vocabulary.score(t) for t in texts]
+        flagged = sum(1 for s in scores if s > 0)
+
+        # 去重后已在预算内：保留全部上下文
+        if count_tokens(deduped) <= token_budget:
+            return self._result(deduped, original_tokens, len(texts), len(texts), flagged)
+
+        # 第一轮：按得分从高到低加入命中片段；第二轮：为其补充前后邻居作为上下文
+        ranked = [i for i in sorted(range(len(texts)), key=lambda i: -scores[i]) if scores[i] > 0]
+        costs = [count_tokens(t) + 1 for t in texts]
+        selected = set()
+        used = 0
+        for index in ranked:
+            if used + costs[index] <= token_budget:
+                selected.add(index)
+                used += costs[index]
+        for index in [i for i in ranked if i in selected]:
+            for offset in range(1, self.neighbor_window + 1):
+                for neighbor in (index - offset, index + offset):
+                    if 0 <= neighbor < len(texts) and neighbor not in selected \
+                            and used + costs[neighbor] <= token_budget:
+                        selected.add(neighbor)
+                        used += costs[neighbor]
+
+        if not selected:
+            # 没有命中信号（或单个片段超出预算）：保留开头部分
+            text = truncate_to_tokens(deduped, token_budget)
+            return self._result(text, original_tokens, len(texts), 0, flagged)
+
+        # 按原顺序拼接，不连续处插入省略标记
+        parts = []
+        previous = None
+        for i in sorted(selected):
+            if previous is not None and i != previous + 1:
+                parts.append(GAP_MARKER)
+            parts.append(texts[i])
+            previous = i
+        text = " ".join(parts)
+
+        return self._result(text, original_tokens, len(texts), len(selected), flagged)
+
+    @staticmethod
+    def _result(
+        text: str,
+        original_tokens: int,
+        segments_total: int,
+        segments_kept: int,
+        flagged_segments: int
+    ) -> Dict:
+        condensed_tokens = count_tokens(text)
+        saved = max(original_tokens - condensed_tokens, 0)
+        return {
+            "text": text,
+            "stats": {
+                "original_tokens": original_tokens,
+                "condensed_tokens": condensed_tokens,
+                "saved_tokens": saved,
+                "saved_ratio": round(saved / original_tokens, 3) if original_tokens else 0.0,
+                "segments_total": segments_total,
+                "segments_kept": segments_kept,
+                "flagged_segments": flagged_segments
+            }
+        }
+
+
+if __name__ == "__main__":
+    # 测试代码
+    print("\n=== 测试转录压缩 ===\n")
+
+    test_transcript = (
+        "喂？喂，您好。嗯嗯。您好，请问是李奶奶吗？是的。"
+        "我是公安局的王警官，您的银行卡涉嫌洗钱。好的好的。"
+        "您必须立即把钱转账到安全账户，否则后果严重。嗯。"
+        "今天天气不错。对对对。验证码告诉我一下。"
+    )
+
+    condenser = TranscriptCondenser()
+    result = condenser.condense(test_transcript, token_budget=40)
+    print(f"压缩结果: {result['text']}")
+    print(f"统计: {result['stats']}")
@@ -0,0 +1,48 @@
+"""
+反诈骗智能检测系统 - 通用组件模块
+"""
+
+from .tracing import (
+    Trace,
+    start_trace,
+    use_trace,
+    stage,
+    current_trace,
+    current_trace_id,
+    install_log_filter,
+    set_stage_gate
+)
+from .tokens import count_tokens, truncate_to_tokens
+from .resilience import CircuitBreaker, CircuitOpenError
+from .profiling import profiled, profile_report
+from .single_flight import SingleFlight, AsyncSingleFlight, content_hash
+from .model_bundle import ModelBundle, BundleError, load_bundle
+from .resources import ManagedResource, ResourceManager, rss_bytes
+from . import metrics
+
+__all__ = [
+    'Trace',
+    'start_trace',
+    'use_trace',
+    'stage',
+    'current_trace',
+    'current_trace_id',
+    'install_log_filter',
+    'set_stage_gate',
+    'count_tokens',
+    'truncate_to_tokens',
+    'CircuitBreaker',
+    'CircuitOpenError',
+    'profiled',
+    'profile_report',
+    'SingleFlight',
+    'AsyncSingleFlight',
+    'content_hash',
+    'ModelBundle',
+    'BundleError',
+    'load_bundle',
+    'ManagedResource',
+    'ResourceManager',
+    'rss_bytes',
+    'metrics'
+]
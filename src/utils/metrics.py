@@ -0,0 +1,378 @@
+"""
+Prometheus 格式指标
+轻量实现 Counter / Gauge / Histogram，由 api.py 的 /metrics 接口输出
+"""
+
+import math
+import threading
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    """指标基类：按标签值组合保存子序列"""
+
+    type_name = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._series: Dict[Tuple[str, ...], object] = {}
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} 需要标签 {self.labelnames}，实际为 {tuple(labels)}")
+        return tuple(str(labels[n]) for n in self.labelnames)
+
+    def render(self) -> List[str]:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.type_name}"
+        ]
+        with self._lock:
+            series = list(self._series.items())
+        for key, value in series:
+            lines.extend(self._render_series(key, value))
+        return lines
+
+    def _render_series(self, key, value) -> List[str]:
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"]
+
+
+class Counter(_Metric):
+    """只增计数器"""
+
+    type_name = "counter"
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._series[key] = self._series.get(key, 0.0) + amount
+
+
+class Gauge(_Metric):
+    """可增可减的瞬时值；也可绑定取值函数，在输出时实时读取"""
+
+    type_name = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._functions: Dict[Tuple[str, ...], Callable[[], float]] = {}
+
+    def set(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._series[key] = float(value)
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._series[key] = self._series.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels) -> None:
+        self.inc(-amount, **labels)
+
+    def set_function(self, fn: Callable[[], float], **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._functions[key] = fn
+
+    def render(self) -> List[str]:
+        with self._lock:
+            functions = list(self._functions.items())
+        for key, fn in functions:
+            try:
+                value = float(fn())
+            except Exception:
+                continue
+            with self._lock:
+                self._series[key] = value
+        return super().render()
+
+
+class Histogram(_Metric):
+    """直方图（累积桶 + sum + count）"""
+
+    type_name = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            state = self._series.get(key)
+            if state is None:
+                state = {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+                self._series[key] = state
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state["counts"][i] += 1
+                    break
+            state["sum"] += value
+            state["count"] += 1
+
+    def _render_series(self, key, state) -> List[str]:
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets, state["counts"]):
+            cumulative += count
+            le = f'le="{_format_value(bound)}"'
+            lines.append(
+                f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}"
+            )
+        labels = _format_labels(self.labelnames, key)
+        lines.append(f"{self.name}_sum{labels} {_format_value(state['sum'])}")
+        lines.append(f"{self.name}_count{labels} {state['count']}")
+        return lines
+
+
+class MetricsRegistry:
+    """指标注册表"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            if metric.name in self._metrics:
+                return self._metrics[metric.name]
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Optional[Sequence[float]] = None
+    ) -> Histogram:
+        if buckets is None:
+            return self.register(Histogram(name, documentation, labelnames))
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        """输出 Prometheus 文本格式"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines: List[str] = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+# 全局注册表
+REGISTRY = MetricsRegistry()
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+# === 分析流水线指标 ===
+
+REQUESTS = REGISTRY.counter(
+    "antifraud_requests_total", "分析请求数", ("endpoint", "status")
+)
+INFLIGHT = REGISTRY.gauge(
+    "antifraud_inflight_requests", "正在处理的请求数"
+)
+QUEUE_DEPTH = REGISTRY.gauge(
+    "antifraud_queue_depth", "等待进入批次的请求数"
+)
+
+STAGE_SECONDS = REGISTRY.histogram(
+    "antifraud_stage_seconds", "流水线各阶段耗时（秒）", ("stage",)
+)
+ASR_SECONDS = REGISTRY.histogram(
+    "antifraud_asr_seconds", "ASR 转录耗时（秒）"
+)
+AUDIO_SECONDS = REGISTRY.histogram(
+    "antifraud_audio_duration_seconds", "输入音频时长（秒）",
+    buckets=(5, 15, 30, 60, 120, 300, 600, 1200, 1800)
+)
+ASR_RTF = REGISTRY.histogram(
+    "antifraud_asr_real_time_factor", "ASR 实时率（转录耗时 / 音频时长）",
+    buckets=(0.02, 0.05, 0.1, 0.2, 0.3, 0.5, 0.75, 1, 1.5, 2)
+)
+RAG_SECONDS = REGISTRY.histogram(
+    "antifraud_rag_query_seconds", "RAG 检索耗时（秒）",
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+)
+LLM_SECONDS = REGISTRY.histogram(
+    "antifraud_llm_agent_seconds", "各智能体 LLM 阶段耗时（秒）", ("agent",)
+)
+LLM_TOKENS = REGISTRY.counter(
+    "antifraud_llm_tokens_total", "各智能体消耗的 token 数", ("agent", "kind")
+)
+LLM_CALLS = REGISTRY.counter(
+    "antifraud_llm_calls_total", "各智能体的 LLM 调用次数", ("agent",)
+)
+PROMPT_CACHE_RATIO = REGISTRY.histogram(
+    "antifraud_prompt_cache_ratio", "各智能体输入 token 中命中服务商 Prompt 缓存的比例", ("agent",),
+    buckets=(0, 0.1, 0.25, 0.5, 0.75, 0.9)
+)
+PROMPT_TOKENS_SAVED = REGISTRY.counter(
+    "antifraud_prompt_tokens_saved_total", "转录压缩节省的 token 数", ("task",)
+)
+PROMPT_SAVED_RATIO = REGISTRY.histogram(
+    "antifraud_prompt_saved_ratio", "转录压缩节省比例", ("task",),
+    buckets=(0, 0.1, 0.25, 0.5, 0.75, 0.9)
+)
+PARSE_FAILURES = REGISTRY.counter(
+    "antifraud_parse_failures_total", "智能体输出解析失败次数", ("field",)
+)
+DEGRADED = REGISTRY.counter(
+    "antifraud_degraded_total", "降级响应数（LLM 熔断 / 超时 / 出错）", ("reason",)
+)
+FINGERPRINT_HITS = REGISTRY.counter(
+    "antifraud_fingerprint_hits_total", "音频指纹命中已知录音、跳过转录与智能体的次数"
+)
+COALESCED = REGISTRY.counter(
+    "antifraud_coalesced_total", "合并到进行中的相同请求的次数", ("layer",)
+)
+VERDICT_QUEUE = REGISTRY.gauge(
+    "antifraud_verdict_queue_depth", "等待批量写入判定存储的记录数"
+)
+VERDICTS_DROPPED = REGISTRY.counter(
+    "antifraud_verdicts_dropped_total", "判定写入队列已满而丢弃的记录数"
+)
+SPECULATION = REGISTRY.counter(
+    "antifraud_speculative_guardian_total",
+    "投机执行 Guardian 的结论（hit / miss / skipped / discarded / error）", ("outcome",)
+)
+SPECULATION_SAVED_SECONDS = REGISTRY.histogram(
+    "antifraud_speculative_guardian_saved_seconds", "投机 Guardian 命中时节省的端到端耗时（秒）",
+    buckets=(0.5, 1, 2, 5, 10, 20, 30)
+)
+PROCESS_RSS = REGISTRY.gauge(
+    "antifraud_process_rss_bytes", "前端进程常驻内存（字节）"
+)
+RESOURCE_MEMORY = REGISTRY.gauge(
+    "antifraud_resource_memory_bytes", "各重量级组件加载时占用的内存（字节，未加载为 0）", ("component",)
+)
+RESOURCE_LOADS = REGISTRY.counter(
+    "antifraud_resource_loads_total", "各组件的加载次数（含卸载后重新加载）", ("component",)
+)
+RESOURCE_EVICTIONS = REGISTRY.counter(
+    "antifraud_resource_evictions_total", "各组件被卸载的次数", ("component", "reason")
+)
+KB_SWAPS = REGISTRY.counter(
+    "antifraud_kb_swaps_total", "知识库版本切换次数（build / swap / rollback / follow）", ("action",)
+)
+PRIORITY_RUNNING = REGISTRY.gauge(
+    "antifraud_priority_running", "各资源上按优先级执行中的阶段数", ("resource", "priority")
+)
+PRIORITY_WAITING = REGISTRY.gauge(
+    "antifraud_priority_waiting", "各资源上按优先级排队的阶段数", ("resource", "priority")
+)
+PRIORITY_QUEUED_SECONDS = REGISTRY.histogram(
+    "antifraud_priority_queued_seconds", "ASR / LLM 阶段开始前的排队耗时（秒）", ("resource", "priority"),
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+)
+RISK_MODEL_PREDICTIONS = REGISTRY.counter(
+    "antifraud_risk_model_predictions_total", "轻量风险模型的预测（按等级与是否预过滤放行）", ("risk_level", "prefiltered")
+)
+LIVE_SESSIONS = REGISTRY.gauge(
+    "antifraud_live_sessions", "进行中的实时通话会话数"
+)
+LIVE_WATCHDOG_TRIGGERS = REGISTRY.counter(
+    "antifraud_live_watchdog_triggers_total", "实时通话中风险分越过阈值触发 Watchdog 的次数"
+)
+ADVICE_SOURCE = REGISTRY.counter(
+    "antifraud_advice_source_total", "防御建议来源（llm / precomputed / template）", ("source",)
+)
+
+
+def observe_trace(trace: Optional[Dict]) -> None:
+    """
+    根据一次请求的追踪记录更新指标
+
+    指标统一在前端进程中由追踪记录汇总，多进程模式下 Worker 内的阶段耗时
+    随分析结果一并回传，不会丢失。
+    """
+    if not trace:
+        return
+
+    for s in trace.get("stages", []):
+        name = s["name"]
+        seconds = s["seconds"]
+        STAGE_SECONDS.observe(seconds, stage=name)
+        if "queued_seconds" in s:
+            PRIORITY_QUEUED_SECONDS.observe(
+                s["queued_seconds"], resource="asr" if name == "asr" else "llm", priority=s.get("priority", "")
+            )
+
+        if name == "asr":
+            ASR_SECONDS.observe(seconds)
+            duration = s.get("audio_duration") or 0
+            if duration > 0:
+                AUDIO_SECONDS.observe(duration)
+                ASR_RTF.observe(seconds / duration)
+        elif name == "rag_query":
+            RAG_SECONDS.observe(seconds)
+        elif name == "risk_model":
+            RISK_MODEL_PREDICTIONS.inc(
+                risk_level=s.get("risk_level", "unknown"), prefiltered=str(bool(s.get("prefiltered"))).lower()
+            )
+        elif name == "speculation":
+            SPECULATION.inc(outcome=s.get("outcome", "unknown"))
+            if s.get("outcome") == "hit":
+                SPECULATION_SAVED_SECONDS.observe(s.get("saved_seconds", 0))
+        elif name.startswith("agent:"):
+            agent = name.split(":", 1)[1]
+            LLM_SECONDS.observe(seconds, agent=agent)
+            LLM_TOKENS.inc(s.get("prompt_tokens", 0), agent=agent, kind="prompt")
+            LLM_TOKENS.inc(s.get("completion_tokens", 0), agent=agent, kind="completion")
+            LLM_TOKENS.inc(s.get("cached_prompt_tokens", 0), agent=agent, kind="cached_prompt")
+            if s.get("prompt_tokens"):
+                PROMPT_CACHE_RATIO.observe(s.get("cached_prompt_tokens", 0) / s["prompt_tokens"], agent=agent)
+            LLM_CALLS.inc(s.get("llm_calls", 0), agent=agent)
+
+
+def observe_result(result: Dict) -> None:
+    """根据分析结果更新解析失败计数、降级计数、转录压缩与阶段指标"""
+    if result.get("degraded"):
+        DEGRADED.inc(reason=result.get("degraded_reason") or "unknown")
+    if result.get("advice_source"):
+        ADVICE_SOURCE.inc(source=result["advice_source"])
+    if result.get("risk_level") == "Unknown":
+        PARSE_FAILURES.inc(field="risk_level")
+    if result.get("scam_type") == "Unknown":
+        PARSE_FAILURES.inc(field="scam_type")
+    for task, stats in (result.get("prompt_stats") or {}).items():
+        PROMPT_TOKENS_SAVED.inc(stats.get("saved_tokens", 0), task=task)
+        PROMPT_SAVED_RATIO.observe(stats.get("saved_ratio", 0), task=task)
+    observe_trace(result.get("trace"))
@@ -0,0 +1,158 @@
+"""
+离线模型包
+一个版本目录内包含 CTranslate2 格式的 Whisper 模型、嵌入模型（safetensors）、已构建的知识库
+与 manifest.json（各文件的 SHA-256）。设置 MODEL_BUNDLE_DIR 后系统只从该目录加载，
+不访问 Hugging Face Hub
+
+目录结构：
+    <bundle>/manifest.json
+    <bundle>/whisper/       WhisperModel 可直接加载的 CTranslate2 模型
+    <bundle>/embedding/     SentenceTransformer.save() 的输出
+    <bundle>/kb/            ChromaDB 持久化目录（只含导出时的当前版本与 CURRENT）
+    <bundle>/tiktoken/      tiktoken 词表缓存（可选）
+"""
+
+import hashlib
+import json
+import os
+import shutil
+from typing import Dict, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+MANIFEST_NAME = "manifest.json"
+BUNDLE_FORMAT = 1
+
+
+class BundleError(RuntimeError):
+    """模型包缺失、格式不符或校验失败"""
+
+
+def file_sha256(path: str, chunk_size: int = 4 * 1024 * 1024) -> str:
+    """按块计算文件的 SHA-256"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def hash_tree(root: str) -> Dict[str, Dict]:
+    """目录下所有文件的 {相对路径: {"sha256": ..., "size": ...}}（路径使用 / 分隔）"""
+    files = {}
+    for dirpath, _, filenames in os.walk(root):
+        for name in sorted(filenames):
+            path = os.path.join(dirpath, name)
+            rel = os.path.relpath(path, root).replace(os.sep, "/")
+            if rel == MANIFEST_NAME:
+                continue
+            files[rel] = {"sha256": file_sha256(path), "size": os.path.getsize(path)}
+    return dict(sorted(files.items()))
+
+
+class ModelBundle:
+    """已导出的离线模型包"""
+
+    def __init__(self, path: str):
+        """
+        Args:
+            path: 模型包目录（含 manifest.json）
+        """
+        self.path = os.path.abspath(path)
+        manifest_path = os.path.join(self.path, MANIFEST_NAME)
+        if not os.path.exists(manifest_path):
+            raise BundleError(f"模型包缺少 {MANIFEST_NAME}: {self.path}")
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            self.manifest = json.load(f)
+        if self.manifest.get("format") != BUNDLE_FORMAT:
+            raise BundleError(f"不支持的模型包格式: {self.manifest.get('format')}")
+
+    @property
+    def version(self) -> str:
+        return self.manifest.get("version", "")
+
+    def _component(self, name: str) -> Optional[str]:
+        if name not in self.manifest.get("components", {}):
+            return None
+        return os.path.join(self.path, name)
+
+    @property
+    def whisper_path(self) -> Optional[str]:
+        return self._component("whisper")
+
+    @property
+    def embedding_path(self) -> Optional[str]:
+        return self._component("embedding")
+
+    @property
+    def kb_path(self) -> Optional[str]:
+        return self._component("kb")
+
+    @property
+    def tiktoken_path(self) -> Optional[str]:
+        return self._component("tiktoken")
+
+    def model_versions(self) -> Dict:
+        """各组件的来源与精度（随判定保存）"""
+        components = self.manifest.get("components", {})
+        return {
+            "bundle": self.version,
+            "whisper": components.get("whisper", {}).get("source"),
+            "embedding": components.get("embedding", {}).get("source")
+        }
+
+    def verify(self) -> None:
+        """逐文件校验大小与 SHA-256，缺失、多余或不一致时抛出 BundleError"""
+        expected = self.manifest.get("files", {})
+        actual = hash_tree(self.path)
+        missing = sorted(set(expected) - set(actual))
+        extra = sorted(set(actual) - set(expected))
+        mismatched = sorted(
+            rel for rel in set(expected) & set(actual) if expected[rel] != actual[rel]
+        )
+        if missing or extra or mismatched:
+            raise BundleError(
+                f"模型包校验失败 ({self.path}): 缺失 {missing[:5]}，多余 {extra[:5]}，不一致 {mismatched[:5]}"
+            )
+        logger.info(f"🔐 模型包 {self.version} 校验通过（{len(expected)} 个文件）")
+
+    def enable_offline(self) -> None:
+        """禁止 Hugging Face Hub 访问，并让 tiktoken 使用包内词表"""
+        os.environ["HF_HUB_OFFLINE"] = "1"
+        os.environ["TRANSFORMERS_OFFLINE"] = "1"
+        if self.tiktoken_path is not None:
+            os.environ.setdefault("TIKTOKEN_CACHE_DIR", self.tiktoken_path)
+
+    def install_kb(self, persist_dir: str) -> bool:
+        """
+        把包内知识库复制到 ChromaDB 持久化目录（目标已存在时不覆盖）
+
+        ChromaDB 以读写方式打开 SQLite，直接使用包内目录会改变文件、导致下次校验失败，
+        因此复制一份使用。
+
+        Returns:
+            是否执行了复制
+        """
+        if self.kb_path is None or os.path.exists(persist_dir):
+            return False
+        shutil.copytree(self.kb_path, persist_dir)
+        logger.info(f"📚 已从模型包安装知识库: {persist_dir}")
+        return True
+
+
+def load_bundle(path: str, verify: bool = True) -> ModelBundle:
+    """
+    打开模型包，并切换到离线模式
+
+    Args:
+        path: 模型包目录
+        verify: 是否校验全部文件的 SHA-256
+    """
+    bundle = ModelBundle(path)
+    if verify:
+        bundle.verify()
+    bundle.enable_offline()
+    logger.info(f"📦 使用离线模型包 {bundle.version}: {bundle.path}")
+    return bundle
@@ -0,0 +1,145 @@
+"""
+热路径剖析
+按比例采样（或由 X-Profile 请求头强制）对请求开启 cProfile，每个处理阶段单独写出
+.prof 文件（profiles/<trace_id>/<阶段>-<pid>-<序号>.prof），并可汇总为 Top-N 报告。
+trace_id 可能来自客户端请求头，拼接路径前先经 safe_trace_id 校验。
+未采样的请求只多一次属性判断。
+"""
+
+import argparse
+import cProfile
+import glob
+import io
+import itertools
+import os
+import pstats
+import random
+import re
+import threading
+import uuid
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Iterator, List, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+PROFILE_DIR = os.getenv("PROFILE_DIR", "./profiles")
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+
+_sequence = itertools.count(1)
+_local = threading.local()
+
+# 允许的 trace_id（同时用作剖析目录名）
+_TRACE_ID_PATTERN = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+
+def safe_trace_id(trace_id: Optional[str] = None) -> str:
+    """校验 trace_id，为空或不合法（含路径分隔符、过长等）时生成新的 trace_id"""
+    if trace_id and _TRACE_ID_PATTERN.match(trace_id):
+        return trace_id
+    if trace_id:
+        logger.warning(f"忽略不合法的 trace_id: {trace_id[:80]!r}")
+    return uuid.uuid4().hex[:16]
+
+
+def should_profile(forced: Optional[bool] = None) -> bool:
+    """是否对本次请求开启剖析（forced 为空时按 PROFILE_SAMPLE_RATE 采样）"""
+    if forced is not None:
+        return forced
+    return PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE
+
+
+@contextmanager
+def profiled(trace_id: str, name: str) -> Iterator[None]:
+    """
+    对当前线程中的一段代码采集 cProfile 并写出 .prof 文件
+
+    同一线程内嵌套的阶段计入最外层阶段；剖析器已被占用时（Python 3.12+
+    同一时刻只允许一个剖析器）直接跳过，不影响请求本身。
+    """
+    if getattr(_local, "active", False):
+        yield
+        return
+
+    profile = cProfile.Profile()
+    try:
+        profile.enable()
+    except ValueError:
+        yield
+        return
+
+    _local.active = True
+    try:
+        yield
+    finally:
+        profile.disable()
+        _local.active = False
+        directory = os.path.join(PROFILE_DIR, safe_trace_id(trace_id))
+        path = os.path.join(directory, f"{name.replace(':', '_')}-{os.getpid()}-{next(_sequence)}.prof")
+        try:
+            os.makedirs(directory, exist_ok=True)
+            profile.dump_stats(path)
+        except OSError as e:
+            logger.warning(f"写出剖析文件失败: {path}: {e}")
+
+
+def _stage_of(path: str) -> str:
+    """从文件名还原阶段名"""
+    return os.path.basename(path).rsplit("-", 2)[0]
+
+
+def profile_report(
+    directory: str = PROFILE_DIR,
+    trace_id: Optional[str] = None,
+    top_n: int = 30,
+    sort: str = "cumulative"
+) -> str:
+    """
+    汇总 .prof 文件，输出各阶段剖析耗时与 Top-N 函数
+
+    Args:
+        directory: 剖析文件根目录
+        trace_id: 只汇总某个请求（为空时汇总全部）
+        top_n: 输出的函数条数
+        sort: pstats 排序键（cumulative / tottime / ncalls）
+    """
+    pattern = os.path.join(directory, trace_id or "*", "*.prof")
+    files = sorted(glob.glob(pattern))
+    if not files:
+        return f"未找到剖析文件: {pattern}"
+
+    by_stage: defaultdict = defaultdict(list)
+    for path in files:
+        by_stage[_stage_of(path)].append(path)
+
+    lines = [
+        f"剖析文件 {len(files)} 个，请求 {len({os.path.dirname(p) for p in files})} 个",
+        "",
+        f"{'阶段':<24}{'文件数':>8}{'总耗时(s)':>12}",
+    ]
+    for name, paths in sorted(by_stage.items()):
+        lines.append(f"{name:<24}{len(paths):>8}{pstats.Stats(*paths).total_tt:>12.3f}")
+
+    stream = io.StringIO()
+    stats = pstats.Stats(*files, stream=stream)
+    stats.strip_dirs().sort_stats(sort).print_stats(top_n)
+    lines += ["", f"Top {top_n}（按 {sort} 排序）:", stream.getvalue()]
+    return "\n".join(lines)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    """命令行入口：python main.py profile-report"""
+    parser = argparse.ArgumentParser(
+        prog='main.py profile-report',
+        description='汇总请求剖析文件，输出 Top-N 热点函数'
+    )
+    parser.add_argument('--dir', default=PROFILE_DIR, help='剖析文件目录（默认 PROFILE_DIR）')
+    parser.add_argument('--trace', default=None, help='只汇总指定 trace_id 的请求')
+    parser.add_argument('--top', type=int, default=30, help='输出函数条数（默认 30）')
+    parser.add_argument('--sort', default='cumulative',
+                        choices=['cumulative', 'tottime', 'ncalls'], help='排序方式')
+    args = parser.parse_args(argv)
+
+    print(profile_report(args.dir, args.trace, args.top, args.sort))
@@ -0,0 +1,101 @@
+"""
+容错组件
+熔断器：上游 LLM 连续超时或出错时快速失败，直接走降级路径，避免请求堆积
+"""
+
+import threading
+import time
+from typing import Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitOpenError(RuntimeError):
+    """熔断器处于打开状态，调用被拒绝"""
+
+
+class CircuitBreaker:
+    """
+    三态熔断器
+
+    - closed：正常放行，连续失败达到阈值后打开
+    - open：拒绝调用，经过恢复时间后进入半开
+    - half_open：放行少量探测调用，成功则关闭，失败则重新打开
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int = 5,
+        recovery_timeout: float = 30.0,
+        half_open_max_calls: int = 1
+    ):
+        """
+        Args:
+            name: 名称（用于日志与指标）
+            failure_threshold: 连续失败多少次后打开
+            recovery_timeout: 打开后多久（秒）允许探测
+            half_open_max_calls: 半开状态下同时放行的探测调用数
+        """
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.half_open_max_calls = half_open_max_calls
+
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._half_open_calls = 0
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            self._maybe_half_open()
+            return self._state
+
+    def _maybe_half_open(self) -> None:
+        if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.recovery_timeout:
+            self._state = self.HALF_OPEN
+            self._half_open_calls = 0
+            logger.info(f"🔌 熔断器 {self.name} 进入半开状态，放行探测请求")
+
+    def allow(self) -> bool:
+        """是否放行本次调用（半开状态下会占用一个探测名额）"""
+        with self._lock:
+            self._maybe_half_open()
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.HALF_OPEN and self._half_open_calls < self.half_open_max_calls:
+                self._half_open_calls += 1
+                return True
+            return False
+
+    def check(self) -> None:
+        """不放行时抛出 CircuitOpenError"""
+        if not self.allow():
+            raise CircuitOpenError(f"熔断器 {self.name} 已打开")
+
+    def record_success(self) -> None:
+        with self._lock:
+            if self._state != self.CLOSED:
+                logger.info(f"✅ 熔断器 {self.name} 已恢复")
+            self._state = self.CLOSED
+            self._failures = 0
+
+    def record_failure(self, reason: Optional[str] = None) -> None:
+        with self._lock:
+            self._failures += 1
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != self.OPEN:
+                    logger.warning(
+                        f"⚠️ 熔断器 {self.name} 打开（连续失败 {self._failures} 次"
+                        f"{'，' + reason if reason else ''}），{self.recovery_timeout:.0f}s 后重试"
+                    )
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
@@ -0,0 +1,280 @@
+"""
+重量级资源管理
+记录 Whisper、嵌入模型、ChromaDB 客户端等资源的最近使用时间，空闲超时或进程 RSS 超过上限时
+卸载，下次使用时透明地重新加载，并给出各组件加载时占用的内存
+"""
+
+import ctypes
+import gc
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional
+import logging
+
+from src.utils import metrics
+
+logger = logging.getLogger(__name__)
+
+
+def rss_bytes() -> int:
+    """当前进程的常驻内存（字节）；无法读取时返回 0"""
+    try:
+        with open("/proc/self/statm", 'r') as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss
+    except Exception:
+        return 0
+
+
+def _release_memory() -> None:
+    """回收对象并把空闲堆内存归还操作系统（glibc，其他平台忽略）"""
+    gc.collect()
+    try:
+        ctypes.CDLL("libc.so.6").malloc_trim(0)
+    except (OSError, AttributeError):
+        pass
+
+
+class ManagedResource:
+    """
+    可卸载、按需重新加载的资源
+
+    get() 返回资源实例（未加载时先加载）；lease() 在使用期间持有租约，持有租约的资源
+    不会被卸载。卸载只是释放管理器持有的引用，调用方手中已取得的实例在用完前依然有效。
+    """
+
+    def __init__(
+        self,
+        name: str,
+        loader: Optional[Callable[[], Any]] = None,
+        unloader: Optional[Callable[[Any], None]] = None,
+        instance: Any = None
+    ):
+        """
+        Args:
+            name: 组件名
+            loader: 加载函数；为空时资源不可卸载（如多进程共享的模型）
+            unloader: 卸载前的清理函数（可选）
+            instance: 已加载的实例
+        """
+        self.name = name
+        self._loader = loader
+        self._unloader = unloader
+        self._instance = instance
+        self._lock = threading.Lock()
+        self.leases = 0
+        self.loads = 0
+        self.load_seconds = 0.0
+        self.memory_bytes = 0
+        self.last_used = time.monotonic()
+
+    @property
+    def resident(self) -> bool:
+        return self._instance is not None
+
+    @property
+    def evictable(self) -> bool:
+        return self._loader is not None
+
+    def _load(self) -> Any:
+        """加载实例（调用方持有锁）"""
+        before = rss_bytes()
+        start = time.perf_counter()
+        self._instance = self._loader()
+        self.load_seconds = time.perf_counter() - start
+        # 加载前后的 RSS 差值（并发加载时为近似值）
+        self.memory_bytes = max(rss_bytes() - before, 0)
+        self.loads += 1
+        self.last_used = time.monotonic()
+        metrics.RESOURCE_LOADS.inc(component=self.name)
+        if self.loads > 1:
+            logger.info(f"♻️ 重新加载 {self.name}（{self.load_seconds:.2f}s）")
+        return self._instance
+
+    def get(self) -> Any:
+        """取得资源实例，未加载时先加载"""
+        with self._lock:
+            self.last_used = time.monotonic()
+            if self._instance is None:
+                return self._load()
+            return self._instance
+
+    @contextmanager
+    def lease(self) -> Iterator[Any]:
+        """使用期间持有租约（不会被卸载）"""
+        with self._lock:
+            self.last_used = time.monotonic()
+            instance = self._instance if self._instance is not None else self._load()
+            self.leases += 1
+        try:
+            yield instance
+        finally:
+            with self._lock:
+                self.leases -= 1
+                self.last_used = time.monotonic()
+
+    def peek(self) -> Any:
+        """当前实例（未加载时为 None，不触发加载）"""
+        return self._instance
+
+    def swap(self, instance: Any) -> Any:
+        """
+        替换为新实例（如知识库切换版本）
+
+        Returns:
+            被替换的旧实例（未加载时为 None），由调用方负责清理
+        """
+        with self._lock:
+            old, self._instance = self._instance, instance
+            self.last_used = time.monotonic()
+        return old
+
+    def unload(self, reason: str = "manual") -> bool:
+        """
+        卸载资源（不可卸载、未加载或持有租约时跳过）
+
+        Returns:
+            是否已卸载
+        """
+        with self._lock:
+            if not self.evictable or self._instance is None or self.leases > 0:
+                return False
+            instance, self._instance = self._instance, None
+        if self._unloader is not None:
+            try:
+                self._unloader(instance)
+            except Exception as e:
+                logger.warning(f"{self.name} 卸载清理失败: {e}")
+        del instance
+        _release_memory()
+        metrics.RESOURCE_EVICTIONS.inc(component=self.name, reason=reason)
+        logger.info(f"💤 已卸载 {self.name}（{reason}）")
+        return True
+
+    def status(self) -> Dict:
+        return {
+            "resident": self.resident,
+            "evictable": self.evictable,
+            "leases": self.leases,
+            "loads": self.loads,
+            "load_seconds": round(self.load_seconds, 3),
+            "memory_mb": round(self.memory_bytes / 1024 / 1024, 1) if self.resident else 0.0,
+            "idle_seconds": round(time.monotonic() - self.last_used, 1)
+        }
+
+
+class ResourceManager:
+    """
+    按空闲时间与进程 RSS 卸载资源
+
+    后台线程每 interval 秒检查一次：空闲超过 idle_seconds 的资源卸载；
+    RSS 超过 max_rss_mb 时按最久未使用的顺序卸载，直到回到上限以内。
+    """
+
+    def __init__(self, idle_seconds: float = 0, max_rss_mb: float = 0, interval: float = 30):
+        """
+        Args:
+            idle_seconds: 空闲多久后卸载（0 表示不按空闲卸载）
+            max_rss_mb: 进程 RSS 上限（MB，0 表示不限制）
+            interval: 检查间隔（秒）
+        """
+        self.idle_seconds = idle_seconds
+        self.max_rss_mb = max_rss_mb
+        self.interval = interval
+        self.resources: Dict[str, ManagedResource] = {}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.idle_seconds > 0 or self.max_rss_mb > 0
+
+    def add(self, resource: ManagedResource) -> ManagedResource:
+        """登记资源"""
+        self.resources[resource.name] = resource
+        metrics.RESOURCE_MEMORY.set_function(
+            lambda: resource.memory_bytes if resource.resident else 0, component=resource.name
+        )
+        return resource
+
+    def sweep(self) -> List[str]:
+        """
+        执行一次检查
+
+        Returns:
+            本次卸载的组件名
+        """
+        evicted = []
+        now = time.monotonic()
+        if self.idle_seconds > 0:
+            for resource in self.resources.values():
+                if resource.resident and now - resource.last_used >= self.idle_seconds:
+                    if resource.unload("idle"):
+                        evicted.append(resource.name)
+
+        if self.max_rss_mb > 0:
+            limit = self.max_rss_mb * 1024 * 1024
+            candidates = sorted(
+                (r for r in self.resources.values() if r.resident and r.evictable),
+                key=lambda r: r.last_used
+            )
+            for resource in candidates:
+                if rss_bytes() <= limit:
+                    break
+                if resource.unload("memory"):
+                    evicted.append(resource.name)
+        return evicted
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            try:
+                self.sweep()
+            except Exception as e:
+                logger.error(f"资源检查失败: {e}")
+
+    def start(self) -> None:
+        """启动后台检查线程（未设置任何上限时不启动）"""
+        if not self.enabled or self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="resource-manager", daemon=True)
+        self._thread.start()
+        logger.info(
+            f"🧹 资源管理已启用（空闲 {self.idle_seconds or '-'}s 卸载，RSS 上限 {self.max_rss_mb or '-'} MB）"
+        )
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def status(self) -> Dict:
+        """进程 RSS 与各组件状态"""
+        return {
+            "rss_mb": round(rss_bytes() / 1024 / 1024, 1),
+            "idle_seconds": self.idle_seconds,
+            "max_rss_mb": self.max_rss_mb,
+            "components": {name: r.status() for name, r in self.resources.items()}
+        }
+
+
+if __name__ == "__main__":
+    # 测试代码：分配大数组模拟模型，空闲后卸载并在下次使用时重新加载
+    print("\n=== 测试资源管理 ===\n")
+
+    manager = ResourceManager(idle_seconds=0.2)
+    big = manager.add(ManagedResource("big", loader=lambda: b"\x01" * (200 * 1024 * 1024)))
+    big.get()
+    print(f"加载后: {manager.status()}")
+    time.sleep(0.3)
+    print(f"卸载: {manager.sweep()}, RSS={rss_bytes() / 1024 / 1024:.0f} MB")
+    with big.lease() as data:
+        print(f"重新加载: {len(data) // 1024 // 1024} MB, loads={big.loads}")
+        time.sleep(0.3)
+        print(f"持有租约时卸载: {manager.sweep()}")
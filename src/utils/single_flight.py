@@ -0,0 +1,99 @@
+"""
+请求合并（single-flight）
+相同 key 的并发调用只执行一次，其余调用等待并共享同一结果；执行结束后 key 即释放，
+不做缓存
+"""
+
+import asyncio
+import hashlib
+import threading
+from concurrent.futures import Future
+from typing import Any, Awaitable, BinaryIO, Callable, Dict, Hashable, Tuple, Union
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def content_hash(source: Union[str, BinaryIO], chunk_size: int = 1024 * 1024) -> str:
+    """按块计算文件内容的 SHA-256（文件对象读取后回到开头）"""
+    digest = hashlib.sha256()
+    if isinstance(source, str):
+        with open(source, 'rb') as f:
+            for chunk in iter(lambda: f.read(chunk_size), b""):
+                digest.update(chunk)
+    else:
+        source.seek(0)
+        for chunk in iter(lambda: source.read(chunk_size), b""):
+            digest.update(chunk)
+        source.seek(0)
+    return digest.hexdigest()
+
+
+class SingleFlight:
+    """线程版请求合并"""
+
+    def __init__(self, name: str = "single-flight"):
+        self.name = name
+        self._lock = threading.Lock()
+        self._inflight: Dict[Hashable, Future] = {}
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        """
+        执行 fn()，或等待相同 key 正在进行的执行
+
+        Returns:
+            (结果, 是否共享了其他调用的结果)；fn 抛出的异常会传给所有等待者
+        """
+        with self._lock:
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._inflight[key] = future
+
+        if not leader:
+            logger.info(f"🔗 {self.name}: 合并到进行中的请求")
+            return future.result(), True
+
+        try:
+            future.set_result(fn())
+        except BaseException as e:
+            future.set_exception(e)
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+        return future.result(), False
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._inflight)
+
+
+class AsyncSingleFlight:
+    """asyncio 版请求合并（同一事件循环内使用）"""
+
+    def __init__(self, name: str = "single-flight"):
+        self.name = name
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable]) -> Tuple[Any, bool]:
+        """
+        执行 await fn()，或等待相同 key 正在进行的执行
+
+        执行放在独立的 Task 中，发起者被取消（如客户端断开）不会影响等待者。
+
+        Returns:
+            (结果, 是否共享了其他调用的结果)
+        """
+        task = self._inflight.get(key)
+        shared = task is not None
+        if shared:
+            logger.info(f"🔗 {self.name}: 合并到进行中的请求")
+        else:
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return await asyncio.shield(task), shared
+
+    def __len__(self) -> int:
+        return len(self._inflight)
@@ -0,0 +1,70 @@
+"""
+本地 token 计数
+优先使用 tiktoken（与 OpenAI 模型一致），不可用时按字符类型估算
+"""
+
+import os
+import re
+from functools import lru_cache
+from typing import Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+_CJK = re.compile(r"[\u3000-\u303f\u3400-\u9fff\uff00-\uffef]")
+
+
+@lru_cache(maxsize=1)
+def _get_encoding():
+    """加载 tokenizer；tiktoken 未安装或词表无法获取时返回 None"""
+    try:
+        import tiktoken
+    except ImportError:
+        return None
+
+    model = os.getenv("OPENAI_MODEL_NAME", "gpt-4o-mini")
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("o200k_base")
+    except Exception as e:
+        logger.warning(f"tiktoken 词表加载失败，改用估算: {e}")
+        return None
+
+
+def count_tokens(text: str) -> int:
+    """统计文本 token 数"""
+    if not text:
+        return 0
+    encoding = _get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text))
+    # 估算：中文约 1 字 1 token，其余约 4 字符 1 token
+    cjk = len(_CJK.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+def truncate_to_tokens(text: str, max_tokens: int, marker: Optional[str] = "……") -> str:
+    """把文本截断到不超过 max_tokens 个 token"""
+    if max_tokens <= 0:
+        return ""
+    if count_tokens(text) <= max_tokens:
+        return text
+
+    # 为截断标记预留预算
+    max_tokens = max(max_tokens - count_tokens(marker or ""), 0)
+
+    encoding = _get_encoding()
+    if encoding is not None:
+        truncated = encoding.decode(encoding.encode(text)[:max_tokens])
+    else:
+        # 二分查找满足预算的最长前缀
+        low, high = 0, len(text)
+        while low < high:
+            mid = (low + high + 1) // 2
+            if count_tokens(text[:mid]) <= max_tokens:
+                low = mid
+            else:
+                high = mid - 1
+        truncated = text[:low]
+    return truncated + (marker or "")
@@ -0,0 +1,173 @@
+"""
+请求级追踪
+为每次分析分配 trace_id，记录各阶段耗时，并把 trace_id 注入所有日志
+"""
+
+import contextvars
+import functools
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional
+import logging
+
+from src.utils.profiling import profiled, safe_trace_id, should_profile
+
+logger = logging.getLogger(__name__)
+
+
+class Trace:
+    """一次请求的追踪记录（可序列化，用于跨 Worker 进程回传）"""
+
+    def __init__(self, trace_id: Optional[str] = None, profile: bool = False, priority: str = "interactive"):
+        # trace_id 可由 X-Trace-Id 头传入，并用作剖析目录名，必须先校验
+        self.trace_id = safe_trace_id(trace_id)
+        self.stages: List[Dict] = []
+        # 是否对各阶段采集 cProfile（见 src/utils/profiling.py）
+        self.profile = profile
+        # 调度优先级：live / interactive / bulk（见 src/serving/priority.py）
+        self.priority = priority
+
+    def add(self, name: str, seconds: float, **attrs) -> None:
+        """记录一个阶段"""
+        self.stages.append({"name": name, "seconds": round(seconds, 4), **attrs})
+
+    def merge(self, other: Optional[Dict]) -> None:
+        """合并另一部分（如 Worker 进程回传）的追踪记录"""
+        if other:
+            self.stages.extend(other.get("stages", []))
+
+    def total(self, name: str) -> float:
+        """同名阶段的累计耗时"""
+        return sum(s["seconds"] for s in self.stages if s["name"] == name)
+
+    def to_dict(self) -> Dict:
+        return {"trace_id": self.trace_id, "stages": list(self.stages)}
+
+
+_current_trace: contextvars.ContextVar[Optional[Trace]] = contextvars.ContextVar(
+    "antifraud_trace", default=None
+)
+
+# 阶段调度器（PriorityGate），为空时阶段直接执行
+_stage_gate = None
+
+
+def set_stage_gate(gate) -> None:
+    """
+    安装阶段调度器
+
+    gate.acquire(name, priority, extra) 在阶段开始前调用（可阻塞），返回 None 表示该阶段不受调度；
+    否则阶段结束后以返回值调用 gate.release(ticket, extra)。
+    """
+    global _stage_gate
+    _stage_gate = gate
+
+
+def current_trace() -> Optional[Trace]:
+    """当前上下文中的追踪记录"""
+    return _current_trace.get()
+
+
+def current_trace_id() -> str:
+    """当前 trace_id，没有追踪时返回 '-'"""
+    trace = _current_trace.get()
+    return trace.trace_id if trace is not None else "-"
+
+
+@contextmanager
+def start_trace(
+    trace_id: Optional[str] = None,
+    profile: Optional[bool] = None,
+    priority: Optional[str] = None
+) -> Iterator[Trace]:
+    """
+    开启一个新的追踪上下文
+
+    同一请求在不同线程 / 进程中的各部分使用相同 trace_id 分别追踪，
+    最后由调用方用 Trace.merge() 合并。
+
+    Args:
+        profile: 是否剖析本次请求；为空时沿用外层追踪的决定，没有外层追踪时按比例采样
+        priority: 调度优先级；为空时沿用外层追踪，没有外层追踪时为 interactive
+    """
+    outer = _current_trace.get()
+    if profile is None:
+        profile = outer.profile if outer is not None else should_profile()
+    if priority is None:
+        priority = outer.priority if outer is not None else "interactive"
+    trace = Trace(trace_id, profile, priority)
+    with use_trace(trace):
+        yield trace
+
+
+@contextmanager
+def use_trace(trace: Optional[Trace]) -> Iterator[Optional[Trace]]:
+    """在当前上下文中使用已有的追踪记录（如把请求的追踪带入批处理线程）"""
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _current_trace.reset(token)
+
+
+@contextmanager
+def stage(name: str, **attrs) -> Iterator[Dict]:
+    """
+    记录一个处理阶段的耗时
+
+    产出的字典可在阶段内补充属性（如 token 数），阶段结束时一并记录。
+    安装了阶段调度器时先按当前追踪的优先级排队，排队时间不计入阶段耗时。
+    """
+    extra: Dict = dict(attrs)
+    trace = _current_trace.get()
+    gate = _stage_gate
+    ticket = None
+    if gate is not None:
+        ticket = gate.acquire(name, trace.priority if trace is not None else "interactive", extra)
+    start = time.perf_counter()
+    try:
+        if trace is not None and trace.profile:
+            with profiled(trace.trace_id, name):
+                yield extra
+        else:
+            yield extra
+    finally:
+        elapsed = time.perf_counter() - start
+        if ticket is not None:
+            gate.release(ticket, extra)
+        if trace is not None:
+            trace.add(name, elapsed, **extra)
+        logger.debug(f"阶段 {name} 耗时 {elapsed:.3f}s {extra}")
+
+
+def bind(fn: Callable) -> Callable:
+    """把当前上下文（含 trace）绑定到函数上，供线程池中执行"""
+    ctx = contextvars.copy_context()
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        return ctx.run(fn, *args, **kwargs)
+
+    return wrapper
+
+
+class TraceIdFilter(logging.Filter):
+    """为日志记录注入 trace_id 字段"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.trace_id = current_trace_id()
+        return True
+
+
+def install_log_filter(fmt: Optional[str] = None) -> None:
+    """
+    在根日志的所有 handler 上安装 TraceIdFilter
+
+    Args:
+        fmt: 可选的日志格式，可使用 %(trace_id)s 字段
+    """
+    for handler in logging.getLogger().handlers:
+        if not any(isinstance(f, TraceIdFilter) for f in handler.filters):
+            handler.addFilter(TraceIdFilter())
+        if fmt:
+            handler.setFormatter(logging.Formatter(fmt))